@@ -0,0 +1,333 @@
+"""
+Registro de cada respuesta (usuario, nivel, pregunta, opción, modalidad, latencia y
+resultado) en un almacén por columnas, y los informes que se calculan sobre él.
+
+Almacén: datos/analitica/parte_<t>_<pid>/, una carpeta por lote con un .npy por
+columna y diccionarios.json con los textos de las columnas categóricas (que se guardan
+como códigos int32). Las partes se escriben completas y se renombran al terminar, así
+varias estaciones pueden escribir a la vez y un informe nunca ve una parte a medias.
+Los informes cargan las columnas y agregan con numpy (bincount, lexsort). Como cada sesión
+deja al menos una parte, al cerrar un registro se compactan solas cuando pasan de
+MAX_PARTES: la parte compacta anota en reemplaza.json las que sustituye, así un informe
+que coincida con la compactación no las cuenta dos veces.
+
+Uso:
+    python analitica.py informe [--usuario Ana] [--nivel 1] [--top 10]
+    python analitica.py compactar      # une las partes en una sola
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+RUTA_ANALITICA = os.path.join("datos", "analitica")
+TAM_LOTE = 256   # Respuestas en memoria antes de escribir una parte
+MAX_PARTES = 32  # Por encima, cerrar un registro compacta el almacén
+CADUCIDAD_BLOQUEO_S = 600  # Un bloqueo de compactación más antiguo se da por abandonado
+
+# Columna -> tipo; las de tipo str se guardan como códigos sobre un diccionario
+COLUMNAS = {
+    "t": np.float64,            # Marca de tiempo (epoch)
+    "sesion": str,
+    "usuario": str,
+    "nivel": np.int16,
+    "indice": np.int16,         # Posición de la pregunta en el nivel
+    "pregunta": str,            # Enunciado
+    "opcion": str,              # Opción elegida ("" si no se reconoció ninguna)
+    "modalidad": str,           # "teclado" o "voz"
+    "latencia_ms": np.float32,  # Desde que se muestra la pregunta hasta la respuesta
+    "correcta": np.bool_,
+    "confianza": np.float32,    # Solo voz; NaN con teclado
+}
+CATEGORICAS = tuple(c for c, tipo in COLUMNAS.items() if tipo is str)
+
+
+class RegistroRespuestas:
+    """
+    Acumula respuestas en listas (añadir una es O(1) y no toca el disco) y cada TAM_LOTE,
+    o al cerrar, las escribe como una parte nueva del almacén.
+    """
+    def __init__(self, carpeta=RUTA_ANALITICA, tam_lote=TAM_LOTE):
+        self.carpeta = carpeta
+        self.tam_lote = tam_lote
+        self.sesion = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self._columnas = {c: [] for c in COLUMNAS}
+        self._partes = 0
+
+    def __len__(self):
+        return len(self._columnas["t"])
+
+    def registrar(self, usuario, nivel, indice, pregunta, opcion, modalidad, latencia_ms,
+                  correcta, confianza=None):
+        fila = {
+            "t": time.time(), "sesion": self.sesion, "usuario": usuario or "", "nivel": nivel,
+            "indice": indice, "pregunta": pregunta, "opcion": opcion or "", "modalidad": modalidad,
+            "latencia_ms": latencia_ms if latencia_ms is not None else np.nan, "correcta": correcta,
+            "confianza": confianza if confianza is not None else np.nan,
+        }
+        for columna, valor in fila.items():
+            self._columnas[columna].append(valor)
+        if len(self) >= self.tam_lote:
+            self.volcar()
+
+    def volcar(self):
+        """Escribe lo acumulado como una parte nueva del almacén"""
+        if not len(self):
+            return
+        columnas, self._columnas = self._columnas, {c: [] for c in COLUMNAS}
+        nombre = f"parte_{self.sesion}_{self._partes:04d}"
+        self._partes += 1
+        try:
+            escribir_parte(self.carpeta, nombre, columnas)
+        except OSError as e:
+            print(f"No se pudieron guardar las respuestas: {e}")
+
+    def cerrar(self):
+        self.volcar()
+        if len(partes(self.carpeta)) > MAX_PARTES:
+            try:
+                compactar(self.carpeta)
+            except OSError as e:
+                print(f"No se pudo compactar la analítica: {e}")
+
+
+def escribir_parte(carpeta, nombre, columnas, reemplaza=None):
+    """
+    columnas: {columna: lista o array}. Las categóricas se codifican aquí.
+    reemplaza: nombres de las partes que sustituye (compactación).
+    """
+    temporal = os.path.join(carpeta, f".{nombre}.tmp")
+    os.makedirs(temporal, exist_ok=True)
+    diccionarios = {}
+    for columna, tipo in COLUMNAS.items():
+        valores = columnas[columna]
+        if tipo is str:
+            vocabulario, codigos = np.unique(np.asarray(valores, dtype=object).astype(str), return_inverse=True)
+            diccionarios[columna] = vocabulario.tolist()
+            datos = codigos.astype(np.int32)
+        else:
+            datos = np.asarray(valores, dtype=tipo)
+        np.save(os.path.join(temporal, f"{columna}.npy"), datos)
+    with open(os.path.join(temporal, "diccionarios.json"), "w", encoding="utf-8") as f:
+        json.dump(diccionarios, f, ensure_ascii=False)
+    if reemplaza:
+        with open(os.path.join(temporal, "reemplaza.json"), "w", encoding="utf-8") as f:
+            json.dump(list(reemplaza), f)
+    os.replace(temporal, os.path.join(carpeta, nombre))
+
+
+def partes(carpeta=RUTA_ANALITICA):
+    """Partes vigentes: las ya sustituidas por una parte compacta no cuentan"""
+    if not os.path.isdir(carpeta):
+        return []
+    nombres = [p for p in os.listdir(carpeta) if p.startswith("parte_")]
+    reemplazadas = set()
+    for nombre in nombres:
+        ruta = os.path.join(carpeta, nombre, "reemplaza.json")
+        if os.path.exists(ruta):
+            with open(ruta, "r", encoding="utf-8") as f:
+                reemplazadas.update(json.load(f))
+    return sorted(os.path.join(carpeta, p) for p in nombres if p not in reemplazadas)
+
+
+class Tabla:
+    """
+    Columnas de todas las partes concatenadas. Las categóricas son códigos int32 sobre un
+    vocabulario común: self.vocabularios[columna][codigo] es el texto.
+    """
+    def __init__(self, columnas, vocabularios):
+        self.columnas = columnas
+        self.vocabularios = vocabularios
+
+    def __len__(self):
+        return len(self.columnas["t"])
+
+    def __getitem__(self, columna):
+        return self.columnas[columna]
+
+    def codigo(self, columna, texto):
+        """Código de un texto en una columna categórica, o -1 si no aparece"""
+        vocabulario = self.vocabularios[columna]
+        i = int(np.searchsorted(vocabulario, texto))
+        return i if i < len(vocabulario) and vocabulario[i] == texto else -1
+
+    def filtrar(self, mascara):
+        return Tabla({c: v[mascara] for c, v in self.columnas.items()}, self.vocabularios)
+
+
+def cargar(carpeta=RUTA_ANALITICA):
+    # Si otra estación compacta mientras se lee, alguna parte desaparece: se vuelve a listar
+    for _ in range(3):
+        try:
+            return cargar_partes(partes(carpeta))
+        except FileNotFoundError:
+            time.sleep(0.1)
+    return cargar_partes(partes(carpeta))
+
+
+def cargar_partes(rutas):
+    """
+    Lee todas las partes. Los códigos locales de cada parte se traducen al vocabulario común.
+    Las columnas se leen enteras (sin mmap) para no dejar un fichero abierto por columna y parte.
+    """
+    leidas = []
+    for ruta in rutas:
+        with open(os.path.join(ruta, "diccionarios.json"), "r", encoding="utf-8") as f:
+            diccionarios = json.load(f)
+        columnas = {c: np.load(os.path.join(ruta, f"{c}.npy")) for c in COLUMNAS}
+        leidas.append((columnas, diccionarios))
+
+    vocabularios = {c: np.unique(np.array([t for _, d in leidas for t in d[c]] or [""], dtype=str))
+                    for c in CATEGORICAS}
+    columnas = {}
+    for columna, tipo in COLUMNAS.items():
+        trozos = []
+        for datos, diccionarios in leidas:
+            if tipo is str:
+                # Tabla de traducción código local -> código común, aplicada de una vez
+                traduccion = np.searchsorted(vocabularios[columna], np.array(diccionarios[columna] or [""], dtype=str))
+                trozos.append(traduccion.astype(np.int32)[datos[columna]])
+            else:
+                trozos.append(datos[columna])
+        vacia = np.empty(0, dtype=np.int32 if tipo is str else tipo)
+        columnas[columna] = np.concatenate(trozos) if trozos else vacia
+    return Tabla(columnas, vocabularios)
+
+
+def compactar(carpeta=RUTA_ANALITICA):
+    """
+    Une todas las partes en una sola (menos ficheros que abrir en cada informe). Un
+    directorio de bloqueo evita que dos estaciones compacten a la vez; las partes que se
+    escriban mientras tanto quedan para la siguiente compactación.
+    """
+    bloqueo = os.path.join(carpeta, ".compactando")
+    try:
+        if time.time() - os.path.getmtime(bloqueo) > CADUCIDAD_BLOQUEO_S:
+            os.rmdir(bloqueo)
+    except OSError:
+        pass
+    try:
+        os.mkdir(bloqueo)
+    except FileExistsError:
+        return 0
+    try:
+        rutas = partes(carpeta)
+        if len(rutas) < 2:
+            return len(rutas)
+        tabla = cargar_partes(rutas)
+        columnas = {c: (tabla.vocabularios[c][tabla[c]] if c in CATEGORICAS else np.asarray(tabla[c]))
+                    for c in COLUMNAS}
+        escribir_parte(carpeta, f"parte_{time.strftime('%Y%m%d_%H%M%S')}_{time.time_ns() % 10**9:09d}_{os.getpid()}_compacta", columnas,
+                       reemplaza=[os.path.basename(r) for r in rutas])
+        for ruta in rutas:
+            shutil.rmtree(ruta, ignore_errors=True)
+        return len(rutas)
+    finally:
+        os.rmdir(bloqueo)
+
+
+# --- Agregados ---
+
+def _medianas(grupos, valores, n_grupos):
+    """Mediana de `valores` por grupo, vectorizada (NaN donde no hay datos)"""
+    validos = ~np.isnan(valores)
+    grupos, valores = grupos[validos], valores[validos]
+    orden = np.lexsort((valores, grupos))
+    cuenta = np.bincount(grupos, minlength=n_grupos)
+    inicio = np.concatenate([[0], np.cumsum(cuenta)[:-1]])
+    medianas = np.full(n_grupos, np.nan)
+    hay = cuenta > 0
+    ordenados = valores[orden]
+    bajo = ordenados[inicio[hay] + (cuenta[hay] - 1) // 2]
+    alto = ordenados[inicio[hay] + cuenta[hay] // 2]
+    medianas[hay] = (bajo + alto) / 2.0
+    return medianas
+
+
+def agregar(tabla, columna):
+    """
+    Por cada valor de `columna`: respuestas, aciertos, tasa de acierto y mediana de
+    latencia. Retorna {texto o valor: {...}} ordenado de menor a mayor tasa de acierto.
+    """
+    if not len(tabla):
+        return {}
+    if columna in CATEGORICAS:
+        grupos = np.asarray(tabla[columna])
+        nombres = tabla.vocabularios[columna]
+    else:
+        nombres, grupos = np.unique(np.asarray(tabla[columna]), return_inverse=True)
+    n = len(nombres)
+    grupos = grupos.astype(np.intp)
+    respuestas = np.bincount(grupos, minlength=n)
+    aciertos = np.bincount(grupos, weights=np.asarray(tabla["correcta"], dtype=np.float64), minlength=n)
+    latencias = _medianas(grupos, np.asarray(tabla["latencia_ms"], dtype=np.float64), n)
+    resultado = {}
+    for i in np.argsort(aciertos / np.maximum(respuestas, 1), kind="stable"):
+        if respuestas[i]:
+            clave = nombres[i].item() if hasattr(nombres[i], "item") else nombres[i]
+            resultado[clave] = {"respuestas": int(respuestas[i]), "aciertos": int(aciertos[i]),
+                                "tasa": float(aciertos[i] / respuestas[i]),
+                                "latencia_mediana_ms": float(latencias[i])}
+    return resultado
+
+
+def informe(tabla, top=10):
+    return {
+        "respuestas": len(tabla),
+        "sesiones": int(len(np.unique(np.asarray(tabla["sesion"])))),
+        "usuarios": int(len(np.unique(np.asarray(tabla["usuario"])))),
+        "preguntas_mas_falladas": dict(list(agregar(tabla, "pregunta").items())[:top]),
+        "por_nivel": agregar(tabla, "nivel"),
+        "por_modalidad": agregar(tabla, "modalidad"),
+        "usuarios_con_mas_fallos": dict(list(agregar(tabla, "usuario").items())[:top]),
+    }
+
+
+def _imprimir(titulo, filas):
+    print(f"\n{titulo}")
+    for clave, f in filas.items():
+        print(f"  {str(clave)[:60]:<60} {f['aciertos']:>5}/{f['respuestas']:<5} "
+              f"{f['tasa'] * 100:5.1f}%  {f['latencia_mediana_ms'] / 1000:6.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("accion", choices=["informe", "compactar"])
+    parser.add_argument("--carpeta", default=RUTA_ANALITICA)
+    parser.add_argument("--usuario")
+    parser.add_argument("--nivel", type=int)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", help="Guardar el informe en este fichero")
+    args = parser.parse_args()
+
+    if args.accion == "compactar":
+        print(f"{compactar(args.carpeta)} partes unidas")
+        return
+
+    inicio = time.perf_counter()
+    tabla = cargar(args.carpeta)
+    mascara = np.ones(len(tabla), dtype=bool)
+    if args.usuario:
+        mascara &= tabla["usuario"] == tabla.codigo("usuario", args.usuario)
+    if args.nivel is not None:
+        mascara &= tabla["nivel"] == args.nivel
+    if not mascara.all():
+        tabla = tabla.filtrar(mascara)
+    resultado = informe(tabla, args.top)
+    duracion = (time.perf_counter() - inicio) * 1000.0
+
+    print(f"{resultado['respuestas']} respuestas, {resultado['usuarios']} usuarios, "
+          f"{resultado['sesiones']} sesiones ({duracion:.0f} ms)")
+    _imprimir("Preguntas con menos aciertos", resultado["preguntas_mas_falladas"])
+    _imprimir("Por nivel", resultado["por_nivel"])
+    _imprimir("Por modalidad", resultado["por_modalidad"])
+    _imprimir("Usuarios con menos aciertos", resultado["usuarios_con_mas_fallos"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Ajusta los parámetros del detector ArUco sobre un conjunto de frames y guarda el perfil
+que cargará la aplicación (datos/perfil_aruco.json, ver perfil_aruco.py).
+
+Se prueban combinaciones de ventanas del umbral adaptativo, límites de perímetro, método
+de refinado y diccionario (completo o reducido a los ids indicados). De cada una se mide
+la tasa de detección, los falsos positivos, el error de las esquinas respecto a la
+referencia y los ms por frame. Se elige la más rápida entre las que detectan casi tanto
+como la mejor (--tolerancia) sin pasarse del error de esquinas (--error-maximo).
+
+Frames:
+    sintéticos (por defecto): el marcador en perspectiva a varias distancias, con desenfoque,
+        poca luz y ruido, más frames sin marcador para contar falsos positivos.
+    --video grabacion.avi: frames de una grabación (p. ej. camara.avi de GEOKIDS_GRABAR);
+        la referencia es el detector por defecto con refinado subpíxel.
+
+Uso:
+    python benchmarks/ajustar_aruco.py
+    python benchmarks/ajustar_aruco.py --video datos/repeticiones/sesion/camara.avi --ids 10
+    python benchmarks/ajustar_aruco.py --pruebas 120 --salida perfil.json --json resultados.json
+"""
+import argparse
+import itertools
+import json
+import random
+import time
+import cv2
+import cv2.aruco as aruco
+import numpy as np
+
+import comun
+import perfil_aruco
+
+ESPACIO = {
+    "adaptiveThreshWinSizeMin": [3, 5, 7],
+    "adaptiveThreshWinSizeMax": [13, 23, 33, 53],
+    "adaptiveThreshWinSizeStep": [4, 10, 20],
+    "minMarkerPerimeterRate": [0.01, 0.02, 0.03, 0.05],
+    "maxMarkerPerimeterRate": [2.0, 4.0],
+    "cornerRefinementMethod": list(perfil_aruco.REFINADOS.values()),
+}
+DISTANCIA_ESQUINAS = 10.0  # px: una detección más lejos de la referencia no cuenta como acierto
+
+
+def frames_sinteticos(ancho, alto, n, semilla=0):
+    """Frames con el marcador degradado de distintas formas y un 20% sin marcador"""
+    rng = np.random.default_rng(semilla)
+    frames = []
+    for i in range(n):
+        if i % 5 == 4:
+            ruido = rng.integers(0, 256, size=(alto // 8 + 1, ancho // 8 + 1, 3), dtype=np.uint8)
+            frames.append(cv2.GaussianBlur(cv2.resize(ruido, (ancho, alto)), (0, 0), 3))
+            continue
+        frame = comun.frame_sintetico(ancho, alto, semilla=semilla + i, inclinacion=float(rng.uniform(0.0, 0.3)))
+        # Marcador más pequeño (más lejos): se reduce el frame y se pega sobre un fondo
+        factor = float(rng.uniform(0.3, 1.0))
+        if factor < 0.95:
+            pequeno = cv2.resize(frame, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            fondo = cv2.resize(frame, (ancho, alto), interpolation=cv2.INTER_NEAREST)
+            fondo = cv2.GaussianBlur(fondo, (0, 0), 8)
+            y, x = int(rng.integers(0, alto - pequeno.shape[0] + 1)), int(rng.integers(0, ancho - pequeno.shape[1] + 1))
+            fondo[y:y + pequeno.shape[0], x:x + pequeno.shape[1]] = pequeno
+            frame = fondo
+        desenfoque = float(rng.uniform(0.0, 2.0))
+        if desenfoque > 0.5:
+            frame = cv2.GaussianBlur(frame, (0, 0), desenfoque)
+        luz = float(rng.uniform(0.35, 1.0))
+        frame = cv2.convertScaleAbs(frame, alpha=luz)
+        frame = cv2.add(frame, rng.normal(0, 6, frame.shape).astype(np.int16), dtype=cv2.CV_8U)
+        frames.append(frame)
+    return frames
+
+
+def frames_video(ruta, n, cada):
+    cap = cv2.VideoCapture(ruta)
+    frames = []
+    indice = 0
+    while len(frames) < n:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if indice % cada == 0:
+            frames.append(frame)
+        indice += 1
+    cap.release()
+    return frames
+
+
+def detectar(detector, tabla, gray):
+    esquinas, ids, _ = detector.detectMarkers(gray)
+    ids = perfil_aruco.traducir_ids(ids, tabla)
+    if ids is None:
+        return {}
+    return {int(i): e.reshape(4, 2) for i, e in zip(ids.ravel(), esquinas)}
+
+
+def referencia(grises, ids, sinteticos):
+    """
+    Lo que debería detectarse en cada frame: el detector por defecto (diccionario completo,
+    subpíxel) con ventanas finas. En los sintéticos sin marcador la referencia está vacía;
+    en los que tienen marcador y la referencia no lo encuentra es None (frame sin evaluar).
+    """
+    params = perfil_aruco.crear_parametros({
+        "adaptiveThreshWinSizeMin": 3, "adaptiveThreshWinSizeMax": 53, "adaptiveThreshWinSizeStep": 4,
+        "minMarkerPerimeterRate": 0.01, "cornerRefinementMethod": aruco.CORNER_REFINE_SUBPIX})
+    detector = aruco.ArucoDetector(perfil_aruco.diccionario_base(), params)
+    esperados = []
+    for i, gray in enumerate(grises):
+        if sinteticos and i % 5 == 4:
+            esperados.append({})
+            continue
+        encontrados = {k: v for k, v in detectar(detector, None, gray).items() if k in ids}
+        esperados.append(None if sinteticos and not encontrados else encontrados)
+    return esperados
+
+
+def evaluar(parametros, usar_ids, ids, grises, esperados, repeticiones):
+    """Tasa de detección, falsos positivos, error medio de esquinas y ms por frame"""
+    perfil = {"parametros": parametros, "ids": list(ids) if usar_ids else None}
+    detector, tabla = perfil_aruco.crear_detector(perfil)
+
+    aciertos = total = falsos = 0
+    errores = []
+    for gray, esperado in zip(grises, esperados):
+        if esperado is None:
+            continue
+        encontrados = {k: v for k, v in detectar(detector, tabla, gray).items() if k in ids}
+        total += len(esperado)
+        for marcador, esquinas in encontrados.items():
+            if marcador not in esperado:
+                falsos += 1
+                continue
+            error = float(np.mean(np.linalg.norm(esquinas - esperado[marcador], axis=1)))
+            if error > DISTANCIA_ESQUINAS:
+                falsos += 1
+            else:
+                aciertos += 1
+                errores.append(error)
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for gray in grises:
+            detector.detectMarkers(gray)
+        tiempos.append((time.perf_counter() - inicio) * 1000.0 / len(grises))
+    return {
+        "tasa": aciertos / total if total else 1.0,
+        "falsos": falsos,
+        "error_px": float(np.mean(errores)) if errores else 0.0,
+        "ms_frame": float(np.median(tiempos)),
+    }
+
+
+def candidatos(pruebas, semilla):
+    """La configuración de siempre más `pruebas` combinaciones válidas al azar del ESPACIO"""
+    todas = [dict(zip(ESPACIO, valores)) for valores in itertools.product(*ESPACIO.values())]
+    todas = [p for p in todas if p["adaptiveThreshWinSizeMin"] < p["adaptiveThreshWinSizeMax"]]
+    random.Random(semilla).shuffle(todas)
+    return [dict(perfil_aruco.PARAMETROS_POR_DEFECTO)] + todas[:pruebas]
+
+
+def elegir(resultados, tolerancia, error_maximo):
+    """La más rápida sin falsos positivos que detecta casi tanto como la mejor"""
+    validos = [r for r in resultados if r["falsos"] == 0 and r["error_px"] <= error_maximo] or resultados
+    mejor_tasa = max(r["tasa"] for r in validos)
+    aceptables = [r for r in validos if r["tasa"] >= mejor_tasa - tolerancia]
+    return min(aceptables, key=lambda r: r["ms_frame"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Grabación de la que sacar los frames")
+    parser.add_argument("--cada", type=int, default=5, help="Con --video, 1 de cada N frames")
+    parser.add_argument("--frames", type=int, default=60, help="Número de frames del conjunto")
+    parser.add_argument("--resolucion", default="1280x720", help="Resolución de los frames sintéticos")
+    parser.add_argument("--ids", type=int, nargs="+", default=[comun.ID_MARCADOR], help="Ids que se imprimen")
+    parser.add_argument("--pruebas", type=int, default=60, help="Combinaciones al azar que se prueban")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--tolerancia", type=float, default=0.02, help="Pérdida de tasa de detección admitida")
+    parser.add_argument("--error-maximo", type=float, default=1.0, help="Error medio de esquinas admitido (px)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="Ruta del perfil (por defecto datos/perfil_aruco.json)")
+    parser.add_argument("--json", help="Guardar todos los resultados en este fichero")
+    args = parser.parse_args()
+
+    if args.video:
+        frames = frames_video(comun.ruta_usuario(args.video), args.frames, args.cada)
+    else:
+        ancho, alto = (int(v) for v in args.resolucion.lower().split("x"))
+        frames = frames_sinteticos(ancho, alto, args.frames, args.semilla)
+    if not frames:
+        print("Error: no hay frames para ajustar.")
+        return
+    grises = [cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) for f in frames]
+    ids = sorted(set(args.ids))
+    esperados = referencia(grises, ids, sinteticos=not args.video)
+    print(f"{len(grises)} frames, {sum(len(e) for e in esperados if e)} marcadores esperados, ids {ids}")
+
+    resultados = []
+    pruebas = candidatos(args.pruebas, args.semilla)
+    for i, parametros in enumerate(pruebas):
+        for usar_ids in (False, True):
+            r = evaluar(parametros, usar_ids, ids, grises, esperados, args.repeticiones)
+            r.update(parametros=parametros, reducido=usar_ids)
+            resultados.append(r)
+        print(f"\r{i + 1}/{len(pruebas)} combinaciones", end="", flush=True)
+    print()
+
+    base = resultados[0]
+    elegido = elegir(resultados, args.tolerancia, args.error_maximo)
+    print(f"{'':>10} {'tasa':>6} {'falsos':>7} {'error px':>9} {'ms/frame':>9}")
+    for nombre, r in (("actual", base), ("elegido", elegido)):
+        print(f"{nombre:>10} {r['tasa']:>6.2f} {r['falsos']:>7} {r['error_px']:>9.2f} {r['ms_frame']:>9.2f}")
+    print(f"Parámetros: {elegido['parametros']}, diccionario {'reducido' if elegido['reducido'] else 'completo'}")
+
+    metricas = {k: elegido[k] for k in ("tasa", "falsos", "error_px", "ms_frame")}
+    metricas.update(frames=len(grises), origen=args.video or f"sinteticos {args.resolucion}",
+                    ms_frame_por_defecto=base["ms_frame"], tasa_por_defecto=base["tasa"])
+    ruta = perfil_aruco.guardar_perfil(elegido["parametros"], ids if elegido["reducido"] else None, metricas,
+                                       ruta=comun.ruta_usuario(args.salida) if args.salida else None)
+    print(f"Perfil guardado en {ruta}")
+
+    if args.json:
+        with open(comun.ruta_usuario(args.json), "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compara el coste total por frame del flujo actual (modelo de distorsión de 14 coeficientes
+en solvePnP, projectPoints y drawFrameAxes) con el flujo rectificado
+(remap con mapas en punto fijo + detección, pose y proyección sin distorsión).
+
+Uso: python benchmarks/bench_rectificacion.py [--repeticiones N] [--json salida.json]
+"""
+import argparse
+import json
+import numpy as np
+
+import comun
+from modelo_camara import ModeloCamara
+from rectificacion import Rectificador
+from reconocedores import detector_marcadores
+from reconocedores.figura_visual import dibujar_cubo
+
+
+def paso_completo(frame, rectificador=None):
+    """Un frame del bucle principal: (rectificado), detección, pose, ejes y cubo"""
+    if rectificador is not None:
+        frame = rectificador.rectificar(frame)
+    marcador = detector_marcadores.obtener_marcador_por_id(frame, comun.ID_MARCADOR,
+                                                           dibujar=True, estimar_pose=True)
+    if marcador is not None:
+        dibujar_cubo(frame, marcador.rvec, marcador.tvec,
+                     marcador.matriz_camara, marcador.coef_distorsion, tamano=0.05)
+    return marcador is not None
+
+
+def medir(frame, repeticiones, rectificador=None):
+    trabajo = np.empty_like(frame)
+
+    def paso():
+        # El bucle dibuja sobre el frame, así que se parte siempre de una copia limpia
+        np.copyto(trabajo, frame)
+        paso_completo(trabajo, rectificador)
+
+    np.copyto(trabajo, frame)
+    detectado = paso_completo(trabajo, rectificador)
+    res = comun.resumen(comun.cronometrar(paso, repeticiones))
+    res["detectado"] = detectado
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--json", help="Guardar resultados en este fichero")
+    args = parser.parse_args()
+
+    modelo = ModeloCamara.por_defecto()
+    rectificador = Rectificador(modelo=modelo)
+    resultados = {}
+
+    print(f"{'resolucion':>12} {'actual (ms)':>12} {'rectificado (ms)':>17} {'mejora':>8}")
+    for nombre, tamano in comun.RESOLUCIONES.items():
+        frame = comun.frame_sintetico(*tamano)
+
+        detector_marcadores.configurar_camara(*modelo.intrinsecos(tamano))
+        actual = medir(frame, args.repeticiones)
+
+        detector_marcadores.configurar_camara(*rectificador.preparar(tamano))
+        rectificado = medir(frame, args.repeticiones, rectificador)
+
+        mejora = actual["mediana_ms"] / rectificado["mediana_ms"] if rectificado["mediana_ms"] > 0 else float("nan")
+        resultados[nombre] = {"actual": actual, "rectificado": rectificado, "mejora": mejora}
+        print(f"{nombre:>12} {actual['mediana_ms']:>12.2f} {rectificado['mediana_ms']:>17.2f} {mejora:>7.2f}x")
+
+    if args.json:
+        with open(comun.ruta_usuario(args.json), "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
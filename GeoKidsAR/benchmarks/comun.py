@@ -0,0 +1,103 @@
+"""
+Utilidades compartidas por los benchmarks: rutas, frames sintéticos y cronometraje.
+Los benchmarks se ejecutan sin ventana, desde cualquier directorio.
+"""
+import os
+import sys
+import time
+import cv2
+import cv2.aruco as aruco
+import numpy as np
+
+# Carpeta de la aplicación (GeoKidsAR) y raíz del repositorio
+RAIZ_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAIZ_REPO = os.path.dirname(RAIZ_APP)
+RUTA_MARCADOR = os.path.join(RAIZ_REPO, "aruco_id10.jpeg")
+
+# Los módulos de la aplicación se importan como en main.py y usan rutas relativas a "datos"
+DIRECTORIO_INICIAL = os.getcwd()
+if RAIZ_APP not in sys.path:
+    sys.path.insert(0, RAIZ_APP)
+os.chdir(RAIZ_APP)
+
+RESOLUCIONES = {
+    "640x480": (640, 480),
+    "1280x720": (1280, 720),
+    "1920x1080": (1920, 1080),
+}
+
+ID_MARCADOR = 10
+
+
+def ruta_usuario(ruta):
+    """Resuelve una ruta de la línea de comandos respecto al directorio desde el que se lanzó"""
+    return os.path.join(DIRECTORIO_INICIAL, ruta)
+
+
+def imagen_marcador():
+    """Imagen del marcador incluida en el repositorio o, si falta, una generada con OpenCV"""
+    img = cv2.imread(RUTA_MARCADOR)
+    if img is None:
+        diccionario = aruco.getPredefinedDictionary(aruco.DICT_4X4_250)
+        marcador = aruco.generateImageMarker(diccionario, ID_MARCADOR, 400)
+        marcador = cv2.copyMakeBorder(marcador, 80, 80, 80, 80, cv2.BORDER_CONSTANT, value=255)
+        img = cv2.cvtColor(marcador, cv2.COLOR_GRAY2BGR)
+    return img
+
+
+def frame_sintetico(ancho, alto, semilla=0, inclinacion=0.15):
+    """
+    Genera un frame BGR con fondo texturizado y el marcador en perspectiva en el centro.
+    La misma semilla produce siempre el mismo frame.
+    """
+    rng = np.random.default_rng(semilla)
+    ruido = rng.integers(0, 256, size=(alto // 8 + 1, ancho // 8 + 1, 3), dtype=np.uint8)
+    frame = cv2.resize(ruido, (ancho, alto), interpolation=cv2.INTER_LINEAR)
+    frame = cv2.GaussianBlur(frame, (0, 0), 3)
+
+    marcador = imagen_marcador()
+    h, w = marcador.shape[:2]
+    lado = min(ancho, alto) * 0.45
+    cx, cy = ancho / 2, alto / 2
+    d = lado * inclinacion
+    origen = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    destino = np.float32([
+        [cx - lado / 2 + d, cy - lado / 2],
+        [cx + lado / 2 - d, cy - lado / 2 + d / 2],
+        [cx + lado / 2, cy + lado / 2],
+        [cx - lado / 2, cy + lado / 2 - d / 2],
+    ])
+    H = cv2.getPerspectiveTransform(origen, destino)
+    cv2.warpPerspective(marcador, H, (ancho, alto), dst=frame, borderMode=cv2.BORDER_TRANSPARENT)
+    return frame
+
+
+def frames_sinteticos():
+    """Un frame por cada resolución de RESOLUCIONES, más el marcador original"""
+    frames = {nombre: frame_sintetico(*tam) for nombre, tam in RESOLUCIONES.items()}
+    frames["aruco_id10"] = imagen_marcador()
+    return frames
+
+
+def cronometrar(funcion, repeticiones=50, calentamiento=5):
+    """Ejecuta la función varias veces y devuelve la lista de tiempos en milisegundos"""
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000.0)
+    return tiempos
+
+
+def resumen(tiempos):
+    """Estadísticas de una lista de tiempos en ms"""
+    t = np.asarray(tiempos, dtype=np.float64)
+    return {
+        "mediana_ms": float(np.median(t)),
+        "p95_ms": float(np.percentile(t, 95)),
+        "media_ms": float(t.mean()),
+        "min_ms": float(t.min()),
+        "repeticiones": int(t.size),
+    }
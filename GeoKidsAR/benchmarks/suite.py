@@ -0,0 +1,200 @@
+"""
+Micro-benchmarks de cuia, detector_marcadores, figura_visual y los paneles de main.
+Se ejecutan sin ventana sobre aruco_id10.jpeg y frames sintéticos a 640x480, 1280x720 y 1920x1080.
+
+Uso:
+    python benchmarks/suite.py --salida resultados.json
+    python benchmarks/suite.py --comparar base.json [--tolerancia 0.15]
+    python benchmarks/suite.py --filtro dibujar_cubo --repeticiones 200
+    python benchmarks/suite.py --memoria --presupuesto presupuesto.json
+
+Con --comparar, el programa termina con código 1 si algún caso es más lento que la base
+en más de la tolerancia indicada (por defecto un 15% sobre la mediana).
+
+Con --memoria se mide además, con tracemalloc, el pico de bytes reservados en una llamada
+a cada caso. --presupuesto (implica --memoria) lee un JSON {"caso" o "caso@resolucion": MB}
+y termina con código 1 si algún caso lo supera, para detectar copias de frames nuevas.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import cv2
+import numpy as np
+
+import comun
+import cuia
+from memoria import MB, cargar_presupuesto, medir_asignaciones
+from modelo_camara import ModeloCamara
+from reconocedores import detector_marcadores
+from reconocedores.figura_visual import mostrar_figura, dibujar_figura_plana, dibujar_cubo, dibujar_piramide
+from main import mostrar_pregunta
+
+# Pregunta de ejemplo con el mismo formato que datos/preguntas.json
+PREGUNTA = {
+    "pregunta": "Que figura tiene angulos de 90 grados pero lados desiguales",
+    "opciones": ["Rectangulo", "Rombo", "Pentagono", "Trapecio"],
+    "respuesta_correcta": "rectángulo",
+    "figura_visual": "rectangulo",
+}
+
+PUNTOS_CUBO = np.float32([[x, y, z] for z in (0, 0.05) for x, y in
+                          ((-0.025, -0.025), (0.025, -0.025), (0.025, 0.025), (-0.025, 0.025))])
+
+
+def casos(frames):
+    """
+    Genera (nombre, resolucion, funcion) para cada caso medido.
+    Los casos que dibujan trabajan sobre un buffer que se restaura en cada repetición;
+    'copia_frame' mide ese coste para poder descontarlo.
+    """
+    modelo = ModeloCamara.por_defecto()
+    sprite = np.zeros((200, 200, 4), dtype=np.uint8)
+    cv2.circle(sprite, (100, 100), 90, (0, 200, 255, 200), -1)
+
+    for resolucion, frame in frames.items():
+        tamano = (frame.shape[1], frame.shape[0])
+        matriz, coef = modelo.intrinsecos(tamano)
+        detector_marcadores.configurar_camara(matriz, coef)
+        trabajo = np.empty_like(frame)
+
+        marcadores = detector_marcadores.detectar_marcadores(frame, dibujar=False, estimar_pose=True)
+        marcador = next((m for m in marcadores if m.id == comun.ID_MARCADOR), None)
+
+        def restaurar(trabajo=trabajo, frame=frame):
+            np.copyto(trabajo, frame)
+            return trabajo
+
+        yield "copia_frame", resolucion, restaurar
+        yield "detectar_marcadores", resolucion, \
+            lambda frame=frame: detector_marcadores.detectar_marcadores(frame, dibujar=False)
+        yield "mostrar_pregunta", resolucion, \
+            lambda restaurar=restaurar: mostrar_pregunta(restaurar(), PREGUNTA, True)
+        yield "mostrar_figura", resolucion, \
+            lambda restaurar=restaurar, c=(tamano[0] // 2, tamano[1] // 2): mostrar_figura(restaurar(), "pentagono", c)
+        yield "alphaBlending", resolucion, \
+            lambda frame=frame, x=tamano[0] // 3, y=tamano[1] // 3: cuia.alphaBlending(sprite, frame, x, y)
+
+        if marcador is None:
+            print(f"Aviso: no se detectó el marcador en {resolucion}, se omiten los casos con pose")
+            continue
+
+        yield "dibujar_figura_plana", resolucion, \
+            lambda m=marcador, restaurar=restaurar: dibujar_figura_plana(restaurar(), "pentagono", m.esquinas)
+        yield "Marcador.estimar_pose", resolucion, lambda m=marcador: m.estimar_pose()
+        yield "cuia.proyeccion", resolucion, \
+            lambda m=marcador: cuia.proyeccion(PUNTOS_CUBO, m.rvec, m.tvec, m.matriz_camara, m.coef_distorsion)
+        yield "dibujar_cubo", resolucion, \
+            lambda m=marcador, restaurar=restaurar: dibujar_cubo(restaurar(), m.rvec, m.tvec,
+                                                                 m.matriz_camara, m.coef_distorsion)
+        yield "dibujar_piramide", resolucion, \
+            lambda m=marcador, restaurar=restaurar: dibujar_piramide(restaurar(), m.rvec, m.tvec,
+                                                                     m.matriz_camara, m.coef_distorsion)
+
+
+def ejecutar(repeticiones, filtro=None, memoria=False):
+    resultados = {}
+    for nombre, resolucion, funcion in casos(comun.frames_sinteticos()):
+        clave = f"{nombre}@{resolucion}"
+        if filtro and filtro not in clave:
+            continue
+        resultados[clave] = comun.resumen(comun.cronometrar(funcion, repeticiones))
+        linea = f"{clave:<40} {resultados[clave]['mediana_ms']:9.3f} ms  (p95 {resultados[clave]['p95_ms']:.3f})"
+        if memoria:
+            # Después de cronometrar: tracemalloc no debe afectar a los tiempos
+            pico, neto = max(medir_asignaciones(funcion) for _ in range(3))
+            resultados[clave]["pico_bytes"] = pico
+            resultados[clave]["neto_bytes"] = neto
+            linea += f"  pico {pico / MB:7.2f} MB"
+        print(linea)
+    return resultados
+
+
+def comprobar_presupuesto(resultados, presupuesto):
+    """Retorna los casos cuyo pico de memoria supera el presupuesto (por caso@resolución o por caso)"""
+    excesos = []
+    for clave, actual in resultados.items():
+        limite = presupuesto.get(clave, presupuesto.get(clave.split("@")[0]))
+        if limite is None or "pico_bytes" not in actual:
+            continue
+        if actual["pico_bytes"] > limite:
+            excesos.append(clave)
+            print(f"{clave:<40} pico {actual['pico_bytes'] / MB:7.2f} MB > presupuesto {limite / MB:.2f} MB")
+    return excesos
+
+
+def metadatos():
+    return {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "plataforma": platform.platform(),
+        "procesador": platform.processor(),
+    }
+
+
+def comparar(resultados, base, tolerancia):
+    """Retorna la lista de casos cuya mediana empeora más que la tolerancia respecto a la base"""
+    regresiones = []
+    print(f"\n{'caso':<40} {'base':>9} {'actual':>9} {'cambio':>8}")
+    for clave, actual in resultados.items():
+        if clave not in base:
+            print(f"{clave:<40} {'-':>9} {actual['mediana_ms']:9.3f}    nuevo")
+            continue
+        anterior = base[clave]["mediana_ms"]
+        cambio = (actual["mediana_ms"] - anterior) / anterior if anterior > 0 else 0.0
+        marca = ""
+        if cambio > tolerancia:
+            regresiones.append(clave)
+            marca = "  REGRESION"
+        print(f"{clave:<40} {anterior:9.3f} {actual['mediana_ms']:9.3f} {cambio:+7.1%}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--filtro", help="Solo los casos cuyo nombre contenga este texto")
+    parser.add_argument("--salida", help="Fichero JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="Fichero JSON de base con el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.15,
+                        help="Empeoramiento relativo de la mediana que se considera regresión")
+    parser.add_argument("--memoria", action="store_true", help="Medir también el pico de memoria de cada caso")
+    parser.add_argument("--presupuesto", help="JSON con el presupuesto de memoria en MB por caso")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)  # Tiempos más estables y comparables entre máquinas
+    resultados = ejecutar(args.repeticiones, args.filtro, memoria=args.memoria or bool(args.presupuesto))
+    informe = {"metadatos": metadatos(), "resultados": resultados}
+
+    if args.salida:
+        with open(comun.ruta_usuario(args.salida), "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2)
+
+    fallo = False
+    if args.presupuesto:
+        excesos = comprobar_presupuesto(resultados, cargar_presupuesto(comun.ruta_usuario(args.presupuesto)))
+        if excesos:
+            print(f"\n{len(excesos)} casos por encima del presupuesto de memoria")
+            fallo = True
+        else:
+            print("\nTodos los casos dentro del presupuesto de memoria")
+
+    if args.comparar:
+        with open(comun.ruta_usuario(args.comparar), "r", encoding="utf-8") as f:
+            base = json.load(f)["resultados"]
+        regresiones = comparar(resultados, base, args.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresiones por encima del {args.tolerancia:.0%}")
+            fallo = True
+        else:
+            print("\nSin regresiones")
+
+    if fallo:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
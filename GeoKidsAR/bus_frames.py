@@ -0,0 +1,281 @@
+"""
+Bus de frames en memoria compartida para repartir el trabajo entre procesos.
+
+Un proceso de captura escribe cada frame una sola vez en un anillo de ranuras
+(multiprocessing.shared_memory); los procesos de detección de marcadores, de caras
+y de dibujo leen esas ranuras directamente, sin copiarlas ni serializarlas.
+Los resultados (poses, identidades), que son pequeños, vuelven por canales
+(multiprocessing.Queue) que se quedan siempre con lo más reciente.
+
+Uso (demostración con ventana):
+    python bus_frames.py [--camara 0] [--ranuras 4] [--caras-cada 30]
+"""
+import argparse
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+from modelo_camara import ModeloCamara, negociar_resolucion
+
+RANURAS = 4
+ESCRIBIENDO = -2   # Marca de la ranura mientras el productor la rellena
+VACIA = -1
+
+
+class BusFrames:
+    """
+    Anillo de `ranuras` frames de forma fija en memoria compartida, con un único productor.
+
+    Control (int64): [última secuencia publicada, secuencia de la ranura 0, ..., de la ranura N-1].
+    El productor marca la ranura como ESCRIBIENDO, la rellena y después publica su secuencia.
+    Un lector toma la última secuencia y trabaja sobre la vista de la ranura; como el
+    productor puede reutilizarla, al terminar comprueba con sigue_valido(secuencia)
+    que no se ha sobrescrito entretanto (con suficientes ranuras no ocurre).
+    """
+    def __init__(self, bloque_frames, bloque_control, forma, ranuras, propietario):
+        self._bloque_frames = bloque_frames
+        self._bloque_control = bloque_control
+        self.forma = tuple(forma)
+        self.ranuras = ranuras
+        self._propietario = propietario
+        self._frames = np.ndarray((ranuras,) + self.forma, dtype=np.uint8, buffer=bloque_frames.buf)
+        self._control = np.ndarray((ranuras + 1,), dtype=np.int64, buffer=bloque_control.buf)
+        self._siguiente = 0
+
+    @staticmethod
+    def crear(forma, ranuras=RANURAS):
+        tamano = int(np.prod(forma)) * ranuras
+        bloque_frames = shared_memory.SharedMemory(create=True, size=tamano)
+        bloque_control = shared_memory.SharedMemory(create=True, size=(ranuras + 1) * 8)
+        bus = BusFrames(bloque_frames, bloque_control, forma, ranuras, propietario=True)
+        bus._control[:] = VACIA
+        return bus
+
+    @staticmethod
+    def conectar(descriptor):
+        return BusFrames(shared_memory.SharedMemory(name=descriptor["frames"]),
+                         shared_memory.SharedMemory(name=descriptor["control"]),
+                         descriptor["forma"], descriptor["ranuras"], propietario=False)
+
+    @property
+    def descriptor(self):
+        """Lo necesario para conectarse desde otro proceso (se pasa al crearlo)"""
+        return {"frames": self._bloque_frames.name, "control": self._bloque_control.name,
+                "forma": self.forma, "ranuras": self.ranuras}
+
+    # --- Productor ---
+
+    def reservar(self):
+        """
+        Retorna la vista de la siguiente ranura para escribir en ella directamente
+        (p. ej. cap.read(vista)); después hay que llamar a publicar().
+        """
+        ranura = self._siguiente % self.ranuras
+        self._control[1 + ranura] = ESCRIBIENDO
+        return self._frames[ranura]
+
+    def publicar(self, frame=None):
+        """Publica la ranura reservada; si se pasa un frame se copia antes en ella"""
+        ranura = self._siguiente % self.ranuras
+        if frame is not None:
+            if self._control[1 + ranura] != ESCRIBIENDO:
+                self.reservar()
+            destino = self._frames[ranura]
+            if frame.ctypes.data != destino.ctypes.data:
+                np.copyto(destino, frame)
+        secuencia = self._siguiente
+        self._control[1 + ranura] = secuencia
+        self._control[0] = secuencia
+        self._siguiente += 1
+        return secuencia
+
+    # --- Lectores ---
+
+    def ultimo(self, despues_de=VACIA):
+        """
+        Retorna (secuencia, vista de solo lectura) del último frame publicado,
+        o (None, None) si no hay ninguno más nuevo que `despues_de`.
+        """
+        secuencia = int(self._control[0])
+        if secuencia <= despues_de or secuencia < 0:
+            return None, None
+        vista = self._frames[secuencia % self.ranuras]
+        if self._control[1 + secuencia % self.ranuras] != secuencia:
+            return None, None
+        vista = vista.view()
+        vista.flags.writeable = False
+        return secuencia, vista
+
+    def sigue_valido(self, secuencia):
+        return int(self._control[1 + secuencia % self.ranuras]) == secuencia
+
+    def cerrar(self):
+        self._frames = self._control = None
+        self._bloque_frames.close()
+        self._bloque_control.close()
+        if self._propietario:
+            self._bloque_frames.unlink()
+            self._bloque_control.unlink()
+
+
+class CanalResultados:
+    """
+    Canal pequeño entre procesos para resultados (diccionarios con poses, nombres...).
+    Enviar nunca bloquea: si el receptor no da abasto se pierde el resultado más viejo.
+    """
+    def __init__(self, contexto, capacidad=8):
+        self._cola = contexto.Queue(maxsize=capacidad)
+
+    def enviar(self, resultado):
+        while True:
+            try:
+                self._cola.put_nowait(resultado)
+                return
+            except queue.Full:
+                try:
+                    self._cola.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def ultimo(self):
+        """Retorna el resultado más reciente pendiente (descartando los anteriores) o None"""
+        resultado = None
+        while True:
+            try:
+                resultado = self._cola.get_nowait()
+            except queue.Empty:
+                return resultado
+
+
+# --- Procesos ---
+
+def proceso_captura(camara, descriptor, parar):
+    bus = BusFrames.conectar(descriptor)
+    cap = cv2.VideoCapture(camara)
+    negociar_resolucion(cap, (bus.forma[1], bus.forma[0]))
+    try:
+        while not parar.is_set():
+            vista = bus.reservar()
+            ret, frame = cap.read(vista)
+            if not ret:
+                break
+            if frame.shape != bus.forma:
+                frame = cv2.resize(frame, (bus.forma[1], bus.forma[0]))
+            bus.publicar(frame)  # Sin copia si la captura escribió en la ranura
+    finally:
+        cap.release()
+        bus.cerrar()
+        parar.set()
+
+
+def proceso_marcadores(descriptor, canal, parar, id_marcador=10):
+    from reconocedores import detector_marcadores
+    bus = BusFrames.conectar(descriptor)
+    alto, ancho = bus.forma[:2]
+    detector_marcadores.configurar_camara(*ModeloCamara.por_defecto().intrinsecos((ancho, alto)))
+    vista_anterior = VACIA
+    try:
+        while not parar.is_set():
+            secuencia, frame = bus.ultimo(vista_anterior)
+            if secuencia is None:
+                time.sleep(0.001)
+                continue
+            vista_anterior = secuencia
+            marcador = detector_marcadores.obtener_marcador_por_id(frame, id_marcador, dibujar=False)
+            if not bus.sigue_valido(secuencia):
+                continue  # El frame se sobrescribió mientras se procesaba
+            resultado = {"secuencia": secuencia, "marcador": None}
+            if marcador is not None and marcador.rvec is not None:
+                resultado["marcador"] = {"id": marcador.id, "esquinas": marcador.esquinas,
+                                         "rvec": marcador.rvec, "tvec": marcador.tvec}
+            canal.enviar(resultado)
+    finally:
+        bus.cerrar()
+
+
+def proceso_caras(descriptor, canal, parar, cada=30):
+    from reconocedores import reconocedor_cara
+    bus = BusFrames.conectar(descriptor)
+    vista_anterior = VACIA
+    try:
+        while not parar.is_set():
+            secuencia, frame = bus.ultimo(vista_anterior + cada - 1 if vista_anterior >= 0 else VACIA)
+            if secuencia is None:
+                time.sleep(0.005)
+                continue
+            vista_anterior = secuencia
+            # La identificación tarda más de lo que dura una ranura: se trabaja sobre una copia,
+            # y si la ranura se sobrescribió durante la copia, se espera al siguiente frame
+            frame = frame.copy()
+            if not bus.sigue_valido(secuencia):
+                continue
+            usuario = reconocedor_cara.identificar_usuario(frame)
+            canal.enviar({"secuencia": secuencia, "usuario": usuario})
+    finally:
+        bus.cerrar()
+
+
+def dibujar_resultados(frame, marcador, usuario, matriz_camara, coef_distorsion):
+    if marcador is not None:
+        cv2.drawFrameAxes(frame, matriz_camara, coef_distorsion, marcador["rvec"], marcador["tvec"], 0.05)
+        cv2.polylines(frame, [marcador["esquinas"].astype(np.int32).reshape(-1, 1, 2)], True, (0, 255, 0), 2)
+    if usuario:
+        cv2.putText(frame, usuario, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camara", type=int, default=0)
+    parser.add_argument("--ancho", type=int, default=1280)
+    parser.add_argument("--alto", type=int, default=720)
+    parser.add_argument("--ranuras", type=int, default=RANURAS)
+    parser.add_argument("--caras-cada", type=int, default=30, help="Frames entre identificaciones de cara")
+    args = parser.parse_args()
+
+    contexto = mp.get_context("spawn")
+    bus = BusFrames.crear((args.alto, args.ancho, 3), args.ranuras)
+    parar = contexto.Event()
+    canal_marcadores = CanalResultados(contexto)
+    canal_caras = CanalResultados(contexto)
+    procesos = [
+        contexto.Process(target=proceso_captura, args=(args.camara, bus.descriptor, parar), name="captura"),
+        contexto.Process(target=proceso_marcadores, args=(bus.descriptor, canal_marcadores, parar), name="marcadores"),
+        contexto.Process(target=proceso_caras, args=(bus.descriptor, canal_caras, parar, args.caras_cada), name="caras"),
+    ]
+    for proceso in procesos:
+        proceso.start()
+
+    # Este proceso dibuja: última imagen del bus con los últimos resultados recibidos
+    matriz_camara, coef_distorsion = ModeloCamara.por_defecto().intrinsecos((args.ancho, args.alto))
+    salida = np.empty(bus.forma, dtype=np.uint8)
+    marcador, usuario, vista_anterior = None, None, VACIA
+    try:
+        while not parar.is_set():
+            resultado = canal_marcadores.ultimo()
+            if resultado is not None:
+                marcador = resultado["marcador"]
+            resultado = canal_caras.ultimo()
+            if resultado is not None:
+                usuario = resultado["usuario"]
+
+            secuencia, frame = bus.ultimo(vista_anterior)
+            if secuencia is not None:
+                vista_anterior = secuencia
+                np.copyto(salida, frame)  # Se dibuja encima: la única copia, en el proceso que muestra
+                dibujar_resultados(salida, marcador, usuario, matriz_camara, coef_distorsion)
+                cv2.imshow("GeoKids AR - bus de frames", salida)
+            if cv2.waitKey(1) & 0xFF == 27:
+                break
+    finally:
+        parar.set()
+        for proceso in procesos:
+            proceso.join(5)
+        cv2.destroyAllWindows()
+        bus.cerrar()
+
+
+if __name__ == "__main__":
+    main()
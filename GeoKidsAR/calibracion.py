@@ -0,0 +1,278 @@
+"""
+Calibración de cámara reutilizable: con un marcador ArUco suelto o con un tablero ChArUco,
+desde una cámara en vivo o desde un video grabado.
+
+De todos los frames solo se guardan como candidatas las vistas que aportan una pose
+distinta de las ya vistas, y antes de resolver se elige un subconjunto pequeño y variado
+(muestreo del punto más lejano), así calibrateCameraExtended trabaja con pocas vistas
+y el error de reproyección lo calcula OpenCV.
+
+Las calibraciones se guardan en binario (.npz) versionado por dispositivo y resolución:
+    datos/calibraciones/<dispositivo>_<ancho>x<alto>_v<N>.npz
+ModeloCamara.por_defecto(dispositivo) las carga solo cuando se pide esa resolución.
+"""
+import glob
+import os
+import re
+import time
+import cv2
+import cv2.aruco as aruco
+import numpy as np
+import perfil_aruco
+
+RUTA_CALIBRACIONES = os.path.join("datos", "calibraciones")
+VERSION_FORMATO = 1
+DICCIONARIO = aruco.getPredefinedDictionary(aruco.DICT_4X4_250)
+MAX_VISTAS = 25          # Vistas que se usan para resolver
+DISTANCIA_MINIMA = 0.08  # Diferencia mínima de pose (descriptor normalizado) para guardar una candidata
+
+
+# --- Detectores de patrones ---
+
+class PatronMarcador:
+    """Un único marcador ArUco de lado `tamano` metros: 4 puntos por vista"""
+    def __init__(self, tamano=0.05, diccionario=DICCIONARIO):
+        # Umbrales del perfil ajustado, siempre con refinado subpíxel
+        params = perfil_aruco.parametros_calibracion(perfil_aruco.cargar_perfil())
+        self._detector = aruco.ArucoDetector(diccionario, params)
+        mitad = tamano / 2
+        self._puntos = np.array([[-mitad, -mitad, 0], [mitad, -mitad, 0],
+                                 [mitad, mitad, 0], [-mitad, mitad, 0]], dtype=np.float32)
+        self.minimo_puntos = 4
+        self.descripcion = f"marcador {tamano} m"
+
+    def observar(self, gray):
+        """Retorna (puntos_objeto Nx3, puntos_imagen Nx2) o None"""
+        esquinas, ids, _ = self._detector.detectMarkers(gray)
+        if ids is None:
+            return None
+        return self._puntos, esquinas[0].reshape(4, 2).astype(np.float32)
+
+    def dibujar(self, frame, observacion):
+        cv2.polylines(frame, [observacion[1].astype(np.int32).reshape(-1, 1, 2)], True, (0, 255, 0), 2)
+
+
+class PatronCharuco:
+    """Tablero ChArUco de columnas x filas casillas: hasta (columnas-1)*(filas-1) esquinas por vista"""
+    def __init__(self, columnas=7, filas=5, casilla=0.03, marcador=0.022, diccionario=DICCIONARIO):
+        self.tablero = aruco.CharucoBoard((columnas, filas), casilla, marcador, diccionario)
+        self._detector = aruco.CharucoDetector(self.tablero, aruco.CharucoParameters(),
+                                               perfil_aruco.parametros_calibracion(perfil_aruco.cargar_perfil()))
+        self._esquinas = self.tablero.getChessboardCorners().astype(np.float32)
+        self.minimo_puntos = 6
+        self.descripcion = f"charuco {columnas}x{filas} casilla {casilla} m marcador {marcador} m"
+
+    def observar(self, gray):
+        esquinas, ids, _, _ = self._detector.detectBoard(gray)
+        if ids is None or len(ids) < self.minimo_puntos:
+            return None
+        return self._esquinas[ids.ravel()], esquinas.reshape(-1, 2).astype(np.float32)
+
+    def dibujar(self, frame, observacion):
+        for x, y in observacion[1].astype(np.int32):
+            cv2.circle(frame, (int(x), int(y)), 3, (0, 255, 0), -1)
+
+
+# --- Selección de vistas ---
+
+def descriptor_vista(puntos_objeto, puntos_imagen, tamano):
+    """
+    Resume la pose de una vista en 5 números comparables: centro (x, y) y escala del
+    patrón en la imagen, e inclinación del plano (dos componentes de la normal),
+    estimada con una homografía y una focal aproximada.
+    """
+    ancho, alto = tamano
+    centro = puntos_imagen.mean(axis=0)
+    extension = np.ptp(puntos_imagen, axis=0)
+    escala = float(np.sqrt(extension[0] * extension[1])) / max(ancho, alto)
+
+    H, _ = cv2.findHomography(puntos_objeto[:, :2], puntos_imagen)
+    inclinacion = (0.0, 0.0)
+    if H is not None:
+        K = np.array([[ancho, 0, ancho / 2], [0, ancho, alto / 2], [0, 0, 1]], dtype=np.float64)
+        M = np.linalg.inv(K) @ H
+        r1, r2 = M[:, 0], M[:, 1]
+        normal = np.cross(r1 / np.linalg.norm(r1), r2 / np.linalg.norm(r2))
+        normal /= np.linalg.norm(normal)
+        inclinacion = (float(normal[0]), float(normal[1]))
+    return np.array([centro[0] / ancho, centro[1] / alto, escala, inclinacion[0], inclinacion[1]])
+
+
+class SelectorVistas:
+    """
+    Guarda como candidatas solo las vistas cuyo descriptor se aleja al menos
+    `distancia_minima` de todas las anteriores, y elige al final un subconjunto variado.
+    """
+    def __init__(self, tamano, distancia_minima=DISTANCIA_MINIMA):
+        self.tamano = tamano
+        self.distancia_minima = distancia_minima
+        self.vistas = []
+        self._descriptores = np.empty((0, 5))
+
+    def __len__(self):
+        return len(self.vistas)
+
+    def agregar(self, puntos_objeto, puntos_imagen):
+        """Retorna True si la vista se ha guardado"""
+        descriptor = descriptor_vista(puntos_objeto, puntos_imagen, self.tamano)
+        if len(self.vistas) and np.min(np.linalg.norm(self._descriptores - descriptor, axis=1)) < self.distancia_minima:
+            return False
+        self.vistas.append((puntos_objeto, puntos_imagen))
+        self._descriptores = np.vstack([self._descriptores, descriptor])
+        return True
+
+    def seleccionar(self, n=MAX_VISTAS):
+        """Muestreo del punto más lejano: empieza por la vista más cercana al centro y añade
+        cada vez la que más se aleja de las ya elegidas"""
+        if len(self.vistas) <= n:
+            return list(self.vistas)
+        descriptores = self._descriptores
+        elegidas = [int(np.argmin(np.linalg.norm(descriptores[:, :2] - 0.5, axis=1)))]
+        distancias = np.linalg.norm(descriptores - descriptores[elegidas[0]], axis=1)
+        while len(elegidas) < n:
+            siguiente = int(np.argmax(distancias))
+            elegidas.append(siguiente)
+            distancias = np.minimum(distancias, np.linalg.norm(descriptores - descriptores[siguiente], axis=1))
+        return [self.vistas[i] for i in elegidas]
+
+    def reiniciar(self):
+        self.vistas = []
+        self._descriptores = np.empty((0, 5))
+
+
+# --- Resultado ---
+
+class Calibracion:
+    def __init__(self, matriz_camara, coef_distorsion, tamano, error_rms, errores_vista=None,
+                 dispositivo="camara0", patron="", fecha=None, version=VERSION_FORMATO):
+        self.matriz_camara = np.asarray(matriz_camara, dtype=np.float64)
+        self.coef_distorsion = np.asarray(coef_distorsion, dtype=np.float64).reshape(-1, 1)
+        self.tamano = (int(tamano[0]), int(tamano[1]))
+        self.error_rms = float(error_rms)
+        self.errores_vista = np.asarray(errores_vista if errores_vista is not None else [], dtype=np.float64).ravel()
+        self.dispositivo = dispositivo
+        self.patron = patron
+        self.fecha = fecha or time.strftime("%Y-%m-%d %H:%M:%S")
+        self.version = version
+
+    def guardar(self, carpeta=RUTA_CALIBRACIONES):
+        """Guarda como la siguiente versión para este dispositivo y resolución. Retorna la ruta"""
+        os.makedirs(carpeta, exist_ok=True)
+        versiones = [v for v, _ in _versiones(carpeta, self.dispositivo, self.tamano)]
+        ruta = os.path.join(carpeta, _nombre(self.dispositivo, self.tamano, max(versiones, default=0) + 1))
+        temporal = ruta + ".tmp.npz"
+        np.savez(temporal, version_formato=VERSION_FORMATO, matriz_camara=self.matriz_camara,
+                 coef_distorsion=self.coef_distorsion, tamano=np.array(self.tamano),
+                 error_rms=self.error_rms, errores_vista=self.errores_vista,
+                 dispositivo=self.dispositivo, patron=self.patron, fecha=self.fecha)
+        os.replace(temporal, ruta)
+        return ruta
+
+    @staticmethod
+    def cargar(ruta):
+        with np.load(ruta) as datos:
+            version = int(datos["version_formato"])
+            if version > VERSION_FORMATO:
+                raise ValueError(f"{ruta}: formato de calibración {version} no soportado")
+            return Calibracion(datos["matriz_camara"], datos["coef_distorsion"], tuple(datos["tamano"]),
+                               float(datos["error_rms"]), datos["errores_vista"], str(datos["dispositivo"]),
+                               str(datos["patron"]), str(datos["fecha"]), version)
+
+
+def _nombre(dispositivo, tamano, version):
+    return f"{dispositivo}_{tamano[0]}x{tamano[1]}_v{version}.npz"
+
+def _versiones(carpeta, dispositivo, tamano):
+    patron = re.compile(rf"{re.escape(dispositivo)}_{tamano[0]}x{tamano[1]}_v(\d+)\.npz$")
+    resultado = []
+    for ruta in glob.glob(os.path.join(carpeta, f"{glob.escape(dispositivo)}_{tamano[0]}x{tamano[1]}_v*.npz")):
+        coincidencia = patron.search(os.path.basename(ruta))
+        if coincidencia:
+            resultado.append((int(coincidencia.group(1)), ruta))
+    return sorted(resultado)
+
+def calibraciones_disponibles(dispositivo, carpeta=RUTA_CALIBRACIONES):
+    """Retorna {(ancho, alto): ruta de la última versión} sin cargar ningún fichero"""
+    patron = re.compile(rf"{re.escape(dispositivo)}_(\d+)x(\d+)_v(\d+)\.npz$")
+    ultimas = {}
+    for ruta in glob.glob(os.path.join(carpeta, f"{glob.escape(dispositivo)}_*.npz")):
+        coincidencia = patron.search(os.path.basename(ruta))
+        if not coincidencia:
+            continue
+        ancho, alto, version = (int(g) for g in coincidencia.groups())
+        if version > ultimas.get((ancho, alto), (0, None))[0]:
+            ultimas[(ancho, alto)] = (version, ruta)
+    return {tamano: ruta for tamano, (_, ruta) in ultimas.items()}
+
+
+# --- Resolución ---
+
+def calibrar(vistas, tamano, racional=None, dispositivo="camara0", patron=""):
+    """
+    Resuelve la calibración con calibrateCameraExtended.
+    racional=None usa el modelo racional (8 coeficientes) solo si hay puntos de sobra.
+    """
+    puntos_objeto = [v[0] for v in vistas]
+    puntos_imagen = [v[1] for v in vistas]
+    total_puntos = sum(len(p) for p in puntos_objeto)
+    if racional is None:
+        racional = total_puntos >= 200
+
+    ancho, alto = tamano
+    K = np.array([[ancho, 0, ancho / 2], [0, ancho, alto / 2], [0, 0, 1]], dtype=np.float64)
+    flags = cv2.CALIB_USE_INTRINSIC_GUESS | cv2.CALIB_FIX_ASPECT_RATIO
+    if racional:
+        flags |= cv2.CALIB_RATIONAL_MODEL
+    criterio = (cv2.TERM_CRITERIA_COUNT | cv2.TERM_CRITERIA_EPS, 100, 1e-7)
+
+    try:
+        resultado = cv2.calibrateCameraExtended(puntos_objeto, puntos_imagen, tamano, K, np.zeros((8 if racional else 5, 1)),
+                                                flags=flags, criteria=criterio)
+    except cv2.error as e:
+        if not racional:
+            raise
+        print(f"El modelo racional no converge ({e}), se usa el estándar")
+        return calibrar(vistas, tamano, racional=False, dispositivo=dispositivo, patron=patron)
+
+    error_rms, matriz, coef = resultado[0], resultado[1], resultado[2]
+    errores_vista = resultado[-1]
+    return Calibracion(matriz, coef, tamano, error_rms, errores_vista, dispositivo, patron)
+
+
+def recoger_vistas(fuente, patron, selector, cada=1, ventana=None, al_frame=None):
+    """
+    Lee frames de `fuente` (VideoCapture abierto) y añade al selector las vistas del patrón.
+    cada: se analiza 1 de cada N frames.
+    ventana: nombre de ventana para mostrar el progreso (None para trabajar sin ventana).
+        ESC termina, 'r' reinicia las vistas.
+    al_frame: función opcional (frame, guardada) llamada tras analizar cada frame.
+    """
+    n = 0
+    while True:
+        ret, frame = fuente.read()
+        if not ret:
+            return
+        n += 1
+        if n % cada:
+            continue
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        observacion = patron.observar(gray)
+        guardada = observacion is not None and selector.agregar(*observacion)
+        if al_frame is not None:
+            al_frame(frame, guardada)
+
+        if ventana is None:
+            continue
+        if observacion is not None:
+            patron.dibujar(frame, observacion)
+        color = (0, 255, 0) if guardada else (255, 255, 0)
+        cv2.putText(frame, f"Vistas distintas: {len(selector)}", (30, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+        cv2.putText(frame, "Mueve e inclina el patron; ESC para calibrar, 'r' para reiniciar",
+                    (30, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        cv2.imshow(ventana, frame)
+        key = cv2.waitKey(1) & 0xFF
+        if key == 27:
+            return
+        if key == ord('r'):
+            selector.reiniciar()
+            print("Reset realizado - empezando de nuevo")
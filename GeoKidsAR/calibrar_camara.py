@@ -1,229 +1,109 @@
+"""
+Calibración de la cámara (ver calibracion.py).
+
+Uso:
+    python calibrar_camara.py                                  # cámara 0, marcador de 5 cm
+    python calibrar_camara.py --camara 1 --resolucion 1280x720
+    python calibrar_camara.py --charuco 7x5 --casilla 0.03 --marcador 0.022
+    python calibrar_camara.py --video grabacion.mp4 --cada 5 --sin-ventana
+
+Mueve e inclina el patrón delante de la cámara: solo se guardan las vistas que aportan
+una pose nueva. ESC termina y calibra, 'r' reinicia.
+El resultado se guarda en datos/calibraciones/<dispositivo>_<ancho>x<alto>_v<N>.npz;
+con --camara-py se escribe además camara.py, la calibración base de la aplicación.
+"""
+import argparse
 import cv2
-import numpy as np
-import time
-import cv2.aruco as aruco
-
-# Configuración del detector ArUco
-DICCIONARIO = aruco.getPredefinedDictionary(aruco.DICT_4X4_250)
-PARAMS = aruco.DetectorParameters()
-PARAMS.cornerRefinementMethod = aruco.CORNER_REFINE_SUBPIX
-DETECTOR = aruco.ArucoDetector(DICCIONARIO, PARAMS)
-
-# Tamaño del marcador en metros (ajusta según tu impresión real)
-MARKER_SIZE = 0.05  # 5cm - ajusta según el tamaño real de tu marcador impreso
-
-# Definir las esquinas 3D del marcador (en coordenadas del objeto)
-def get_marker_3d_points(marker_size):
-    half_size = marker_size / 2
-    return np.array([
-        [-half_size, -half_size, 0],
-        [half_size, -half_size, 0],
-        [half_size, half_size, 0],
-        [-half_size, half_size, 0]
-    ], dtype=np.float32)
-
-CPS = 0.5  # capturas cada 2 segundos para dar tiempo a mover el marcador
-object_points = []  # puntos 3D en el mundo real
-image_points = []   # puntos 2D en la imagen
-tiempo = 1.0 / CPS
-
-# Puntos 3D del marcador
-marker_3d_points = get_marker_3d_points(MARKER_SIZE)
-
-cap = cv2.VideoCapture(0)
-
-if cap.isOpened():
-    wframe = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    hframe = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    final = False
-    n = 0
-    antes = time.time()
-
-    print("=== CALIBRACIÓN DE CÁMARA CON ARUCO ===")
-    print("Instrucciones:")
-    print("1. Mantén el marcador ArUco visible frente a la cámara")
-    print("2. Mueve el marcador a diferentes posiciones y ángulos")
-    print("3. El sistema capturará automáticamente cada 2 segundos")
-    print("4. Necesitas al menos 10-15 capturas para una buena calibración")
-    print("5. Presiona ESC para finalizar y calibrar")
-    print("6. Presiona 'r' para resetear y empezar de nuevo")
-    print()
-
-    while not final:
-        ret, frame = cap.read()
-        if not ret:
-            final = True
-            break
-
-        # Detectar marcadores ArUco
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        corners, ids, rejectedImgPoints = DETECTOR.detectMarkers(gray)
-        
-        # Dibujar marcadores detectados
-        if ids is not None and len(ids) > 0:
-            cv2.aruco.drawDetectedMarkers(frame, corners, ids)
-            
-            # Capturar puntos si ha pasado el tiempo suficiente
-            if time.time() - antes > tiempo:
-                # Tomar el primer marcador detectado
-                corner = corners[0]  # corners[0] es el primer marcador
-                corner_reshaped = corner.reshape(4, 2)  # Reshape para tener formato correcto
-                
-                # Agregar puntos a las listas
-                object_points.append(marker_3d_points)
-                image_points.append(corner_reshaped)
-                n += 1
-                antes = time.time()
-                
-                print(f"Captura {n} realizada - ID detectado: {ids[0][0]}")
-                
-                # Feedback visual
-                cv2.circle(frame, (int(corner_reshaped[0][0]), int(corner_reshaped[0][1])), 10, (0, 255, 0), -1)
-        
-        # Información en pantalla
-        cv2.putText(frame, f"Capturas: {n}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        cv2.putText(frame, f"Minimo recomendado: 15", (50, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-        
-        if n < 15:
-            cv2.putText(frame, "Mueve el marcador a diferentes posiciones", (50, 130), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-        else:
-            cv2.putText(frame, "Suficientes capturas - Presiona ESC para calibrar", (50, 130), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        
-        cv2.imshow("Calibracion ArUco", frame)
-
-        key = cv2.waitKey(20) & 0xFF
-        if key == 27:  # ESC para salir
-            final = True
-        elif key == ord('r'):  # Reset
-            object_points = []
-            image_points = []
-            n = 0
-            print("Reset realizado - empezando de nuevo")
-
-    cap.release()
-    cv2.destroyAllWindows()
-
-    if n < 5:
-        print(f"Error: Solo se capturaron {n} imágenes. Se necesitan al menos 5 para calibrar.")
+
+from calibracion import (MAX_VISTAS, PatronCharuco, PatronMarcador, SelectorVistas,
+                         calibrar, recoger_vistas)
+from modelo_camara import negociar_resolucion
+
+MINIMO_VISTAS = 5
+
+
+def escribir_camara_py(calibracion, ruta="camara.py"):
+    """Formato antiguo: la calibración como código Python"""
+    ancho, alto = calibracion.tamano
+    with open(ruta, "w") as f:
+        f.write("import numpy as np\n\n")
+        f.write("# Parámetros de calibración de la cámara\n")
+        f.write(f"# Resolución utilizada: {ancho}x{alto}\n")
+        f.write(f"# Error medio de reproyección: {calibracion.error_rms:.3f} píxeles\n")
+        f.write(f"# Número de capturas utilizadas: {len(calibracion.errores_vista)}\n\n")
+        f.write(f"cameraMatrix = np.array({repr(calibracion.matriz_camara.tolist())})\n")
+        f.write(f"distCoeffs = np.array({repr(calibracion.coef_distorsion.tolist())})\n\n")
+        f.write(f"# Tamaño de imagen\n")
+        f.write(f"imageSize = ({ancho}, {alto})\n")
+    print(f"Parámetros guardados en '{ruta}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camara", type=int, default=0)
+    parser.add_argument("--video", help="Calibrar a partir de un video grabado en lugar de la cámara")
+    parser.add_argument("--resolucion", help="Resolución de captura, p. ej. 1280x720")
+    parser.add_argument("--dispositivo", help="Nombre del dispositivo (por defecto camara<N>)")
+    parser.add_argument("--tamano-marcador", type=float, default=0.05, help="Lado del marcador ArUco en metros")
+    parser.add_argument("--charuco", help="Tablero ChArUco COLUMNASxFILAS en lugar de un marcador")
+    parser.add_argument("--casilla", type=float, default=0.03, help="Lado de la casilla ChArUco en metros")
+    parser.add_argument("--marcador", type=float, default=0.022, help="Lado del marcador ChArUco en metros")
+    parser.add_argument("--vistas", type=int, default=MAX_VISTAS, help="Vistas que se usan para resolver")
+    parser.add_argument("--cada", type=int, default=1, help="Analizar 1 de cada N frames")
+    parser.add_argument("--sin-ventana", action="store_true")
+    parser.add_argument("--camara-py", action="store_true", help="Escribir también camara.py")
+    args = parser.parse_args()
+
+    if args.charuco:
+        columnas, filas = (int(v) for v in args.charuco.lower().split("x"))
+        patron = PatronCharuco(columnas, filas, args.casilla, args.marcador)
+    else:
+        patron = PatronMarcador(args.tamano_marcador)
+
+    fuente = cv2.VideoCapture(args.video if args.video else args.camara)
+    if not fuente.isOpened():
+        print("Error: No se pudo abrir la cámara o el video.")
+        return
+    if args.resolucion and not args.video:
+        tamano = negociar_resolucion(fuente, tuple(int(v) for v in args.resolucion.lower().split("x")))
+    else:
+        tamano = (int(fuente.get(cv2.CAP_PROP_FRAME_WIDTH)), int(fuente.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    dispositivo = args.dispositivo or f"camara{args.camara}"
+    print(f"=== CALIBRACIÓN DE {dispositivo} A {tamano[0]}x{tamano[1]} CON {patron.descripcion.upper()} ===")
+
+    selector = SelectorVistas(tamano)
+    ventana = None if args.sin_ventana else "Calibracion"
+    try:
+        recoger_vistas(fuente, patron, selector, cada=args.cada, ventana=ventana)
+    finally:
+        fuente.release()
+        if ventana:
+            cv2.destroyAllWindows()
+
+    if len(selector) < MINIMO_VISTAS:
+        print(f"Error: Solo hay {len(selector)} vistas distintas. Se necesitan al menos {MINIMO_VISTAS} para calibrar.")
+        return
+
+    vistas = selector.seleccionar(args.vistas)
+    print(f"Calibrando con {len(vistas)} de {len(selector)} vistas distintas...")
+    calibracion = calibrar(vistas, tamano, dispositivo=dispositivo, patron=patron.descripcion)
+
+    print(f"Error RMS de reproyección: {calibracion.error_rms:.3f} píxeles")
+    if calibracion.error_rms < 1.0:
+        print("¡Excelente calibración!")
+    elif calibracion.error_rms < 2.0:
+        print("Buena calibración")
     else:
-        print(f"Iniciando calibración con {n} capturas...")
-        
-        # Verificar que los datos tienen el formato correcto
-        print(f"Formato object_points: {len(object_points)} elementos")
-        print(f"Formato image_points: {len(image_points)} elementos")
-        if len(object_points) > 0:
-            print(f"Shape de object_points[0]: {object_points[0].shape}")
-            print(f"Shape de image_points[0]: {image_points[0].shape}")
-
-        # Estimación inicial de parámetros intrínsecos
-        cameraMatrixInit = np.array([[wframe, 0, wframe / 2],
-                                     [0, wframe, hframe / 2],
-                                     [0, 0, 1]], dtype=np.float64)
-        distCoeffsInit = np.zeros((5, 1))
-
-        # Flags para calibración
-        flags = (cv2.CALIB_USE_INTRINSIC_GUESS + 
-                cv2.CALIB_RATIONAL_MODEL + 
-                cv2.CALIB_FIX_ASPECT_RATIO)
-
-        try:
-            # Calibración de la cámara
-            ret, cameraMatrix, distCoeffs, rvecs, tvecs = cv2.calibrateCamera(
-                objectPoints=object_points,
-                imagePoints=image_points,
-                imageSize=(wframe, hframe),
-                cameraMatrix=cameraMatrixInit,
-                distCoeffs=distCoeffsInit,
-                flags=flags
-            )
-
-            if ret:
-                # Calcular error de reproyección
-                total_error = 0
-                for i in range(len(object_points)):
-                    imgpoints2, _ = cv2.projectPoints(object_points[i], rvecs[i], tvecs[i], 
-                                                    cameraMatrix, distCoeffs)
-                    imgpoints2 = imgpoints2.reshape(-1, 2)
-                    error = cv2.norm(image_points[i], imgpoints2, cv2.NORM_L2) / len(imgpoints2)
-                    total_error += error
-
-                mean_error = total_error / len(object_points)
-                
-                print(f"Calibración completada exitosamente!")
-                print(f"Error medio de reproyección: {mean_error:.3f} píxeles")
-                
-                if mean_error < 1.0:
-                    print("¡Excelente calibración!")
-                elif mean_error < 2.0:
-                    print("Buena calibración")
-                else:
-                    print("Calibración aceptable, pero podrías mejorarla con más capturas")
-
-                # Guardar parámetros de calibración
-                with open('camara.py', 'w') as f:
-                    f.write("import numpy as np\n\n")
-                    f.write("# Parámetros de calibración de la cámara\n")
-                    f.write(f"# Resolución utilizada: {wframe}x{hframe}\n")
-                    f.write(f"# Error medio de reproyección: {mean_error:.3f} píxeles\n")
-                    f.write(f"# Número de capturas utilizadas: {n}\n\n")
-                    f.write(f"cameraMatrix = np.array({repr(cameraMatrix.tolist())})\n")
-                    f.write(f"distCoeffs = np.array({repr(distCoeffs.tolist())})\n\n")
-                    f.write(f"# Tamaño de imagen\n")
-                    f.write(f"imageSize = ({wframe}, {hframe})\n")
-                
-                print("Parámetros guardados en 'camara.py'")
-                
-                # Mostrar matriz de cámara
-                print("\nMatriz de cámara:")
-                print(cameraMatrix)
-                print("\nCoeficientes de distorsión:")
-                print(distCoeffs.ravel())
-                
-            else:
-                print("Error: La calibración falló.")
-                
-        except Exception as e:
-            print(f"Error durante la calibración: {e}")
-            print("Intentando con parámetros más simples...")
-            
-            # Intentar calibración más simple
-            try:
-                flags_simple = cv2.CALIB_USE_INTRINSIC_GUESS
-                ret, cameraMatrix, distCoeffs, rvecs, tvecs = cv2.calibrateCamera(
-                    objectPoints=object_points,
-                    imagePoints=image_points,
-                    imageSize=(wframe, hframe),
-                    cameraMatrix=cameraMatrixInit,
-                    distCoeffs=distCoeffsInit,
-                    flags=flags_simple
-                )
-                
-                if ret:
-                    print("Calibración simple exitosa!")
-                    
-                    # Guardar parámetros de calibración
-                    with open('camara.py', 'w') as f:
-                        f.write("import numpy as np\n\n")
-                        f.write("# Parámetros de calibración de la cámara (calibración simple)\n")
-                        f.write(f"# Resolución utilizada: {wframe}x{hframe}\n")
-                        f.write(f"# Número de capturas utilizadas: {n}\n\n")
-                        f.write(f"cameraMatrix = np.array({repr(cameraMatrix.tolist())})\n")
-                        f.write(f"distCoeffs = np.array({repr(distCoeffs.tolist())})\n\n")
-                        f.write(f"# Tamaño de imagen\n")
-                        f.write(f"imageSize = ({wframe}, {hframe})\n")
-                    
-                    print("Parámetros guardados en 'camara.py'")
-                else:
-                    print("Error: También falló la calibración simple.")
-                    
-            except Exception as e2:
-                print(f"Error en calibración simple: {e2}")
-
-else:
-    print("Error: No se pudo abrir la cámara.")
-    print("Verifica que:")
-    print("1. La cámara esté conectada")
-    print("2. No esté siendo usada por otra aplicación")
-    print("3. Tienes permisos para acceder a la cámara")
\ No newline at end of file
+        print("Calibración aceptable, pero podrías mejorarla con más vistas")
+    print("\nMatriz de cámara:")
+    print(calibracion.matriz_camara)
+    print("\nCoeficientes de distorsión:")
+    print(calibracion.coef_distorsion.ravel())
+
+    print(f"\nCalibración guardada en {calibracion.guardar()}")
+    if args.camara_py:
+        escribir_camara_py(calibracion)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ import matplotlib as mpl
 from matplotlib import pyplot as plt
 import time
 import os
+import queue
+import threading
 from wgpu.gui.offscreen import WgpuCanvas # Para el render offscreen
 import pygfx as gfx
 import pylinalg as la # Álgebra lineal para las transformaciones geométricas
@@ -11,8 +13,9 @@ import pylinalg as la # Álgebra lineal para las transformaciones geométricas
 
 def popup(titulo, imagen):
     cv2.imshow(titulo, imagen)
+    # La imagen no cambia: se bloquea en waitKey hasta 100 ms por vuelta en lugar de sondear
     while True:
-        if cv2.waitKey(10) > 0:
+        if cv2.waitKey(100) > 0:
             cv2.destroyWindow(titulo)
             break
         elif cv2.getWindowProperty(titulo, cv2.WND_PROP_VISIBLE) < 1:
@@ -63,19 +66,169 @@ def bestBackend(camid):
             cam.release()
     return bestCap
 
+class lectorFichero:
+    """
+    Lee un fichero de video en orden desde un hilo que decodifica por adelantado
+    en una cola acotada. Nunca busca (CAP_PROP_POS_FRAMES) salvo para volver al
+    principio al hacer bucle o si se pide explícitamente con buscar().
+
+    Modos:
+        "tiempo_real": se entrega el frame que toca según el reloj; si el consumidor
+                       va lento se descartan frames ya decodificados (sin buscar).
+        "maxima":      cada read() entrega el siguiente frame, tan rápido como se pida.
+        "paso":        read() repite el frame actual hasta que se llama a paso().
+    """
+    MODOS = ("tiempo_real", "maxima", "paso")
+
+    def __init__(self, cap, modo="tiempo_real", capacidad=16):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de lectura desconocido: {modo}")
+        self._cap = cap
+        self.modo = modo
+        self.loop = False
+        self.capacidad = capacidad
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.numFrames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._cola = None
+        self._hilo = None
+        self._parar = threading.Event()
+        self._inicioDecodificado = 0   # Frame por el que empieza a decodificar el hilo
+        self._siguiente = 0            # Índice (sin bucle) del siguiente frame a entregar
+        self._actual = None            # (indice, frame) entregado por última vez
+        self._fin = False
+        self._pasos = 1                # Frames pendientes de avanzar en modo "paso"
+        self._startTime = None
+
+    def _arrancar(self):
+        self._cola = queue.Queue(maxsize=self.capacidad)
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._decodificar, args=(self._cola, self._inicioDecodificado),
+                                      name="lectorFichero", daemon=True)
+        self._hilo.start()
+        if self._startTime is None:
+            self._startTime = time.time()
+
+    def _poner(self, cola, elemento):
+        while not self._parar.is_set():
+            try:
+                cola.put(elemento, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _decodificar(self, cola, indice):
+        # El None final se pone siempre (fin, error o búsqueda fallida) para que _tomar no espere sin fin
+        try:
+            while not self._parar.is_set():
+                ret, frame = self._cap.read()
+                if not ret:
+                    if not (self.loop and indice > 0):
+                        return
+                    # Vuelta al principio: una única búsqueda al frame 0, sin reabrir el fichero
+                    self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    if self.numFrames <= 0:
+                        self.numFrames = indice
+                    ret, frame = self._cap.read()
+                    if not ret:
+                        print("No se pudo volver al principio del video")
+                        return
+                if not self._poner(cola, (indice, frame)):
+                    return
+                indice += 1
+        finally:
+            self._poner(cola, None)
+
+    def _detener(self):
+        if self._hilo is not None:
+            self._parar.set()
+            self._hilo.join()
+            self._hilo = None
+
+    def _tomar(self):
+        """Siguiente frame decodificado, (indice, frame) o None al terminar el fichero"""
+        if self._fin:
+            return None
+        if self._hilo is None:
+            self._arrancar()
+        elemento = self._cola.get()
+        if elemento is None:
+            self._fin = True
+        return elemento
+
+    def read(self):
+        if self.modo == "maxima":
+            elemento = self._tomar()
+            if elemento is None:
+                return (False, None)
+            self._siguiente = elemento[0] + 1
+            return (True, elemento[1])
+
+        if self.modo == "tiempo_real":
+            if self._startTime is None:
+                self._arrancar()
+            objetivo = int((time.time() - self._startTime) * self.fps)
+            while self._actual is None or self._siguiente <= objetivo:
+                elemento = self._tomar()
+                if elemento is None:
+                    break
+                self._actual = elemento
+                self._siguiente = elemento[0] + 1
+        else:
+            while self._pasos > 0:
+                elemento = self._tomar()
+                if elemento is None:
+                    break
+                self._actual = elemento
+                self._siguiente = elemento[0] + 1
+                self._pasos -= 1
+            self._pasos = 0
+
+        if self._actual is None or (self._fin and self.modo == "tiempo_real"):
+            return (False, None)
+        # El mismo frame puede entregarse varias veces: se da una copia para que no se dibuje encima
+        return (True, self._actual[1].copy())
+
+    def paso(self, n=1):
+        """En modo "paso", avanza n frames en la próxima lectura"""
+        self._pasos += n
+
+    def posicion(self):
+        """Frame del fichero que se entregó por última vez (o el siguiente, si aún no se leyó)"""
+        indice = self._actual[0] if self._actual is not None and self.modo != "maxima" else self._siguiente
+        return indice % self.numFrames if self.loop and self.numFrames > 0 else indice
+
+    def buscar(self, indice):
+        """Salta al frame indicado; es la única operación que busca en el fichero"""
+        self._detener()
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, indice)
+        self._inicioDecodificado = self._siguiente = int(indice)
+        self._actual = None
+        self._fin = False
+        self._pasos = 1
+        if self._startTime is not None:
+            self._startTime = time.time() - indice / self.fps
+
+    def release(self):
+        self._detener()
+
 class myVideo:
-    def __init__(self, source, backend=cv2.CAP_ANY):
-        self.loop = False      #Para indicar si el video reiniciará al terminar
+    def __init__(self, source, backend=cv2.CAP_ANY, ritmo=True, modo=None):
+        self._loop = False     #Para indicar si el video reiniciará al terminar
         self.process = None    #Para indicar la función opcional de procesado de frames
+        self.ritmo = ritmo     #Con False los ficheros se leen frame a frame, tan rápido como se pida
+        self._lector = None
         if isinstance(source, str):
             if os.path.exists(source):
                 self._cap = cv2.VideoCapture(source)
                 self._camera = False
-                self._nextFrame = 0
-                self._startTime = time.time()
-                self._fps = self._cap.get(cv2.CAP_PROP_FPS)
-                self._numFrames = self._cap.get(cv2.CAP_PROP_FRAME_COUNT)
-                self._currentFrame = None
+                # Los ficheros se decodifican por adelantado en otro hilo (ver lectorFichero)
+                if modo is None:
+                    modo = "tiempo_real" if ritmo else "maxima"
+                self._lector = lectorFichero(self._cap, modo)
+                self._props = {prop: self._cap.get(prop) for prop in
+                               (cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_COUNT,
+                                cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT)}
             else:
                 self._cap = cv2.VideoCapture(source)
                 self._camera = True #IP Camera
@@ -83,12 +236,23 @@ class myVideo:
             self._cap = cv2.VideoCapture(source, backend)
             self._camera = True
 
+    @property
+    def loop(self):
+        return self._loop
+
+    @loop.setter
+    def loop(self, valor):
+        self._loop = valor
+        if self._lector is not None:
+            self._lector.loop = valor
+
     def __del__(self):
-        self._cap.release()
+        self.release()
 
     def release(self):
+        if self._lector is not None:
+            self._lector.release()
         self._cap.release()
-        del self
 
     def isOpened(self):
         return self._cap.isOpened()
@@ -96,46 +260,29 @@ class myVideo:
     def read(self):
         if self._camera:
             ret, frame = self._cap.read()
-            if ret and self.process != None:
-                frame = self.process(frame)
-            return(ret, frame)
         else:
-            nextFrameStart = self._startTime + self._nextFrame / self._fps
-            nextFrameEnd = self._startTime + (self._nextFrame + 1) / self._fps
-            now = time.time()
-            if now <= nextFrameStart:
-                return (True, self._currentFrame)
-            else:
-                if now < nextFrameEnd:
-                    correctFrame = self._nextFrame
-                else:
-                    correctFrame = int((now - self._startTime) * self._fps)
-
-                if self.loop:
-                    correctFrame = correctFrame % self._numFrames
-                elif correctFrame >= self._numFrames:
-                    return (False, None)
-
-                if correctFrame != self._nextFrame:
-                    self._cap.set(cv2.CAP_PROP_POS_FRAMES, correctFrame)
+            ret, frame = self._lector.read()
+        if ret and self.process != None:
+            frame = self.process(frame)
+        return(ret, frame)
 
-                ret, frame = self._cap.read()
-                if ret:
-                    self._currentFrame = cv2.cvtColor(fg, cv2.COLOR_GRAY2BGRA)
-                    self._nextFrame = correctFrame + 1
-                    if self.loop:
-                        self._nextFrame = self._nextFrame % self._numFrames
-
-                    if self.process != None:
-                        frame = self.process(frame)
-                return (ret, frame)
+    def paso(self, n=1):
+        """Avanza n frames en modo "paso" (solo ficheros)"""
+        self._lector.paso(n)
 
     def get(self, prop):
+        if not self._camera:
+            # El hilo de decodificación usa la captura: se responde sin tocarla
+            if prop == cv2.CAP_PROP_POS_FRAMES:
+                return float(self._lector.posicion())
+            if prop in self._props:
+                return self._props[prop]
         return(self._cap.get(prop))
 
     def set(self, prop, value):
-        if prop == cv2.CAP_PROP_POS_FRAMES:
-            self._nextFrame = value
+        if not self._camera and prop == cv2.CAP_PROP_POS_FRAMES:
+            self._lector.buscar(value)
+            return True
         return(self._cap.set(prop, value))
 
     def play(self, titulo, key=27):
@@ -256,18 +403,16 @@ class matrizDeTransformacion:
         mat = np.eye(4)
         c, s = np.cos(angulo), np.sin(angulo)
 
+        # Se escriben solo los elementos que cambian para no construir listas de Python
         if axis == 'x':
-            mat[:3, :3] = [[1, 0, 0],
-                           [0, c, -s],
-                           [0, s, c]]
+            mat[1, 1], mat[1, 2] = c, -s
+            mat[2, 1], mat[2, 2] = s, c
         elif axis == 'y':
-            mat[:3, :3] = [[c, 0, s],
-                           [0, 1, 0],
-                           [-s, 0, c]]
+            mat[0, 0], mat[0, 2] = c, s
+            mat[2, 0], mat[2, 2] = -s, c
         elif axis == 'z':
-            mat[:3, :3] = [[c, -s, 0],
-                           [s, c, 0],
-                           [0, 0, 1]]
+            mat[0, 0], mat[0, 1] = c, -s
+            mat[1, 0], mat[1, 1] = s, c
         else:
             raise ValueError("El eje debe ser 'x', 'y' o 'z'.")
         
@@ -305,6 +450,9 @@ class matrizDeTransformacion:
     def __matmul__(self, other):
         # Operador @ para la composición de matrices.
         if not isinstance(other, matrizDeTransformacion):
+            # Las pilas de transformaciones (transformaciones.py) resuelven la composición por su cuenta
+            if hasattr(other, "matrices"):
+                return NotImplemented
             raise TypeError("El operador solo puede aplicarse entre instancias de matrizDeTransformacion.")
         return matrizDeTransformacion(np.matmul(self.matrix, other.matrix))
 
@@ -321,11 +469,109 @@ class matrizDeTransformacion:
 
 
 
+FPS_HORNEADO = 30  # Muestras por segundo de las animaciones horneadas
+
+class animacionHorneada:
+    """
+    Clip muestreado a `fps` fijos: posición, rotación y escala locales de cada nodo animado
+    en arrays (frames x nodos x 3/4). Reproducirlo es copiar la fila del frame que toca, sin
+    interpolar keyframes ni mezclar pistas como hace el AnimationMixer en cada render.
+    Se guarda en un .npz junto al modelo (ver ruta_cache) y se reutiliza mientras el
+    modelo no cambie.
+    """
+    VERSION = 1
+
+    def __init__(self, nodos, fps, posiciones, rotaciones, escalas):
+        self.nodos = nodos          # Índices de los nodos animados en modelo.nodos()
+        self.fps = fps
+        self.posiciones = posiciones
+        self.rotaciones = rotaciones
+        self.escalas = escalas
+        self._objetos = None
+        self._frame = None
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    @staticmethod
+    def ruta_cache(ruta_modelo, nombre, fps):
+        limpio = "".join(c if c.isalnum() or c in "-_" else "_" for c in nombre)
+        return f"{os.path.splitext(ruta_modelo)[0]}.{limpio}.{fps}fps.anim.npz"
+
+    @staticmethod
+    def _huella(ruta_modelo):
+        info = os.stat(ruta_modelo)
+        return f"{info.st_size}:{info.st_mtime_ns}"
+
+    @classmethod
+    def hornear(cls, modelo, clip, fps=FPS_HORNEADO):
+        """Muestrea el clip con un mixer propio (el de la escena no se toca)"""
+        nodos = modelo.nodos()
+        objetivos = {id(pista.target) for pista in clip.tracks if getattr(pista, "target", None) is not None}
+        indices = [i for i, nodo in enumerate(nodos) if id(nodo) in objetivos] or list(range(len(nodos)))
+        n_frames = max(1, int(round(clip.duration * fps)))
+        posiciones = np.empty((n_frames, len(indices), 3), dtype=np.float32)
+        rotaciones = np.empty((n_frames, len(indices), 4), dtype=np.float32)
+        escalas = np.empty((n_frames, len(indices), 3), dtype=np.float32)
+
+        mixer = gfx.AnimationMixer()
+        accion = mixer.clip_action(clip)
+        accion.play()
+        mixer.update(0.0)
+        for f in range(n_frames):
+            for j, i in enumerate(indices):
+                local = nodos[i].local
+                posiciones[f, j] = local.position
+                rotaciones[f, j] = local.rotation
+                escalas[f, j] = local.scale
+            mixer.update(1.0 / fps)
+        accion.stop()
+        return cls(np.asarray(indices, dtype=np.int32), fps, posiciones, rotaciones, escalas)
+
+    def guardar(self, ruta, ruta_modelo):
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            np.savez(f, version=self.VERSION, huella=self._huella(ruta_modelo), nodos=self.nodos,
+                     fps=self.fps, posiciones=self.posiciones, rotaciones=self.rotaciones, escalas=self.escalas)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta, ruta_modelo, n_nodos):
+        """La animación guardada, o None si no existe o es de otra versión del modelo"""
+        if not os.path.exists(ruta):
+            return None
+        try:
+            with np.load(ruta) as datos:
+                if (int(datos["version"]) != cls.VERSION or str(datos["huella"]) != cls._huella(ruta_modelo)
+                        or (len(datos["nodos"]) and int(datos["nodos"].max()) >= n_nodos)):
+                    return None
+                return cls(datos["nodos"], int(datos["fps"]), datos["posiciones"], datos["rotaciones"], datos["escalas"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def vincular(self, modelo):
+        nodos = modelo.nodos()
+        self._objetos = [nodos[i] for i in self.nodos]
+        self._frame = None
+
+    def aplicar(self, tiempo):
+        """Pone los nodos en la pose del instante `tiempo` (el clip se repite en bucle)"""
+        frame = int(tiempo * self.fps) % len(self)
+        if frame == self._frame:
+            return
+        self._frame = frame
+        for j, objeto in enumerate(self._objetos):
+            objeto.local.position = self.posiciones[frame, j]
+            objeto.local.rotation = self.rotaciones[frame, j]
+            objeto.local.scale = self.escalas[frame, j]
+
 class modeloGLTF:
     def __init__(self, ruta_modelo=None):
         self.model_obj = None  
         self.gltf = None
         self.current_action = None
+        self.ruta_modelo = None
+        self.horneada = None
         if ruta_modelo:
             self.cargar(ruta_modelo)
         self.indice_animacion = None
@@ -334,6 +580,8 @@ class modeloGLTF:
     def cargar(self, ruta_modelo):
         if self.model_obj:
             self.model_obj.remove()
+        self.ruta_modelo = ruta_modelo
+        self.horneada = None
         self.gltf = gfx.load_gltf(ruta_modelo)
         self.seleccionar_escena() # Selecciona la escena por defecto dentro del modelo GLTF
         self.skeleton_helper = gfx.SkeletonHelper(self.model_obj)
@@ -383,7 +631,16 @@ class modeloGLTF:
             
         return nombres
 
-    def animar(self, nombre):
+    def nodos(self):
+        """Todos los nodos del modelo en orden fijo (el mismo en cada carga del fichero)"""
+        return list(self.model_obj.iter())
+
+    def animar(self, nombre, horneada=False, fps=FPS_HORNEADO):
+        """
+        Selecciona el clip `nombre`. Con horneada=True se reproduce muestreado a `fps` fijos
+        desde la caché del disco (se crea la primera vez): mucho menos CPU por frame, a
+        cambio de no interpolar entre muestras ni poder mezclar clips.
+        """
         if not self.gltf or not self.gltf.animations:
             return False
 
@@ -392,13 +649,35 @@ class modeloGLTF:
             if nombre_animacion == nombre:
                 self.indice_animacion = i
                 self.current_action = animation  # Guardar la animación actual
+                self.horneada = self._hornear(animation, nombre_animacion, fps) if horneada else None
                 return True
         
         return False
 
+    def _hornear(self, clip, nombre, fps):
+        if any(getattr(pista, "path", None) == "weights" for pista in clip.tracks):
+            print(f"La animación {nombre} usa morph targets; se reproduce sin hornear")
+            return None
+        n_nodos = len(self.nodos())
+        ruta = animacionHorneada.ruta_cache(self.ruta_modelo, nombre, fps) if self.ruta_modelo else None
+        horneada = animacionHorneada.cargar(ruta, self.ruta_modelo, n_nodos) if ruta else None
+        if horneada is None:
+            horneada = animacionHorneada.hornear(self, clip, fps)
+            if ruta:
+                try:
+                    horneada.guardar(ruta, self.ruta_modelo)
+                except OSError as e:
+                    print(f"No se pudo guardar la animación horneada: {e}")
+        horneada.vincular(self)
+        horneada.aplicar(0.0)
+        return horneada
+
 class escenaPYGFX:
     def __init__(self, fov, ancho, alto):
         self.mixer = gfx.AnimationMixer()
+        self.usa_mixer = False
+        self.horneadas = []  # Modelos con animación horneada (se avanzan sin el mixer)
+        self.tiempo = 0.0
         self.clock = gfx.Clock()
         self.scene = gfx.Scene()
         self.scene.background = None  # Fondo transparente    
@@ -415,10 +694,13 @@ class escenaPYGFX:
         skeleton_helper.visible = False
         self.scene.add(skeleton_helper)
         self.scene.add(modelo.model_obj)
-        if modelo.indice_animacion is not None:  # Cambiar la condición
+        if modelo.horneada is not None:
+            self.horneadas.append(modelo.horneada)
+        elif modelo.indice_animacion is not None:  # Cambiar la condición
             action = self.mixer.clip_action(modelo.current_action)  # Usar la animación guardada
             action.play()
             self.mixer.update(0.0)
+            self.usa_mixer = True
 
     def ilumina_modelo(self, modelo, intensidad=0.5):
         radio = modelo.model_obj.get_world_bounding_sphere()[3]
@@ -441,6 +723,10 @@ class escenaPYGFX:
 
     def render(self):
         dt = self.clock.get_delta()
-        self.mixer.update(dt)  # Importante: actualizar el mixer antes de renderizar
+        self.tiempo += dt
+        if self.usa_mixer:
+            self.mixer.update(dt)  # Importante: actualizar el mixer antes de renderizar
+        for horneada in self.horneadas:
+            horneada.aplicar(self.tiempo)
         self.renderer.render(self.scene, self.camera)
         return np.array(self.canvas.draw())
@@ -0,0 +1,219 @@
+"""
+Varias estaciones de juego en un mismo equipo: una sesión aislada por cámara, cada una
+en su propio proceso y con su propia ventana (el estado del detector es global por proceso).
+
+El índice de caras y el banco de preguntas se cargan una sola vez en el supervisor y se
+publican en memoria compartida; las estaciones los leen de ahí en lugar de volver a
+cargar los ficheros. El supervisor reinicia las estaciones que fallan y muestra los FPS
+de cada una y el total.
+
+Uso:
+    python estaciones.py --camaras 0 1 2
+
+Una estación que termina normalmente (ESC) no se reinicia. Las estaciones comparten
+el micrófono por defecto del sistema.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+import main as juego
+from reconocedores import reconocedor_cara
+
+RUTA_PREGUNTAS = os.path.join("datos", "preguntas.json")
+PERIODO_INFORME = 5.0       # Segundos entre informes de FPS del supervisor
+MAX_REINICIOS = 5           # Reinicios permitidos por estación dentro de VENTANA_REINICIOS
+VENTANA_REINICIOS = 60.0
+
+
+class RecursosCompartidos:
+    """
+    Índice de caras (matriz N x 128 float64) y banco de preguntas (JSON en UTF-8) en
+    bloques de multiprocessing.shared_memory. El supervisor los crea con publicar() y
+    los libera con liberar(); cada estación se conecta con conectar(descriptor).
+    """
+    def __init__(self, bloques, descriptor):
+        self._bloques = bloques
+        self.descriptor = descriptor
+
+    @staticmethod
+    def publicar(nombres, codificaciones, preguntas):
+        datos_preguntas = json.dumps(preguntas, ensure_ascii=False).encode("utf-8")
+        bloque_caras = shared_memory.SharedMemory(create=True, size=max(codificaciones.nbytes, 1))
+        bloque_preguntas = shared_memory.SharedMemory(create=True, size=max(len(datos_preguntas), 1))
+
+        np.ndarray(codificaciones.shape, dtype=np.float64, buffer=bloque_caras.buf)[:] = codificaciones
+        bloque_preguntas.buf[:len(datos_preguntas)] = datos_preguntas
+
+        descriptor = {
+            "caras": bloque_caras.name, "forma": codificaciones.shape, "nombres": list(nombres),
+            "preguntas": bloque_preguntas.name, "bytes_preguntas": len(datos_preguntas),
+        }
+        return RecursosCompartidos([bloque_caras, bloque_preguntas], descriptor)
+
+    @staticmethod
+    def conectar(descriptor):
+        bloque_caras = shared_memory.SharedMemory(name=descriptor["caras"])
+        bloque_preguntas = shared_memory.SharedMemory(name=descriptor["preguntas"])
+        return RecursosCompartidos([bloque_caras, bloque_preguntas], descriptor)
+
+    def codificaciones(self):
+        """Vista de solo lectura sobre la matriz compartida (sin copia)"""
+        matriz = np.ndarray(self.descriptor["forma"], dtype=np.float64, buffer=self._bloques[0].buf)
+        matriz.flags.writeable = False
+        return matriz
+
+    def preguntas(self):
+        return json.loads(bytes(self._bloques[1].buf[:self.descriptor["bytes_preguntas"]]).decode("utf-8"))
+
+    def cerrar(self):
+        for bloque in self._bloques:
+            bloque.close()
+
+    def liberar(self):
+        self.cerrar()
+        for bloque in self._bloques:
+            try:
+                bloque.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class EntornoEstacion(juego.EntornoCamara):
+    """EntornoCamara que además envía sus FPS al supervisor cada segundo"""
+    cola_informes = None
+    estacion = None
+
+    def __init__(self, cap, ventana=juego.VENTANA, tamano=None):
+        super().__init__(cap, ventana, tamano)
+        self._frames = 0
+        self._t_informe = time.monotonic()
+
+    def fin_frame(self, tiempos):
+        self._frames += 1
+        ahora = time.monotonic()
+        if ahora - self._t_informe >= 1.0:
+            fps = self._frames / (ahora - self._t_informe)
+            self._frames = 0
+            self._t_informe = ahora
+            try:
+                self.cola_informes.put_nowait((self.estacion, fps))
+            except queue.Full:
+                pass
+
+
+def ejecutar_estacion(estacion, camara, descriptor, cola_informes):
+    """Punto de entrada de cada proceso de estación"""
+    recursos = RecursosCompartidos.conectar(descriptor)
+    try:
+        reconocedor_cara.usar_indice(descriptor["nombres"], recursos.codificaciones())
+        EntornoEstacion.cola_informes = cola_informes
+        EntornoEstacion.estacion = estacion
+        entorno = juego.abrir_camara(None, camara,
+                                     ventana=f"{juego.VENTANA} - estacion {estacion + 1}",
+                                     clase_entorno=EntornoEstacion)
+        juego.main(entorno, recursos.preguntas())
+    finally:
+        # La vista de la matriz debe soltarse antes de cerrar el bloque
+        reconocedor_cara.usar_indice(None, None)
+        recursos.cerrar()
+
+
+class Supervisor:
+    """Lanza una estación por cámara, reinicia las que fallan e informa de los FPS"""
+    def __init__(self, camaras, recursos):
+        self.camaras = list(camaras)
+        self.recursos = recursos
+        self._contexto = mp.get_context("spawn")  # Nada de fork con OpenCV y ventanas abiertas
+        self._informes = self._contexto.Queue(maxsize=256)
+        self._procesos = {}
+        self._reinicios = {i: [] for i in range(len(self.camaras))}
+        self._fps = {}
+
+    def _lanzar(self, estacion):
+        proceso = self._contexto.Process(
+            target=ejecutar_estacion, name=f"estacion-{estacion + 1}",
+            args=(estacion, self.camaras[estacion], self.recursos.descriptor, self._informes))
+        proceso.start()
+        self._procesos[estacion] = proceso
+        print(f"Estación {estacion + 1} iniciada con la cámara {self.camaras[estacion]} (pid {proceso.pid})")
+
+    def _revisar(self, estacion, proceso):
+        """Reinicia una estación caída; retorna False si ya no debe seguir"""
+        if proceso.is_alive():
+            return True
+        self._fps.pop(estacion, None)
+        if proceso.exitcode == 0:
+            print(f"Estación {estacion + 1} terminada")
+            return False
+
+        ahora = time.monotonic()
+        recientes = [t for t in self._reinicios[estacion] if ahora - t < VENTANA_REINICIOS]
+        if len(recientes) >= MAX_REINICIOS:
+            print(f"Estación {estacion + 1} falla continuamente (código {proceso.exitcode}), se abandona")
+            return False
+        recientes.append(ahora)
+        self._reinicios[estacion] = recientes
+        print(f"Estación {estacion + 1} ha fallado (código {proceso.exitcode}), reiniciando")
+        self._lanzar(estacion)
+        return True
+
+    def _leer_informes(self):
+        while True:
+            try:
+                estacion, fps = self._informes.get_nowait()
+            except queue.Empty:
+                return
+            if estacion in self._procesos:
+                self._fps[estacion] = fps
+
+    def _informar(self):
+        detalle = ", ".join(f"estación {e + 1}: {fps:.1f}" for e, fps in sorted(self._fps.items()))
+        print(f"FPS total {sum(self._fps.values()):.1f} ({detalle or 'sin datos'})")
+
+    def ejecutar(self):
+        for estacion in range(len(self.camaras)):
+            self._lanzar(estacion)
+        ultimo_informe = time.monotonic()
+        try:
+            while self._procesos:
+                time.sleep(0.5)
+                self._leer_informes()
+                for estacion, proceso in list(self._procesos.items()):
+                    if not self._revisar(estacion, proceso):
+                        del self._procesos[estacion]
+                if time.monotonic() - ultimo_informe >= PERIODO_INFORME:
+                    ultimo_informe = time.monotonic()
+                    self._informar()
+        except KeyboardInterrupt:
+            print("Deteniendo estaciones...")
+        finally:
+            for proceso in self._procesos.values():
+                proceso.terminate()
+            for proceso in self._procesos.values():
+                proceso.join(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camaras", type=int, nargs="+", default=[0], help="Índices de las cámaras, una por estación")
+    args = parser.parse_args()
+
+    nombres, codificaciones = reconocedor_cara.indice_caras()
+    with open(RUTA_PREGUNTAS, "r", encoding="utf-8") as f:
+        preguntas = json.load(f)
+    recursos = RecursosCompartidos.publicar(nombres, codificaciones, preguntas)
+    print(f"Recursos compartidos: {len(set(nombres))} usuarios ({len(nombres)} prototipos de cara), {recursos.descriptor['bytes_preguntas']} bytes de preguntas")
+    try:
+        Supervisor(args.camaras, recursos).ejecutar()
+    finally:
+        recursos.liberar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Alta masiva de usuarios a partir de fotos, y copia de seguridad de usuarios y progreso.
+
+Importar: una carpeta de fotos y, opcionalmente, una lista de la clase (CSV con columna
+"nombre" y, si se quiere, "fotos" y "nivel"). Las fotos de cada niño se buscan en
+"fotos" (ficheros o subcarpetas relativos a la carpeta, separados por |) o, si no hay,
+en la subcarpeta <nombre>/ o en los ficheros <nombre>.jpg, <nombre>_2.jpg... Sin lista,
+cada subcarpeta (o cada foto suelta) es un usuario.
+Las caras se codifican en paralelo en varios procesos con los mismos controles de calidad
+que el registro con cámara, y los usuarios válidos se guardan en una sola escritura atómica
+al final: si se interrumpe la importación no queda ninguno a medias.
+
+Exportar/restaurar: usuarios con sus caras, nivel y progreso en un solo JSON para pasar
+de una máquina a otra; --csv escribe además el progreso en una tabla para el profesor.
+
+Uso:
+    python gestion_usuarios.py importar fotos_clase/ --lista clase.csv
+    python gestion_usuarios.py importar fotos_clase/ --procesos 8 --simular
+    python gestion_usuarios.py exportar copia.json --csv progreso.csv
+    python gestion_usuarios.py restaurar copia.json [--reemplazar]
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import numpy as np
+
+from reconocedores import reconocedor_cara
+
+VERSION_COPIA = 1
+EXTENSIONES = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+LADO_MAXIMO = 1600   # Las fotos de móvil se reducen antes de buscar la cara
+ANCHO_BARRA = 30
+
+
+def _es_imagen(ruta):
+    return os.path.isfile(ruta) and ruta.lower().endswith(EXTENSIONES)
+
+
+def _imagenes_de(ruta):
+    if os.path.isdir(ruta):
+        return sorted(os.path.join(ruta, f) for f in os.listdir(ruta) if _es_imagen(os.path.join(ruta, f)))
+    return [ruta] if _es_imagen(ruta) else []
+
+
+def _es_foto_de(base, prefijo):
+    """<nombre> o <nombre>_<n> (así "ana_2" es de Ana pero "ana_maria" no)"""
+    return base == prefijo or (base.startswith(prefijo + "_") and base[len(prefijo) + 1:].isdigit())
+
+
+def leer_lista(ruta):
+    """Filas de la lista de la clase como diccionarios (separador , ; o tabulador)"""
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        filas = [{(k or "").strip().lower(): (v or "").strip() for k, v in fila.items()}
+                 for fila in csv.DictReader(f, dialect=dialecto)]
+    if filas and "nombre" not in filas[0]:
+        raise ValueError(f"La lista {ruta} no tiene columna 'nombre'")
+    return [fila for fila in filas if fila["nombre"]]
+
+
+def fotos_alumnos(carpeta, filas=None):
+    """
+    Retorna {nombre: {"fotos": [rutas], "nivel": int}}. Sin `filas` (lista de la clase)
+    cada subcarpeta o foto suelta de `carpeta` es un usuario.
+    """
+    if filas is None:
+        filas = []
+        for entrada in sorted(os.listdir(carpeta)):
+            ruta = os.path.join(carpeta, entrada)
+            if os.path.isdir(ruta):
+                filas.append({"nombre": entrada, "fotos": entrada})
+            elif _es_imagen(ruta):
+                # ana.jpg, ana_2.jpg... son todas de "ana"
+                base = os.path.splitext(entrada)[0]
+                nombre, _, numero = base.rpartition("_")
+                filas.append({"nombre": nombre if nombre and numero.isdigit() else base, "fotos": entrada})
+
+    alumnos = {}
+    for fila in filas:
+        nombre = fila["nombre"]
+        if fila.get("fotos"):
+            fotos = [f for parte in fila["fotos"].split("|") if parte.strip()
+                     for f in _imagenes_de(os.path.join(carpeta, parte.strip()))]
+        else:
+            fotos = _imagenes_de(os.path.join(carpeta, nombre))
+            prefijo = nombre.lower()
+            fotos += [os.path.join(carpeta, f) for f in sorted(os.listdir(carpeta))
+                      if _es_imagen(os.path.join(carpeta, f))
+                      and _es_foto_de(os.path.splitext(f)[0].lower(), prefijo)]
+        alumno = alumnos.setdefault(nombre, {"fotos": [], "nivel": 1})
+        alumno["fotos"] += fotos
+        if fila.get("nivel"):
+            alumno["nivel"] = int(fila["nivel"])
+    return alumnos
+
+
+def _iniciar_proceso():
+    # Un hilo de OpenCV por proceso: el paralelismo ya lo dan los procesos
+    cv2.setNumThreads(1)
+
+
+def codificar_foto(ruta):
+    """En un proceso del pool: (ruta, codificación o None, motivo del descarte)"""
+    try:
+        # imdecode en lugar de imread para aceptar rutas con tildes o ñ en Windows
+        frame = cv2.imdecode(np.fromfile(ruta, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except OSError as e:
+        return ruta, None, str(e)
+    if frame is None:
+        return ruta, None, "no es una imagen"
+    escala = LADO_MAXIMO / max(frame.shape[:2])
+    if escala < 1.0:
+        frame = cv2.resize(frame, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    codificacion, motivo = reconocedor_cara.codificacion_de_calidad(frame)
+    return ruta, codificacion, motivo
+
+
+def barra_progreso(hechos, total, inicio):
+    llenos = int(ANCHO_BARRA * hechos / max(total, 1))
+    transcurrido = time.monotonic() - inicio
+    ritmo = hechos / transcurrido if transcurrido > 0 else 0.0
+    quedan = (total - hechos) / ritmo if ritmo > 0 else 0.0
+    print(f"\r[{'#' * llenos}{'-' * (ANCHO_BARRA - llenos)}] {hechos}/{total} fotos "
+          f"{ritmo:5.1f} fotos/s, quedan {int(quedan) // 60}m{int(quedan) % 60:02d}s", end="", flush=True)
+
+
+def codificar_fotos(rutas, procesos=None):
+    """{ruta: (codificación o None, motivo)} codificando en un pool de procesos"""
+    resultados = {}
+    if not rutas:
+        return resultados
+    inicio = time.monotonic()
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+        pendientes = [pool.submit(codificar_foto, ruta) for ruta in rutas]
+        for hechos, futuro in enumerate(as_completed(pendientes), 1):
+            ruta, codificacion, motivo = futuro.result()
+            resultados[ruta] = (codificacion, motivo)
+            barra_progreso(hechos, len(rutas), inicio)
+    print()
+    return resultados
+
+
+def parecidos(usuarios, nuevos):
+    """Pares (nuevo, existente) cuyas caras están dentro del umbral de identificación"""
+    nombres, matriz = reconocedor_cara.indice_caras(usuarios)
+    pares = []
+    if not len(nombres):
+        return pares
+    for nombre, datos in nuevos.items():
+        distancias = np.linalg.norm(matriz - datos["codificacion"], axis=1)
+        for i in np.flatnonzero(distancias <= reconocedor_cara.UMBRAL_SIMILITUD):
+            if nombres[i] != nombre and (nombre, nombres[i]) not in pares:
+                pares.append((nombre, nombres[i]))
+    return pares
+
+
+def fusionar(usuarios, nuevos, reemplazar):
+    """
+    Añade `nuevos` a `usuarios`. Un nombre que ya existe se salta, o con `reemplazar`
+    se le cambian las caras conservando su nivel y progreso. Retorna (añadidos, saltados).
+    """
+    anadidos, saltados = [], []
+    for nombre, datos in nuevos.items():
+        if nombre in usuarios:
+            if not reemplazar:
+                saltados.append(nombre)
+                continue
+            datos = {**datos, "nivel": usuarios[nombre].get("nivel", 1),
+                     "progreso": usuarios[nombre].get("progreso", {}),
+                     "preferencias": usuarios[nombre].get("preferencias") or datos.get("preferencias")}
+        usuarios[nombre] = datos
+        anadidos.append(nombre)
+    return anadidos, saltados
+
+
+def importar(args):
+    filas = leer_lista(args.lista) if args.lista else None
+    alumnos = fotos_alumnos(args.carpeta, filas)
+    sin_fotos = [n for n, a in alumnos.items() if not a["fotos"]]
+    rutas = sorted({ruta for a in alumnos.values() for ruta in a["fotos"]})
+    print(f"{len(alumnos)} alumnos, {len(rutas)} fotos")
+
+    resultados = codificar_fotos(rutas, args.procesos)
+
+    nuevos, fallidos = {}, {}
+    for nombre, alumno in alumnos.items():
+        codificaciones = [resultados[r][0] for r in alumno["fotos"] if resultados[r][0] is not None]
+        if len(codificaciones) < max(args.minimo, 1):
+            motivos = sorted({resultados[r][1] for r in alumno["fotos"] if resultados[r][0] is None})
+            fallidos[nombre] = ", ".join(motivos) or "sin fotos"
+            continue
+        prototipos, codificacion = reconocedor_cara.elegir_prototipos(codificaciones)
+        nuevos[nombre] = reconocedor_cara.nuevo_usuario(nombre, prototipos, codificacion, alumno["nivel"])
+
+    # Se relee justo antes de guardar para no pisar altas hechas mientras se codificaba
+    usuarios = reconocedor_cara.cargar_usuarios()
+    for nuevo, existente in parecidos(usuarios, nuevos):
+        print(f"Aviso: la cara de '{nuevo}' se parece a la de '{existente}'")
+    anadidos, saltados = fusionar(usuarios, nuevos, args.reemplazar)
+
+    for nombre in saltados:
+        print(f"'{nombre}' ya existe, se salta (usa --reemplazar para actualizar sus caras)")
+    for nombre, motivo in fallidos.items():
+        print(f"'{nombre}' no se registró: {motivo}")
+    if sin_fotos:
+        print(f"Sin fotos: {', '.join(sin_fotos)}")
+    if args.simular:
+        print(f"Simulación: se registrarían {len(anadidos)} usuarios")
+        return
+    if anadidos:
+        reconocedor_cara.guardar_usuarios(usuarios)
+    print(f"{len(anadidos)} usuarios registrados, {len(fallidos)} sin registrar, {len(saltados)} ya existían")
+
+
+def _escribir_atomico(ruta, escribir, **opciones):
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8", **opciones) as f:
+        escribir(f)
+    os.replace(temporal, ruta)
+
+
+def exportar(args):
+    usuarios = reconocedor_cara.cargar_usuarios()
+    copia = {
+        "version": VERSION_COPIA,
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "usuarios": reconocedor_cara.serializar_usuarios(usuarios),
+    }
+    _escribir_atomico(args.salida, lambda f: json.dump(copia, f, ensure_ascii=False))
+    print(f"{len(usuarios)} usuarios exportados a {args.salida}")
+
+    if args.csv:
+        def escribir_csv(f):
+            tabla = csv.writer(f)
+            tabla.writerow(["nombre", "nivel_actual", "nivel", "correctas", "total", "porcentaje", "completado"])
+            for nombre, datos in sorted(usuarios.items()):
+                progreso = datos.get("progreso", {})
+                if not progreso:
+                    tabla.writerow([nombre, datos.get("nivel", 1), "", "", "", "", ""])
+                for nivel, stats in sorted(progreso.items()):
+                    tabla.writerow([nombre, datos.get("nivel", 1), nivel, stats.get("correctas", ""),
+                                    stats.get("total", ""), round(stats.get("porcentaje", 0.0), 1),
+                                    stats.get("completado", False)])
+        _escribir_atomico(args.csv, escribir_csv, newline="")
+        print(f"Progreso escrito en {args.csv}")
+
+
+def restaurar(args):
+    with open(args.copia, "r", encoding="utf-8") as f:
+        copia = json.load(f)
+    if copia.get("version") != VERSION_COPIA:
+        print(f"Error: copia con versión {copia.get('version')} no soportada")
+        return
+    nuevos = reconocedor_cara.deserializar_usuarios(copia["usuarios"])
+    usuarios = reconocedor_cara.cargar_usuarios()
+    if args.reemplazar:
+        # La copia manda: caras, nivel y progreso tal como estaban
+        usuarios.update(nuevos)
+        anadidos, saltados = list(nuevos), []
+    else:
+        anadidos, saltados = fusionar(usuarios, nuevos, False)
+    if anadidos:
+        reconocedor_cara.guardar_usuarios(usuarios)
+    print(f"{len(anadidos)} usuarios restaurados de {args.copia} ({copia.get('fecha', '?')}), "
+          f"{len(saltados)} ya existían")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    acciones = parser.add_subparsers(dest="accion", required=True)
+
+    p = acciones.add_parser("importar", help="Registrar usuarios desde una carpeta de fotos")
+    p.add_argument("carpeta")
+    p.add_argument("--lista", help="CSV de la clase (columnas nombre, fotos, nivel)")
+    p.add_argument("--procesos", type=int, help="Procesos para codificar (por defecto, uno por núcleo)")
+    p.add_argument("--minimo", type=int, default=1, help="Fotos válidas necesarias por alumno")
+    p.add_argument("--reemplazar", action="store_true", help="Actualizar las caras de los que ya existen")
+    p.add_argument("--simular", action="store_true", help="Codificar y comprobar sin guardar nada")
+    p.set_defaults(funcion=importar)
+
+    p = acciones.add_parser("exportar", help="Copia de usuarios y progreso")
+    p.add_argument("salida")
+    p.add_argument("--csv", help="Escribir también el progreso en este CSV")
+    p.set_defaults(funcion=exportar)
+
+    p = acciones.add_parser("restaurar", help="Añadir los usuarios de una copia")
+    p.add_argument("copia")
+    p.add_argument("--reemplazar", action="store_true", help="Sobrescribir los que ya existen")
+    p.set_defaults(funcion=restaurar)
+
+    args = parser.parse_args()
+    args.funcion(args)
+
+
+if __name__ == "__main__":
+    main()
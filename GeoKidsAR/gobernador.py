@@ -0,0 +1,119 @@
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+
+RUTA_REGISTRO = os.path.join("datos", "metricas", "gobernador.jsonl")
+
+# Niveles de calidad, de mejor a peor. El nivel 0 es el comportamiento original del juego.
+#   escala_deteccion: factor de reducción del frame antes de detectMarkers
+#   detectar_cada:    se detecta 1 de cada N frames; en los demás se siguen las esquinas
+#   sombreado:        "completo" (caras semitransparentes) o "simple" (caras opacas, sin mezcla)
+#   refresco_panel:   el panel de la pregunta se recompone 1 de cada N frames
+NIVELES = [
+    {"nombre": "maxima", "escala_deteccion": 1.0,  "detectar_cada": 1, "sombreado": "completo", "refresco_panel": 1},
+    {"nombre": "alta",   "escala_deteccion": 1.0,  "detectar_cada": 2, "sombreado": "completo", "refresco_panel": 1},
+    {"nombre": "media",  "escala_deteccion": 0.75, "detectar_cada": 2, "sombreado": "simple",   "refresco_panel": 2},
+    {"nombre": "baja",   "escala_deteccion": 0.5,  "detectar_cada": 3, "sombreado": "simple",   "refresco_panel": 3},
+    {"nombre": "minima", "escala_deteccion": 0.5,  "detectar_cada": 4, "sombreado": "simple",   "refresco_panel": 4},
+]
+
+# Sin marcador a la vista durante un rato solo se busca de vez en cuando
+DETECTAR_CADA_EN_REPOSO = 10
+
+
+class GobernadorCalidad:
+    """
+    Vigila el tiempo de los últimos frames y sube o baja el nivel de calidad
+    para mantenerse dentro del presupuesto (objetivo_ms).
+    Baja si el percentil 90 supera el objetivo durante una ventana completa;
+    sube si se queda por debajo de objetivo * margen_subida durante más tiempo,
+    para no oscilar entre dos niveles.
+    """
+    def __init__(self, objetivo_ms=33.3, ventana=30, margen_subida=0.7, frames_para_subir=90,
+                 segundos_reposo=5.0, niveles=NIVELES, ruta_registro=RUTA_REGISTRO):
+        self.objetivo_ms = objetivo_ms
+        self.margen_subida = margen_subida
+        self.frames_para_subir = frames_para_subir
+        self.segundos_reposo = segundos_reposo
+        self.niveles = niveles
+        self.ruta_registro = ruta_registro
+        self.nivel = 0
+        self.en_reposo = False
+        self._tiempos = deque(maxlen=ventana)
+        self._frames_holgados = 0
+        self._frame = 0
+        self._ultimo_marcador = time.monotonic()
+
+    @staticmethod
+    def desde_entorno():
+        """
+        GEOKIDS_OBJETIVO_FRAME_MS fija el presupuesto por frame (33.3 ms por defecto).
+        GEOKIDS_GOBERNADOR=0 lo desactiva: se queda siempre en el nivel máximo.
+        """
+        if os.environ.get("GEOKIDS_GOBERNADOR") == "0":
+            return None
+        return GobernadorCalidad(objetivo_ms=float(os.environ.get("GEOKIDS_OBJETIVO_FRAME_MS", 33.3)))
+
+    @property
+    def calidad(self):
+        return self.niveles[self.nivel]
+
+    def debe_detectar(self):
+        """Indica si en el frame actual hay que ejecutar detectMarkers (si no, se sigue el marcador)"""
+        cada = self.calidad["detectar_cada"]
+        if self.en_reposo:
+            cada = max(cada, DETECTAR_CADA_EN_REPOSO)
+        return self._frame % cada == 0
+
+    def registrar_frame(self, ms, marcador_visto):
+        """Se llama al final de cada frame con su tiempo de procesado y si se vio el marcador"""
+        self._frame += 1
+        ahora = time.monotonic()
+
+        if marcador_visto:
+            self._ultimo_marcador = ahora
+            if self.en_reposo:
+                self.en_reposo = False
+                self._registrar("reposo", "activo", "marcador a la vista")
+        elif not self.en_reposo and ahora - self._ultimo_marcador > self.segundos_reposo:
+            self.en_reposo = True
+            self._registrar("activo", "reposo", f"sin marcador {self.segundos_reposo:.0f} s")
+
+        # En reposo los tiempos no son representativos del juego
+        if self.en_reposo:
+            return
+
+        self._tiempos.append(ms)
+        if len(self._tiempos) < self._tiempos.maxlen:
+            return
+        p90 = float(np.percentile(np.fromiter(self._tiempos, dtype=np.float64, count=len(self._tiempos)), 90))
+
+        if p90 > self.objetivo_ms and self.nivel < len(self.niveles) - 1:
+            self._cambiar(self.nivel + 1, p90)
+        elif p90 < self.objetivo_ms * self.margen_subida and self.nivel > 0:
+            self._frames_holgados += 1
+            if self._frames_holgados >= self.frames_para_subir:
+                self._cambiar(self.nivel - 1, p90)
+        else:
+            self._frames_holgados = 0
+
+    def _cambiar(self, nivel, p90):
+        anterior = self.calidad["nombre"]
+        self.nivel = nivel
+        self._tiempos.clear()
+        self._frames_holgados = 0
+        self._registrar(anterior, self.calidad["nombre"], f"p90 {p90:.1f} ms, objetivo {self.objetivo_ms:.1f} ms")
+
+    def _registrar(self, de, a, motivo):
+        print(f"Calidad: {de} -> {a} ({motivo})")
+        if not self.ruta_registro:
+            return
+        linea = {"t": time.time(), "de": de, "a": a, "motivo": motivo, "objetivo_ms": self.objetivo_ms}
+        try:
+            os.makedirs(os.path.dirname(self.ruta_registro), exist_ok=True)
+            with open(self.ruta_registro, "a", encoding="utf-8") as f:
+                f.write(json.dumps(linea) + "\n")
+        except OSError as e:
+            print(f"No se pudo registrar el cambio de calidad: {e}")
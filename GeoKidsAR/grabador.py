@@ -0,0 +1,222 @@
+import cv2
+import json
+import os
+import queue
+import threading
+import time
+
+# Políticas cuando el codificador no da abasto y la cola está llena
+DESCARTAR_NUEVO = "descartar_nuevo"      # Se pierde el frame que llega
+DESCARTAR_ANTIGUO = "descartar_antiguo"  # Se pierde el frame más viejo de la cola
+
+PISTAS = ("camara", "salida")
+
+
+class Grabador:
+    """
+    Graba la sesión sin frenar el bucle del juego: el bucle solo deja los frames en una
+    cola acotada y un hilo en segundo plano los codifica (cv2.VideoWriter libera el GIL).
+    Se guardan dos pistas de video, lo que vio la cámara y lo que se mostró, y un fichero
+    JSON-lines con las poses de los marcadores y las teclas de cada frame.
+    Si la cola se llena se descartan frames según la política, nunca se espera. Como
+    cada pista puede perder frames distintos, junto a cada video se escribe <pista>.frames:
+    la línea k es el número de frame del sidecar que corresponde al frame k del video.
+    """
+    def __init__(self, carpeta, fps=30.0, capacidad=64, politica=DESCARTAR_ANTIGUO, codec="MJPG"):
+        if politica not in (DESCARTAR_NUEVO, DESCARTAR_ANTIGUO):
+            raise ValueError(f"Política de descarte desconocida: {politica}")
+        self.carpeta = carpeta
+        self.fps = fps
+        self.politica = politica
+        self.codec = codec
+        self.descartados = {pista: 0 for pista in PISTAS}
+        self.escritos = {pista: 0 for pista in PISTAS}
+        self._frames = queue.Queue(maxsize=capacidad)
+        self._metadatos = queue.SimpleQueue()  # Líneas del sidecar, pequeñas: nunca se descartan
+        self._escritores = {}
+        self._indices = {}
+        self._indice = -1
+        self._registro = None
+        self._hilo = None
+        self._inicio = None
+
+    def iniciar(self):
+        os.makedirs(self.carpeta, exist_ok=True)
+        self._inicio = time.perf_counter()
+        self._hilo = threading.Thread(target=self._bucle, name="grabador", daemon=True)
+        self._hilo.start()
+        return self
+
+    # --- Llamadas desde el bucle del juego (baratas) ---
+
+    def nuevo_frame(self):
+        """Empieza el registro de un frame; el anterior se envía al sidecar"""
+        self._cerrar_registro()
+        self._indice += 1
+        self._registro = {"frame": self._indice, "t": round(time.perf_counter() - self._inicio, 4),
+                          "marcadores": [], "teclas": []}
+
+    def frame_camara(self, frame):
+        """
+        Frame tal como llega de la cámara. Es lo único que se copia: el bucle dibuja
+        encima después, y la copia se hace solo si el frame va a entrar en la cola.
+        """
+        if self.politica == DESCARTAR_NUEVO and self._frames.full():
+            self._descartar("camara")
+            return
+        self._encolar("camara", frame.copy())
+
+    def frame_salida(self, frame):
+        """
+        Frame compuesto que se muestra. También se copia: algunas pantallas siguen
+        dibujando sobre un frame después de mostrarlo.
+        """
+        if self.politica == DESCARTAR_NUEVO and self._frames.full():
+            self._descartar("salida")
+            return
+        self._encolar("salida", frame.copy())
+
+    def marcador(self, marcador):
+        if self._registro is None or marcador is None:
+            return
+        datos = {"id": marcador.id, "esquinas": marcador.esquinas.tolist()}
+        if marcador.rvec is not None:
+            datos["rvec"] = marcador.rvec.ravel().tolist()
+            datos["tvec"] = marcador.tvec.ravel().tolist()
+        self._registro["marcadores"].append(datos)
+
+    def tecla(self, codigo):
+        if self._registro is not None and codigo != 255:
+            self._registro["teclas"].append(codigo)
+
+    def detener(self):
+        """Vacía la cola, cierra los videos y el sidecar"""
+        self._cerrar_registro()
+        if self._hilo is not None:
+            self._frames.put(None)  # Fin; bloquea como mucho hasta que haya hueco
+            self._hilo.join()
+            self._hilo = None
+        print(f"Grabación guardada en {self.carpeta} - escritos {self.escritos}, descartados {self.descartados}")
+
+    # --- Internas ---
+
+    def _descartar(self, pista):
+        self.descartados[pista] += 1
+        if self._registro is not None:
+            self._registro.setdefault("descartados", []).append(pista)
+
+    def _encolar(self, pista, frame):
+        elemento = (pista, self._indice, frame)
+        try:
+            self._frames.put_nowait(elemento)
+            return
+        except queue.Full:
+            pass
+        if self.politica == DESCARTAR_ANTIGUO:
+            try:
+                viejo = self._frames.get_nowait()
+                if viejo is not None:
+                    self.descartados[viejo[0]] += 1
+                self._frames.put_nowait(elemento)
+                return
+            except (queue.Empty, queue.Full):
+                pass
+        self._descartar(pista)
+
+    def _cerrar_registro(self):
+        if self._registro is not None:
+            self._metadatos.put(self._registro)
+            self._registro = None
+
+    def _escribir_metadatos(self, fichero):
+        while True:
+            try:
+                registro = self._metadatos.get_nowait()
+            except queue.Empty:
+                return
+            fichero.write(json.dumps(registro) + "\n")
+
+    def _escritor(self, pista, frame):
+        escritor = self._escritores.get(pista)
+        if escritor is None:
+            ruta = os.path.join(self.carpeta, f"{pista}.avi")
+            alto, ancho = frame.shape[:2]
+            escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*self.codec), self.fps, (ancho, alto))
+            self._escritores[pista] = escritor
+        return escritor
+
+    def _bucle(self):
+        self._indices = {pista: open(os.path.join(self.carpeta, f"{pista}.frames"), "w", encoding="utf-8")
+                         for pista in PISTAS}
+        with open(os.path.join(self.carpeta, "sesion.jsonl"), "w", encoding="utf-8") as sidecar:
+            while True:
+                try:
+                    elemento = self._frames.get(timeout=0.2)
+                except queue.Empty:
+                    self._escribir_metadatos(sidecar)
+                    continue
+                if elemento is None:
+                    break
+                pista, indice, frame = elemento
+                self._escritor(pista, frame).write(frame)
+                self._indices[pista].write(f"{indice}\n")
+                self.escritos[pista] += 1
+                self._escribir_metadatos(sidecar)
+            self._escribir_metadatos(sidecar)
+        for escritor in self._escritores.values():
+            escritor.release()
+        for fichero in self._indices.values():
+            fichero.close()
+
+
+class EntornoGrabado:
+    """
+    Envuelve un entorno de main (EntornoCamara, EntornoRepeticion...) y graba
+    todo lo que pasa por él: frames leídos, frames mostrados, teclas y marcadores.
+    """
+    def __init__(self, entorno, grabador):
+        self._entorno = entorno
+        self.grabador = grabador
+
+    def __getattr__(self, nombre):
+        return getattr(self._entorno, nombre)
+
+    def abrir(self):
+        self.grabador.iniciar()
+        self._entorno.abrir()
+
+    def leer(self):
+        ret, frame = self._entorno.leer()
+        if ret:
+            self.grabador.nuevo_frame()
+            self.grabador.frame_camara(frame)
+        return ret, frame
+
+    def mostrar(self, frame):
+        self._entorno.mostrar(frame)
+        self.grabador.frame_salida(frame)
+
+    def tecla(self, espera=1):
+        codigo = self._entorno.tecla(espera)
+        self.grabador.tecla(codigo)
+        return codigo
+
+    def marcador_detectado(self, marcador):
+        self.grabador.marcador(marcador)
+        self._entorno.marcador_detectado(marcador)
+
+    def cerrar(self, resumen):
+        try:
+            self._entorno.cerrar(resumen)
+        finally:
+            self.grabador.detener()
+
+
+def envolver_si_se_pide(entorno, fps=30.0):
+    """Con GEOKIDS_GRABAR=carpeta, devuelve el entorno envuelto en un EntornoGrabado"""
+    carpeta = os.environ.get("GEOKIDS_GRABAR")
+    if not carpeta:
+        return entorno
+    carpeta = os.path.join(carpeta, time.strftime("%Y%m%d_%H%M%S"))
+    print(f"Grabando la sesión en {carpeta}")
+    return EntornoGrabado(entorno, Grabador(carpeta, fps=fps))
@@ -0,0 +1,138 @@
+import cv2
+import numpy as np
+import json
+import os
+import time
+
+RUTA_AVISOS = os.path.join("datos", "metricas", "iluminacion.jsonl")
+TECLA_ILUMINACION = ord('l')
+CADA_FRAMES = 15      # Frames entre análisis
+REDUCCION = 8         # El análisis se hace sobre el frame reducido 1/8 por lado
+BINS = 32
+
+# Umbrales sobre la luma (0-255) del frame reducido
+OSCURO_MEDIA = 60
+OSCURO_P95 = 110
+SOBREEXPUESTO_SATURADOS = 0.15   # Fracción de píxeles >= 250
+CONTRALUZ_DIFERENCIA = 50        # Borde mucho más claro que el centro
+POCO_CONTRASTE = 40              # p95 - p5
+
+
+class DiagnosticoIluminacion:
+    """
+    Estadísticas de luz cada `cada` frames sobre una versión reducida del frame
+    (cv2.resize + cvtColor + calcHist, muy por debajo de 1 ms):
+        media, p5, p95 de la luma, fracción de saturados, saturación de color media
+        y diferencia de luma entre el borde y el centro de la imagen.
+    A partir de ellas da avisos ("oscuro", "sobreexpuesto", "contraluz", "poco_contraste")
+    que se imprimen y se guardan en RUTA_AVISOS cuando cambian, y una sugerencia de
+    exposición para la cámara (ver EntornoCamara.ajustar_exposicion).
+    """
+    def __init__(self, cada=CADA_FRAMES, reduccion=REDUCCION, ruta_avisos=RUTA_AVISOS):
+        self.cada = cada
+        self.reduccion = reduccion
+        self.ruta_avisos = ruta_avisos
+        self.visible = False
+        self.metricas = None
+        self.avisos = ()
+        self._hist_luma = None
+        self._frames = 0
+
+    def analizar(self, frame):
+        """Se llama en cada frame; solo calcula 1 de cada `cada`. Retorna True si ha calculado"""
+        self._frames += 1
+        if (self._frames - 1) % self.cada:
+            return False
+
+        alto, ancho = frame.shape[:2]
+        pequeno = cv2.resize(frame, (max(1, ancho // self.reduccion), max(1, alto // self.reduccion)),
+                             interpolation=cv2.INTER_NEAREST)
+        luma = cv2.cvtColor(pequeno, cv2.COLOR_BGR2GRAY)
+        hsv = cv2.cvtColor(pequeno, cv2.COLOR_BGR2HSV)
+
+        hist = cv2.calcHist([luma], [0], None, [256], [0, 256]).ravel()
+        acumulado = np.cumsum(hist) / max(hist.sum(), 1.0)
+        saturacion = cv2.calcHist([hsv], [1], None, [BINS], [0, 256]).ravel()
+
+        # Centro (mitad central) frente al resto de la imagen
+        h, w = luma.shape
+        centro = luma[h // 4:h - h // 4, w // 4:w - w // 4]
+        suma_total, suma_centro = float(luma.sum()), float(centro.sum())
+        n_borde = luma.size - centro.size
+        media_borde = (suma_total - suma_centro) / n_borde if n_borde else 0.0
+
+        self.metricas = {
+            "media": suma_total / luma.size,
+            "p5": int(np.searchsorted(acumulado, 0.05)),
+            "p95": int(np.searchsorted(acumulado, 0.95)),
+            "saturados": float(hist[250:].sum() / luma.size),
+            "saturacion_color": float(np.dot(saturacion, np.arange(BINS) * (256 / BINS)) / max(saturacion.sum(), 1.0)),
+            "centro_borde": media_borde - suma_centro / max(centro.size, 1),
+        }
+        # Histograma de luma agrupado para el overlay
+        self._hist_luma = hist.reshape(BINS, -1).sum(axis=1)
+        self._actualizar_avisos()
+        return True
+
+    def _actualizar_avisos(self):
+        m = self.metricas
+        avisos = []
+        if m["media"] < OSCURO_MEDIA and m["p95"] < OSCURO_P95:
+            avisos.append("oscuro")
+        if m["saturados"] > SOBREEXPUESTO_SATURADOS:
+            avisos.append("sobreexpuesto")
+        if m["centro_borde"] > CONTRALUZ_DIFERENCIA:
+            avisos.append("contraluz")
+        if m["p95"] - m["p5"] < POCO_CONTRASTE:
+            avisos.append("poco_contraste")
+        avisos = tuple(avisos)
+        if avisos != self.avisos:
+            self.avisos = avisos
+            self._registrar()
+
+    def _registrar(self):
+        print(f"Iluminacion: {', '.join(self.avisos) if self.avisos else 'correcta'}")
+        if not self.ruta_avisos:
+            return
+        linea = {"t": time.time(), "avisos": list(self.avisos),
+                 "metricas": {k: round(v, 3) for k, v in self.metricas.items()}}
+        try:
+            os.makedirs(os.path.dirname(self.ruta_avisos), exist_ok=True)
+            with open(self.ruta_avisos, "a", encoding="utf-8") as f:
+                f.write(json.dumps(linea) + "\n")
+        except OSError as e:
+            print(f"No se pudo registrar el aviso de iluminación: {e}")
+
+    def sugerencia_exposicion(self):
+        """
+        Retorna la corrección sugerida en pasos: >0 subir exposición, <0 bajarla, 0 dejarla.
+        Con contraluz se sube aunque la media sea correcta, para ver el marcador del centro.
+        """
+        if self.metricas is None:
+            return 0
+        if "sobreexpuesto" in self.avisos and "contraluz" not in self.avisos:
+            return -1
+        if "oscuro" in self.avisos or "contraluz" in self.avisos:
+            return 1
+        return 0
+
+    def alternar(self):
+        self.visible = not self.visible
+
+    def dibujar(self, frame):
+        """Histograma de luma y avisos en la esquina inferior izquierda (solo si visible o con avisos)"""
+        if self._hist_luma is None or not (self.visible or self.avisos):
+            return
+        ancho_barra, alto_max = 4, 50
+        x0 = 10
+        y0 = frame.shape[0] - 40
+        if self.visible:
+            roi = frame[max(0, y0 - alto_max - 4):y0 + 2, x0 - 4:x0 + BINS * ancho_barra + 4]
+            roi //= 3
+            alturas = (self._hist_luma / max(self._hist_luma.max(), 1.0) * alto_max).astype(np.int32)
+            for i, altura in enumerate(alturas):
+                x = x0 + i * ancho_barra
+                cv2.rectangle(frame, (x, y0 - int(altura)), (x + ancho_barra - 2, y0), (200, 200, 200), -1)
+        texto = ", ".join(self.avisos) if self.avisos else f"luz media {self.metricas['media']:.0f}"
+        cv2.putText(frame, texto, (x0, y0 + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                    (0, 165, 255) if self.avisos else (0, 255, 0), 2)
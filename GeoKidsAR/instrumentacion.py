@@ -0,0 +1,202 @@
+import cv2
+import numpy as np
+import json
+import os
+import time
+from collections import deque
+
+# Número de muestras que se guardan por etapa para calcular percentiles
+VENTANA_MUESTRAS = 240
+RUTA_METRICAS = os.path.join("datos", "metricas", "tiempos.jsonl")
+PERIODO_EXPORTACION = 5.0  # segundos entre líneas del fichero JSON
+TECLA_HUD = ord('h')
+
+
+class _TramoNulo:
+    """Tramo que no mide nada; se reutiliza siempre la misma instancia cuando la instrumentación está apagada"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_TRAMO_NULO = _TramoNulo()
+
+
+class _Tramo:
+    __slots__ = ("_instrumentacion", "_nombre", "_inicio")
+
+    def __init__(self, instrumentacion, nombre):
+        self._instrumentacion = instrumentacion
+        self._nombre = nombre
+
+    def __enter__(self):
+        for observador in self._instrumentacion.observadores:
+            observador.inicio_tramo(self._nombre)
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ms = (time.perf_counter() - self._inicio) * 1000.0
+        instrumentacion = self._instrumentacion
+        if instrumentacion.activa:
+            instrumentacion.registrar(self._nombre, ms)
+        for observador in reversed(instrumentacion.observadores):
+            observador.fin_tramo(self._nombre)
+        return False
+
+
+class Instrumentacion:
+    """
+    Mide el tiempo de cada etapa del bucle con tramos con nombre:
+
+        with tramo("deteccion"):
+            ...
+
+    Guarda las últimas muestras de cada etapa para dar p50/p95/p99, calcula los FPS
+    y la latencia desde la captura hasta que el frame se muestra.
+    Apagada, cada tramo cuesta una llamada y una comprobación.
+
+    Los observadores (p. ej. memoria.MedidorMemoria) reciben inicio_tramo/fin_tramo
+    e inicio_frame/fin_frame aunque la medida de tiempos esté apagada.
+    """
+    def __init__(self, activa=False, ventana=VENTANA_MUESTRAS, ruta_exportacion=None,
+                 periodo_exportacion=PERIODO_EXPORTACION):
+        self.activa = activa
+        self.hud_visible = False
+        self.ventana = ventana
+        self.ruta_exportacion = ruta_exportacion
+        self.periodo_exportacion = periodo_exportacion
+        self._muestras = {}         # nombre -> deque de ms
+        self._fin_frames = deque(maxlen=ventana)
+        self._frame_actual = {}     # nombre -> ms acumulados en el frame en curso
+        self._t_captura = None
+        self._ultima_exportacion = time.monotonic()
+        self._cache_estadisticas = None
+        self._t_estadisticas = 0.0
+        self.observadores = []
+
+    def agregar_observador(self, observador):
+        """
+        Añade un objeto con los métodos inicio_tramo(nombre), fin_tramo(nombre),
+        inicio_frame() y fin_frame() que se llamarán en esos mismos puntos.
+        """
+        self.observadores.append(observador)
+
+    def quitar_observador(self, observador):
+        if observador in self.observadores:
+            self.observadores.remove(observador)
+
+    def tramo(self, nombre):
+        if not self.activa and not self.observadores:
+            return _TRAMO_NULO
+        return _Tramo(self, nombre)
+
+    def registrar(self, nombre, ms):
+        """Añade una muestra (en milisegundos) a la etapa indicada"""
+        muestras = self._muestras.get(nombre)
+        if muestras is None:
+            muestras = self._muestras[nombre] = deque(maxlen=self.ventana)
+        muestras.append(ms)
+        self._frame_actual[nombre] = self._frame_actual.get(nombre, 0.0) + ms
+
+    def inicio_frame(self, t_captura=None):
+        """Marca el instante de captura del frame (time.perf_counter)"""
+        for observador in self.observadores:
+            observador.inicio_frame()
+        if self.activa:
+            self._t_captura = time.perf_counter() if t_captura is None else t_captura
+
+    def fin_frame(self):
+        """
+        Cierra el frame después de mostrarlo: registra la latencia de extremo a extremo
+        y exporta si toca. Retorna los ms de cada etapa en este frame (o None si está apagada).
+        """
+        for observador in self.observadores:
+            observador.fin_frame()
+        if not self.activa:
+            return None
+        ahora = time.perf_counter()
+        if self._t_captura is not None:
+            self.registrar("latencia", (ahora - self._t_captura) * 1000.0)
+            self._t_captura = None
+        self._fin_frames.append(ahora)
+
+        tiempos_frame = self._frame_actual
+        self._frame_actual = {}
+
+        if self.ruta_exportacion and time.monotonic() - self._ultima_exportacion >= self.periodo_exportacion:
+            self.exportar()
+        return tiempos_frame
+
+    def fps(self):
+        if len(self._fin_frames) < 2:
+            return 0.0
+        duracion = self._fin_frames[-1] - self._fin_frames[0]
+        return (len(self._fin_frames) - 1) / duracion if duracion > 0 else 0.0
+
+    def estadisticas(self):
+        """Retorna {etapa: {"p50", "p95", "p99", "n"}} con los tiempos en ms"""
+        resultado = {}
+        for nombre, muestras in self._muestras.items():
+            if not muestras:
+                continue
+            p50, p95, p99 = np.percentile(np.fromiter(muestras, dtype=np.float64, count=len(muestras)), (50, 95, 99))
+            resultado[nombre] = {"p50": float(p50), "p95": float(p95), "p99": float(p99), "n": len(muestras)}
+        return resultado
+
+    def exportar(self):
+        """Añade una línea JSON con FPS y percentiles de cada etapa"""
+        self._ultima_exportacion = time.monotonic()
+        linea = {"t": time.time(), "fps": round(self.fps(), 2), "etapas": self.estadisticas()}
+        try:
+            os.makedirs(os.path.dirname(self.ruta_exportacion) or ".", exist_ok=True)
+            with open(self.ruta_exportacion, "a", encoding="utf-8") as f:
+                f.write(json.dumps(linea) + "\n")
+        except OSError as e:
+            print(f"No se pudieron exportar las métricas: {e}")
+
+    def alternar_hud(self):
+        """Muestra u oculta el HUD; mostrarlo enciende la instrumentación si estaba apagada"""
+        self.hud_visible = not self.hud_visible
+        if self.hud_visible:
+            self.activa = True
+
+    def dibujar_hud(self, frame):
+        if not self.hud_visible:
+            return
+        # Los percentiles se recalculan como mucho 4 veces por segundo
+        ahora = time.monotonic()
+        if self._cache_estadisticas is None or ahora - self._t_estadisticas > 0.25:
+            self._cache_estadisticas = (self.fps(), self.estadisticas())
+            self._t_estadisticas = ahora
+        fps, estadisticas = self._cache_estadisticas
+
+        lineas = [f"FPS {fps:5.1f}   p50 / p95 / p99 ms"]
+        for nombre, e in estadisticas.items():
+            lineas.append(f"{nombre[:14]:<14} {e['p50']:6.1f} {e['p95']:6.1f} {e['p99']:6.1f}")
+
+        alto_linea = 18
+        x0 = frame.shape[1] - 330
+        y0 = frame.shape[0] - 10 - alto_linea * len(lineas)
+        roi = frame[max(0, y0 - 16):frame.shape[0] - 4, max(0, x0 - 8):frame.shape[1] - 4]
+        roi //= 3  # Oscurecer solo la zona del HUD
+        for i, linea in enumerate(lineas):
+            cv2.putText(frame, linea, (x0, y0 + i * alto_linea), cv2.FONT_HERSHEY_PLAIN,
+                        1.0, (0, 255, 0), 1, cv2.LINE_AA)
+
+
+def _desde_entorno():
+    """GEOKIDS_METRICAS=1 enciende la instrumentación y la exportación a RUTA_METRICAS"""
+    if os.environ.get("GEOKIDS_METRICAS") == "1":
+        return Instrumentacion(activa=True, ruta_exportacion=RUTA_METRICAS)
+    return Instrumentacion()
+
+# Instancia compartida por main y los reconocedores
+INSTRUMENTACION = _desde_entorno()
+
+
+def tramo(nombre):
+    return INSTRUMENTACION.tramo(nombre)
@@ -1,59 +1,229 @@
 # Main.py
 import json
 import cv2
+import numpy as np
 import os
+import time
 import unicodedata
 from reconocedores import detector_marcadores, reconocedor_cara, reconocedor_voz
-from reconocedores.figura_visual import mostrar_figura, dibujar_cubo, dibujar_piramide
-
+from reconocedores.figura_visual import dibujar_figura_plana, dibujar_cubo, dibujar_piramide
+from rectificacion import Rectificador
+from modelo_camara import ModeloCamara, negociar_resolucion, elegir_resolucion
+from instrumentacion import INSTRUMENTACION, TECLA_HUD, tramo
+from grabador import envolver_si_se_pide
+from gobernador import GobernadorCalidad, NIVELES
+from perfilador import PERFILADOR, TECLA_PERFIL
+from memoria import medidor_desde_entorno
+from iluminacion import DiagnosticoIluminacion, TECLA_ILUMINACION
+from texto import escribir, oscurecer
+from planificador import PlanificadorUI
+from analitica import RegistroRespuestas
+
+
+# Segundos que se muestra "Correcto"/"Incorrecto" tras responder
+DURACION_FEEDBACK = 1.0
+
+# Frames que descartar_frame saca como mucho del búfer de la cámara en cada llamada
+MAX_FRAMES_DESCARTE = 10
+
+# Exposición manual por backend de captura: (CAP_PROP_AUTO_EXPOSURE manual, automático,
+# unidades de CAP_PROP_EXPOSURE). V4L2 usa tiempo en unidades de 100 µs; DirectShow y
+# Media Foundation, log2 de segundos. Cada paso del diagnóstico de luz es un paso de diafragma
+# (el doble o la mitad de tiempo). En otros backends no se toca la exposición.
+EXPOSICION_BACKENDS = {
+    "V4L2": (1, 3, "lineal"),
+    "DSHOW": (0.25, 0.75, "log2"),
+    "MSMF": (0.25, 0.75, "log2"),
+}
 
 # Configuración para evitar errores de Qt en Linux
 os.environ['QT_QPA_PLATFORM'] = 'xcb'
 
 class RespuestaCorrecta:
-    def __init__(self, texto, es_correcta):
+    def __init__(self, texto, es_correcta, confianza=None):
         self.texto = texto
         self.es_correcta = es_correcta
+        self.confianza = confianza
 
 # Reemplazar la clase problemática
 reconocedor_voz.Respuesta = RespuestaCorrecta
 
-def mostrar_menu_inicial(cap):
+VENTANA = "GeoKids AR"
+
+class EntornoCamara:
+    """
+    Entrada y salida del juego en vivo: cámara, ventana de OpenCV, teclado,
+    micrófono y reconocimiento facial. El modo de repetición (repeticion.py)
+    implementa la misma interfaz sin ventana.
+    """
+    persistir = True       # Guardar el progreso de los usuarios
+    nivel_inicial = None   # Nivel forzado; None para usar el guardado del usuario
+    modelo = None          # ModeloCamara de la cámara (lo fija abrir_camara)
+
+    def __init__(self, cap, ventana=VENTANA, tamano=None):
+        self.cap = cap
+        self.ventana = ventana
+        self._tamano = tamano  # Resolución real negociada; si no se conoce se pregunta a la captura
+        self._exposicion_manual = None  # Entrada de EXPOSICION_BACKENDS si se pasó a manual
+        self.t_captura = None  # Instante de captura del último frame leído
+        self._t_exposicion = 0.0
+
+    def leer(self):
+        """
+        Lee un frame y guarda en self.t_captura (time.perf_counter) cuándo se capturó:
+        la marca de tiempo del buffer si el backend la da en el reloj monótono (V4L2),
+        si no, el momento en que grab() entrega el frame, antes de decodificarlo.
+        """
+        if not self.cap.grab():
+            return False, None
+        self.t_captura = time.perf_counter()
+        marca_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if marca_ms > 0:
+            antiguedad = time.monotonic() - marca_ms / 1000.0
+            if 0.0 <= antiguedad < 1.0:  # Solo si es del mismo reloj (y no una posición de video)
+                self.t_captura -= antiguedad
+        return self.cap.retrieve()
+
+    def tamano(self):
+        if self._tamano is not None:
+            return self._tamano
+        return (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def abrir(self):
+        cv2.namedWindow(self.ventana, cv2.WINDOW_NORMAL)
+        # El micrófono queda abierto toda la sesión (ver reconocedores/microfono.py)
+        reconocedor_voz.iniciar_microfono()
+
+    def mostrar(self, frame):
+        cv2.imshow(self.ventana, frame)
+
+    def tecla(self, espera=1):
+        return cv2.waitKey(espera) & 0xFF
+
+    def reloj(self):
+        """Segundos de reloj para los temporizadores de la interfaz"""
+        return time.monotonic()
+
+    def descartar_frame(self):
+        """
+        En las pantallas estáticas: vacía el búfer de la cámara sin decodificar. Se hace grab()
+        mientras devuelva frames ya encolados; el primero que tarda medio periodo de frame
+        es uno nuevo y se para ahí (como mucho MAX_FRAMES_DESCARTE)
+        """
+        periodo = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        for _ in range(MAX_FRAMES_DESCARTE):
+            inicio = time.monotonic()
+            if not self.cap.grab() or time.monotonic() - inicio >= periodo / 2:
+                break
+
+    def respuesta_voz(self, pregunta):
+        return reconocedor_voz.procesar_respuesta(pregunta)
+
+    def ajustar_exposicion(self, pasos):
+        """
+        Corrige la exposición de la cámara según la sugerencia del diagnóstico de luz.
+        Solo con GEOKIDS_AUTOEXPOSICION=1 y como mucho una vez cada 2 segundos.
+        """
+        if os.environ.get("GEOKIDS_AUTOEXPOSICION") != "1":
+            return
+        ahora = time.monotonic()
+        if pasos == 0 or ahora - self._t_exposicion < 2.0:
+            return
+        self._t_exposicion = ahora
+        if self._exposicion_manual is None:
+            backend = self.cap.getBackendName()
+            if backend not in EXPOSICION_BACKENDS:
+                print(f"No se sabe ajustar la exposición con el backend {backend}")
+                self._t_exposicion = float("inf")  # No se vuelve a intentar
+                return
+            # Sin pasar a manual el driver ignora o pisa el valor de CAP_PROP_EXPOSURE
+            manual, _, _ = EXPOSICION_BACKENDS[backend]
+            if not self.cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, manual):
+                print("La cámara no permite la exposición manual")
+                self._t_exposicion = float("inf")
+                return
+            self._exposicion_manual = EXPOSICION_BACKENDS[backend]
+        exposicion = self.cap.get(cv2.CAP_PROP_EXPOSURE)
+        if self._exposicion_manual[2] == "lineal":
+            nueva = max(1.0, round(exposicion * 2.0 ** pasos))
+        else:
+            nueva = exposicion + pasos
+        if self.cap.set(cv2.CAP_PROP_EXPOSURE, nueva):
+            print(f"Exposicion: {exposicion:g} -> {nueva:g}")
+
+    def identificar_usuario(self, frame):
+        return reconocedor_cara.identificar_usuario(frame)
+
+    def registrar_usuario(self, frame):
+        """
+        Registro con varias capturas: la vista previa sigue mientras un hilo recoge y
+        codifica las caras y otro escucha el nombre (ver reconocedor_cara.RegistroCara).
+        ESC cancela el registro. Si no se recoge ninguna cara válida se usa el frame recibido.
+        """
+        registro = reconocedor_cara.RegistroCara()
+        registro.iniciar()
+        while not registro.terminado():
+            ret, vista = self.leer()
+            if not ret:
+                break
+            registro.ofrecer(vista)
+            registro.dibujar(vista)
+            self.mostrar(vista)
+            if self.tecla(1) == 27:
+                registro.cancelar()
+                return None
+        return reconocedor_cara.registrar_usuario(frame, nombre=registro.nombre or "",
+                                                  codificaciones=registro.codificaciones)
+
+    def marcador_detectado(self, marcador):
+        """Se llama en cada frame del juego con el marcador detectado (o None)"""
+        pass
+
+    def fin_frame(self, tiempos):
+        """Se llama tras mostrar cada frame del juego con los ms por etapa (o None)"""
+        pass
+
+    def cerrar(self, resumen):
+        if self._exposicion_manual is not None:
+            # La cámara queda como estaba para otras aplicaciones
+            self.cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, self._exposicion_manual[1])
+        self.cap.release()
+        reconocedor_voz.detener_microfono()
+        cv2.destroyAllWindows()
+
+def mostrar_menu_inicial(entorno):
     """
     Muestra el menú inicial y captura la selección del usuario
     Retorna: 'iniciar_sesion', 'registrar' o None
     """
+    PERFILADOR.etiquetar("menu")
+    planificador = PlanificadorUI(entorno)
     while True:
-        ret, frame = cap.read()
+        ret, frame = entorno.leer()
         if not ret:
             return None
         
          # Oscurecer fondo para mejor legibilidad del texto
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, 0), (frame.shape[1], frame.shape[0]), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
+        oscurecer(frame, 0, 0, frame.shape[1], frame.shape[0], 0.3)
         
         # Título
         y_pos = frame.shape[0] // 3
-        cv2.putText(frame, "Bienvenido a GeoKids", (frame.shape[1]//2 - 200, y_pos), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 255, 255), 3)
+        escribir(frame, "Bienvenido a GeoKids", (frame.shape[1]//2 - 200, y_pos), 1.5, (0, 255, 255), 3)
         
         # Opciones
         y_pos += 100
-        cv2.putText(frame, "Pulse 1 para iniciar sesion", (frame.shape[1]//2 - 150, y_pos), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        escribir(frame, "Pulse 1 para iniciar sesion", (frame.shape[1]//2 - 150, y_pos), 1, (255, 255, 255), 2)
         
         y_pos += 60
-        cv2.putText(frame, "Pulse 2 para registrarte", (frame.shape[1]//2 - 150, y_pos), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        escribir(frame, "Pulse 2 para registrarte", (frame.shape[1]//2 - 150, y_pos), 1, (255, 255, 255), 2)
         
         y_pos += 100
-        cv2.putText(frame, "Pulse ESC para salir", (frame.shape[1]//2 - 120, y_pos), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 255), 1)
+        escribir(frame, "Pulse ESC para salir", (frame.shape[1]//2 - 120, y_pos), 0.8, (200, 200, 255), 1)
         
-        cv2.imshow("GeoKids AR", frame)
+        entorno.mostrar(frame)
         
-        key = cv2.waitKey(1) & 0xFF
+        # Cada vuelta la marca la cámara (leer bloquea hasta el siguiente frame)
+        key = planificador.sondear(1)
         if key == 27:  # ESC para salir
             return None
         elif key == ord('1'):
@@ -61,17 +231,48 @@ def mostrar_menu_inicial(cap):
         elif key == ord('2'):
             return 'registrar'
 
-def inicializar_aplicacion():
+def abrir_camara(modelo, camara=0, ventana=VENTANA, clase_entorno=EntornoCamara):
+    """
+    Abre la cámara indicada y ajusta la resolución de captura: fija (1280x720),
+    o la mayor que cumpla GEOKIDS_OBJETIVO_MS. Sin modelo se usa el de esa cámara
+    (calibraciones de datos/calibraciones con el dispositivo 'camara<N>').
+    Retorna: entorno de la clase indicada sobre esa cámara.
+    """
+    def procesar_frame_prueba(frame):
+        detector_marcadores.configurar_camara(*modelo.intrinsecos_frame(frame))
+        detector_marcadores.obtener_marcador_por_id(frame, 10, dibujar=True, estimar_pose=True)
+
+    cap = cv2.VideoCapture(camara)
+    if modelo is None:
+        modelo = ModeloCamara.por_defecto(f"camara{camara}")
+    objetivo_ms = os.environ.get("GEOKIDS_OBJETIVO_MS")
+    if objetivo_ms:
+        tamano = elegir_resolucion(cap, float(objetivo_ms), procesar_frame_prueba)
+    else:
+        tamano = negociar_resolucion(cap, (1280, 720))
+    entorno = clase_entorno(cap, ventana, tamano)
+    entorno.modelo = modelo
+    return entorno
+
+def inicializar_aplicacion(entorno=None, preguntas=None):
     """
     Inicializa la cámara y carga las preguntas desde un archivo JSON.
-    Retorna: objeto VideoCapture y diccionario con preguntas.
+    Si no se indica un entorno se abre la cámara 0; si no se indican preguntas se leen del fichero.
+    Retorna: entorno de entrada/salida, diccionario con preguntas y modelo de cámara.
     """
-    cap = cv2.VideoCapture(0)
-    
-    # Ajustar resolución de captura
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+    if entorno is None:
+        entorno = abrir_camara(None)
+    # El modelo de la cámara abierta, con sus calibraciones por resolución
+    modelo = getattr(entorno, "modelo", None) or ModeloCamara.por_defecto()
+    tamano = entorno.tamano()
+    print(f"Resolucion de captura: {tamano[0]}x{tamano[1]}")
+
+    # Intrínsecos adaptados a la resolución negociada (la calibración se hizo a otra)
+    detector_marcadores.configurar_camara(*modelo.intrinsecos(tamano))
     
+    if preguntas is not None:
+        return entorno, preguntas, modelo
+
     # Cargar preguntas desde archivo JSON; si falla, cargar datos por defecto
     try:
         with open("datos/preguntas.json", "r", encoding="utf-8") as f:
@@ -79,67 +280,117 @@ def inicializar_aplicacion():
     except Exception:
         preguntas = {"modo_test": {"1": {"10": {"figura": "forma_generica", "preguntas": []}}}}
     
-    return cap, preguntas
+    return entorno, preguntas, modelo
 
+def crear_rectificador(modelo):
+    """
+    Activa el flujo rectificado si GEOKIDS_RECTIFICAR=1: cada frame se remapea una vez
+    y el detector trabaja con distorsión nula.
+    Retorna: Rectificador o None si no está activado.
+    """
+    if os.environ.get("GEOKIDS_RECTIFICAR") != "1":
+        return None
+    print("Flujo rectificado activado")
+    return Rectificador(modelo=modelo, al_cambiar=detector_marcadores.configurar_camara)
 
         
 def mostrar_pregunta(frame, pregunta, correcta=None):
     """
     Muestra una pregunta con sus opciones en la imagen de la cámara.
     """
-    overlay = frame.copy()
-    # Fondo oscuro para la zona de texto
-    cv2.rectangle(overlay, (20, 20), (frame.shape[1] - 20, 220), (0, 0, 0), -1)
-    cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
+    # Fondo oscuro para la zona de texto (solo se toca ese rectángulo)
+    oscurecer(frame, 20, 20, frame.shape[1] - 20, 220, 0.3)
     
     y_pos = 50
     # Mostrar enunciado de la pregunta
-    cv2.putText(frame, pregunta["pregunta"], (50, y_pos), 
-               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    escribir(frame, pregunta["pregunta"], (50, y_pos), 0.8, (255, 255, 255), 2)
     
     # Mostrar opciones numeradas
     for i, opcion in enumerate(pregunta["opciones"]):
         y_pos += 40
-        cv2.putText(frame, f"{i+1}. {opcion}", (70, y_pos), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        escribir(frame, f"{i+1}. {opcion}", (70, y_pos), 0.7, (255, 255, 255), 2)
     
     y_pos += 60
-    cv2.putText(frame, "Presiona 1-4 para responder o 'v' para voz", 
-               (50, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 255), 1)
+    escribir(frame, "Presiona 1-4 para responder o 'v' para voz", 
+               (50, y_pos), 0.6, (200, 200, 255), 1)
     
     # Mostrar feedback de respuesta correcta/incorrecta si se pasa parámetro correcta
     if correcta is not None:
         color = (0, 255, 0) if correcta else (0, 0, 255)
         texto = "Correcto" if correcta else "Incorrecto"
-        cv2.putText(frame, texto, (frame.shape[1]//2 - 100, y_pos + 50), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+        escribir(frame, texto, (frame.shape[1]//2 - 100, y_pos + 50), 1, color, 2)
 
-def mostrar_resultado_nivel(frame, nivel, correctas, total, usuario=None, base_preguntas=None):
+class PanelPregunta:
+    """
+    Panel de la pregunta con refresco reducido: con refresco > 1 el panel (el recuadro
+    oscurecido y los textos) se compone una sola vez como una capa por píxel
+    salida = frame * ganancia + capa, y en cada frame solo se aplica esa capa sobre la
+    imagen actual, sin oscurecer ni rasterizar textos. Si cambia la pregunta o el feedback
+    se recompone. Con refresco 1 se dibuja directamente como siempre.
+    """
+    ALTO = 350  # Filas que ocupa el panel con el texto de feedback incluido
+
+    def __init__(self):
+        self._clave = None
+        self._zona = None
+        self._ganancia = None  # uint16, 256 = el píxel del frame no cambia
+        self._capa = None
+
+    def _componer(self, forma, pregunta, correcta):
+        # El panel es afín en cada píxel: se deduce dibujándolo sobre negro y sobre blanco
+        negro = np.zeros(forma, np.uint8)
+        blanco = np.full(forma, 255, np.uint8)
+        mostrar_pregunta(negro, pregunta, correcta)
+        mostrar_pregunta(blanco, pregunta, correcta)
+        ganancia = (blanco.astype(np.uint16) - negro) * 256 // 255
+        filas, columnas = np.nonzero(((ganancia != 256) | (negro != 0)).any(axis=2))
+        if not len(filas):
+            self._zona = None
+            return
+        self._zona = (slice(filas.min(), filas.max() + 1), slice(columnas.min(), columnas.max() + 1))
+        self._ganancia = ganancia[self._zona]
+        self._capa = negro[self._zona].astype(np.uint16)
+
+    def dibujar(self, frame, pregunta, correcta=None, refresco=1):
+        if refresco <= 1:
+            mostrar_pregunta(frame, pregunta, correcta)
+            return
+        alto = min(self.ALTO, frame.shape[0])
+        clave = (id(pregunta), correcta, frame.shape)
+        if clave != self._clave:
+            self._componer((alto,) + frame.shape[1:], pregunta, correcta)
+            self._clave = clave
+        if self._zona is None:
+            return
+        roi = frame[self._zona]
+        mezcla = roi * self._ganancia
+        mezcla >>= 8
+        mezcla += self._capa
+        np.minimum(mezcla, 255, out=mezcla)
+        roi[:] = mezcla
+
+def mostrar_resultado_nivel(entorno, frame, nivel, correctas, total, usuario=None, base_preguntas=None):
     """
     Muestra estadísticas del nivel completado y opciones de navegación
     Integra el manejo completo de estadísticas del primer código
     """
+    PERFILADOR.etiquetar(f"resultados_nivel_{nivel}")
     porcentaje = (correctas / total) * 100
-    overlay = frame.copy()
-    cv2.rectangle(overlay, (50, 50), (frame.shape[1] - 50, frame.shape[0] - 50), (0, 0, 0), -1)
-    cv2.addWeighted(overlay, 0.85, frame, 0.15, 0, frame)
+    oscurecer(frame, 50, 50, frame.shape[1] - 50, frame.shape[0] - 50, 0.15)
 
     y_pos = 100
     # Título
-    cv2.putText(frame, f"RESULTADOS NIVEL {nivel}", (frame.shape[1]//2 - 200, y_pos),
-               cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 3)
+    escribir(frame, f"RESULTADOS NIVEL {nivel}", (frame.shape[1]//2 - 200, y_pos), 1.2, (255, 255, 255), 3)
 
     y_pos += 80
     # Estadísticas principales
-    cv2.putText(frame, f"Respuestas correctas: {correctas}/{total}", (frame.shape[1]//2 - 180, y_pos),
-               cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    escribir(frame, f"Respuestas correctas: {correctas}/{total}", (frame.shape[1]//2 - 180, y_pos), 1, (255, 255, 255), 2)
 
     y_pos += 50
-    cv2.putText(frame, f"Porcentaje de acierto: {porcentaje:.1f}%", (frame.shape[1]//2 - 180, y_pos),
-               cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    escribir(frame, f"Porcentaje de acierto: {porcentaje:.1f}%", (frame.shape[1]//2 - 180, y_pos), 1, (255, 255, 255), 2)
 
     # Guardar progreso del usuario 
-    if usuario:
+    if usuario and entorno.persistir:
         usuarios = reconocedor_cara.cargar_usuarios()
         if usuario in usuarios:
             if "progreso" not in usuarios[usuario]:
@@ -208,14 +459,12 @@ def mostrar_resultado_nivel(frame, nivel, correctas, total, usuario=None, base_p
             mensaje_nivel = "Puedes seguir practicando este nivel"
             color_mensaje = (255, 255, 0)
 
-    cv2.putText(frame, mensaje_nivel, (frame.shape[1]//2 - 300, y_pos),
-               cv2.FONT_HERSHEY_SIMPLEX, 0.8, color_mensaje, 2)
+    escribir(frame, mensaje_nivel, (frame.shape[1]//2 - 300, y_pos), 0.8, color_mensaje, 2)
 
     y_pos += 80
     
     # Opciones disponibles 
-    cv2.putText(frame, "OPCIONES DISPONIBLES:", (frame.shape[1]//2 - 150, y_pos),
-               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 255), 2)
+    escribir(frame, "OPCIONES DISPONIBLES:", (frame.shape[1]//2 - 150, y_pos), 0.8, (200, 200, 255), 2)
     
     y_pos += 40
     opciones_texto = []
@@ -229,28 +478,16 @@ def mostrar_resultado_nivel(frame, nivel, correctas, total, usuario=None, base_p
     opciones_texto.append("ESC / 'salir' - Salir del juego")
     
     for opcion in opciones_texto:
-        cv2.putText(frame, opcion, (frame.shape[1]//2 - 200, y_pos),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        escribir(frame, opcion, (frame.shape[1]//2 - 200, y_pos), 0.6, (255, 255, 255), 1)
         y_pos += 30
 
-    cv2.imshow("GeoKids AR", frame)
+    # Esperar la decisión del usuario (tecla o voz) sin redibujar la pantalla
+    # 'siguiente' solo si puede avanzar y no es el último nivel
+    intenciones = ["salir", "reiniciar"]
+    if puede_avanzar and not es_ultimo_nivel:
+        intenciones.append("siguiente")
+    return PlanificadorUI(entorno).esperar(intenciones, dibujar=lambda: frame)
 
-    # Loop para capturar la decisión del usuario 
-    while True:
-        key = cv2.waitKey(1) & 0xFF
-        
-        # Tecla ESC para salir
-        if key == 27:
-            return "salir"
-        
-        # Tecla R para repetir
-        if key == ord('r'):
-            return "reiniciar"
-        
-        # Tecla S para siguiente (solo if puede avanzar y no es el último nivel)
-        if key == ord('s') and puede_avanzar and not es_ultimo_nivel:
-            return "siguiente"
-        
 
 def mostrar_estadisticas_usuario(frame, usuario):
     """
@@ -264,14 +501,11 @@ def mostrar_estadisticas_usuario(frame, usuario):
     progreso = usuarios[usuario]["progreso"]
     
     # Dibujar un recuadro oscuro para mostrar las estadísticas
-    overlay = frame.copy()
-    cv2.rectangle(overlay, (100, 100), (frame.shape[1] - 100, 400), (0, 0, 0), -1)
-    cv2.addWeighted(overlay, 0.8, frame, 0.2, 0, frame)
+    oscurecer(frame, 100, 100, frame.shape[1] - 100, 400, 0.2)
     
     # Título de la sección
     y_pos = 150
-    cv2.putText(frame, f"Estadisticas de {usuario}", (frame.shape[1]//2 - 150, y_pos),
-               cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    escribir(frame, f"Estadisticas de {usuario}", (frame.shape[1]//2 - 150, y_pos), 1, (255, 255, 255), 2)
     
     # Mostrar estadísticas por cada nivel
     y_pos += 50
@@ -280,16 +514,15 @@ def mostrar_estadisticas_usuario(frame, usuario):
         porcentaje = stats.get("porcentaje", 0)
         correctas = stats.get("correctas", 0)
         total = stats.get("total", 0)
-        cv2.putText(frame, f"Nivel {nivel_num}: {correctas}/{total} ({porcentaje:.1f}%)", 
-                   (frame.shape[1]//2 - 120, y_pos),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        escribir(frame, f"Nivel {nivel_num}: {correctas}/{total} ({porcentaje:.1f}%)", 
+                   (frame.shape[1]//2 - 120, y_pos), 0.8, (255, 255, 255), 2)
         y_pos += 40
 
-def manejar_fin_de_nivel(frame, nivel_actual, respuestas_correctas, total_preguntas, usuario, base_preguntas):
+def manejar_fin_de_nivel(entorno, frame, nivel_actual, respuestas_correctas, total_preguntas, usuario, base_preguntas):
     """
     Maneja el flujo cuando se completa un nivel 
     """
-    accion = mostrar_resultado_nivel(frame, nivel_actual, respuestas_correctas, total_preguntas, usuario, base_preguntas)
+    accion = mostrar_resultado_nivel(entorno, frame, nivel_actual, respuestas_correctas, total_preguntas, usuario, base_preguntas)
     
     if accion == "salir":
         return "salir", nivel_actual
@@ -306,29 +539,18 @@ def manejar_fin_de_nivel(frame, nivel_actual, respuestas_correctas, total_pregun
         if nivel_actual >= max_nivel:
             # Manejo completo de final de juego
             print("Has completado todos los niveles.")
-            while True:
-                # Mostrar pantalla final del juego
-                overlay = frame.copy()
-                cv2.rectangle(overlay, (100, 200), (frame.shape[1] - 100, 400), (0, 0, 0), -1)
-                cv2.addWeighted(overlay, 0.8, frame, 0.2, 0, frame)
-                
-                # Mensaje final y opciones
-                cv2.putText(frame, "JUEGO COMPLETADO", (frame.shape[1]//2 - 150, 250),
-                           cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 2)
-                cv2.putText(frame, "¿Quieres reiniciar desde el nivel 1?", (frame.shape[1]//2 - 200, 300),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-                cv2.putText(frame, "R / 'reiniciar' - Volver al nivel 1", (frame.shape[1]//2 - 180, 330),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1)
-                cv2.putText(frame, "ESC / 'salir' - Terminar juego", (frame.shape[1]//2 - 180, 360),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 1)
-                
-                cv2.imshow("GeoKids AR", frame)
-                key = cv2.waitKey(1) & 0xFF
-                
-                if key == 27:  # ESC
-                    return "salir", nivel_actual
-                elif key == ord('r'):  # R
-                    return "repetir", 1
+            # Mostrar pantalla final del juego (se compone una sola vez)
+            oscurecer(frame, 100, 200, frame.shape[1] - 100, 400, 0.2)
+            
+            # Mensaje final y opciones
+            escribir(frame, "JUEGO COMPLETADO", (frame.shape[1]//2 - 150, 250), 1.2, (0, 255, 0), 2)
+            escribir(frame, "¿Quieres reiniciar desde el nivel 1?", (frame.shape[1]//2 - 200, 300), 0.8, (255, 255, 255), 2)
+            escribir(frame, "R / 'reiniciar' - Volver al nivel 1", (frame.shape[1]//2 - 180, 330), 0.7, (255, 255, 255), 1)
+            escribir(frame, "ESC / 'salir' - Terminar juego", (frame.shape[1]//2 - 180, 360), 0.7, (255, 255, 255), 1)
+            
+            if PlanificadorUI(entorno).esperar(["salir", "reiniciar"], dibujar=lambda: frame) == "salir":
+                return "salir", nivel_actual
+            return "repetir", 1
                 
         else:
             # Avanzar al siguiente nivel
@@ -346,7 +568,7 @@ def resetear_estado_juego():
         "figura_actual": None,
         "respuestas_correctas": 0,
         "feedback": None,
-        "feedback_tiempo": 0
+        "inicio_pregunta": None  # Reloj del entorno cuando se mostró la pregunta actual
     }
 
 def normalizar(texto):
@@ -357,9 +579,23 @@ def normalizar(texto):
     texto = unicodedata.normalize('NFD', texto)
     return ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
 
-def procesar_respuesta(estado, respuesta_idx, nivel_actual):
+def registrar_respuesta(registro, estado, usuario, nivel_actual, opcion, modalidad, es_correcta,
+                        ahora=None, confianza=None):
+    """Añade la respuesta a la pregunta actual al registro de analítica (si lo hay)"""
+    if registro is None:
+        return
+    latencia_ms = None
+    if ahora is not None and estado["inicio_pregunta"] is not None:
+        latencia_ms = (ahora - estado["inicio_pregunta"]) * 1000.0
+    registro.registrar(usuario, nivel_actual, estado["preguntas"].index(estado["pregunta_actual"]),
+                       estado["pregunta_actual"]["pregunta"], opcion, modalidad, latencia_ms,
+                       es_correcta, confianza)
+
+def procesar_respuesta(estado, respuesta_idx, nivel_actual, registro=None, usuario=None, ahora=None):
     """
-    Procesa una respuesta del usuario y actualiza el estado del juego
+    Procesa una respuesta del usuario y actualiza el estado del juego.
+    Con `registro` (analitica.RegistroRespuestas) se guarda la respuesta y su latencia
+    medida con el reloj `ahora`.
     """
     # Validación de índice
     if respuesta_idx < 0 or respuesta_idx >= len(estado["pregunta_actual"]["opciones"]):
@@ -375,7 +611,7 @@ def procesar_respuesta(estado, respuesta_idx, nivel_actual):
     print(f"{' Correcta' if es_correcta else ' Incorrecta'}")
 
     estado["feedback"] = es_correcta
-    estado["feedback_tiempo"] = 30
+    registrar_respuesta(registro, estado, usuario, nivel_actual, opcion_seleccionada, "teclado", es_correcta, ahora)
 
     if es_correcta:
         estado["respuestas_correctas"] += 1
@@ -388,6 +624,7 @@ def procesar_respuesta(estado, respuesta_idx, nivel_actual):
         # Cargar siguiente pregunta y su figura visual
         estado["pregunta_actual"] = estado["preguntas"][siguiente_idx]
         estado["figura_actual"] = estado["pregunta_actual"]["figura_visual"]
+        estado["inicio_pregunta"] = ahora
 
         # Imprimir en terminal
         print(f"\nNivel {nivel_actual} - Pregunta {siguiente_idx + 1}/{len(estado['preguntas'])}:")
@@ -401,56 +638,101 @@ def procesar_respuesta(estado, respuesta_idx, nivel_actual):
         print(f"\nNivel {nivel_actual} completado")
         print(f"Respuestas correctas: {estado['respuestas_correctas']}/{len(estado['preguntas'])}")
 
-def main():
-    cap, base_preguntas = inicializar_aplicacion()
+def resumen_sesion(usuario, nivel_actual, estado, niveles_jugados):
+    """Estado final de la partida en un formato serializable a JSON"""
+    pregunta_idx = None
+    if estado["pregunta_actual"] is not None:
+        pregunta_idx = estado["preguntas"].index(estado["pregunta_actual"])
+    return {
+        "usuario": usuario,
+        "nivel": nivel_actual,
+        "pregunta": pregunta_idx,
+        "total_preguntas": len(estado["preguntas"]),
+        "respuestas_correctas": estado["respuestas_correctas"],
+        "niveles_jugados": niveles_jugados,
+    }
+
+def estado_perfil(nivel_actual, estado):
+    """Etiqueta del estado del juego para las muestras del perfilador"""
+    if estado["pregunta_actual"] is None:
+        return f"nivel_{nivel_actual}/esperando_marcador"
+    idx = estado["preguntas"].index(estado["pregunta_actual"]) + 1
+    return f"nivel_{nivel_actual}/pregunta_{idx}"
+
+def main(entorno=None, preguntas=None):
+    """
+    Ejecuta el juego. Sin entorno se juega en vivo con la cámara 0;
+    repeticion.py pasa un entorno que reproduce un video y un guion sin ventana,
+    y estaciones.py uno por cámara con las preguntas ya cargadas.
+    """
+    entorno, base_preguntas, modelo = inicializar_aplicacion(entorno, preguntas)
+    # Grabación opcional de la sesión (GEOKIDS_GRABAR=carpeta)
+    entorno = envolver_si_se_pide(entorno)
     usuario = None
     nivel_actual = 1
     estado = resetear_estado_juego()
+    niveles_jugados = []
+    # Teclas y temporizadores de reloj (el feedback dura DURACION_FEEDBACK segundos, no N frames)
+    planificador = PlanificadorUI(entorno)
+    # Cada respuesta a datos/analitica (no en repeticiones; GEOKIDS_ANALITICA=0 lo desactiva)
+    registro = None
+    if entorno.persistir and os.environ.get("GEOKIDS_ANALITICA") != "0":
+        registro = RegistroRespuestas()
+    rectificador = crear_rectificador(modelo)
+    # Calidad adaptativa para no pasarse del presupuesto por frame (GEOKIDS_GOBERNADOR=0 la desactiva)
+    gobernador = GobernadorCalidad.desde_entorno()
+    seguidor = detector_marcadores.SeguidorMarcador(10)
+    panel = PanelPregunta()
+    # Bytes reservados por etapa y frame (GEOKIDS_MEMORIA=1)
+    medidor_memoria = medidor_desde_entorno(INSTRUMENTACION)
+    iluminacion = DiagnosticoIluminacion()
 
     # Crea una ventana para mostrar el juego
-    cv2.namedWindow("GeoKids AR", cv2.WINDOW_NORMAL)
+    entorno.abrir()
 
     try:
         # Mostrar menú inicial 
-        opcion_menu = mostrar_menu_inicial(cap)
+        opcion_menu = mostrar_menu_inicial(entorno)
 
         if opcion_menu == 'iniciar_sesion':
             print("Modo iniciar sesion seleccionado")
-            ret, frame = cap.read()
+            PERFILADOR.etiquetar("identificacion")
+            ret, frame = entorno.leer()
             if not ret:
                 print("Error al acceder a la cámara.")
                 return
             try:
                 # Intenta identificar al usuario por reconocimiento facial
-                usuario = reconocedor_cara.identificar_usuario(frame)
+                usuario = entorno.identificar_usuario(frame)
                 if not usuario:
                     print("No se pudo identificar al usuario.")
                     print("Pulse boton 2 para registrarse")
-                    opcion_menu = mostrar_menu_inicial(cap)
+                    opcion_menu = mostrar_menu_inicial(entorno)
             except Exception as e:
                 print(f"Error al identificar usuario: {str(e)}")
                 
 
         elif opcion_menu == 'registrar':
             print("Modo registro seleccionado")
-            ret, frame = cap.read()
+            PERFILADOR.etiquetar("registro")
+            ret, frame = entorno.leer()
             if not ret or frame is None:
                 print("Error al capturar el frame de la cámara.")
                 return
             # Registra un nuevo usuario
-            usuario = reconocedor_cara.registrar_usuario(frame)
+            usuario = entorno.registrar_usuario(frame)
 
 
         else:
             # Si se elige salir
-            cap.release()
-            cv2.destroyAllWindows()
             return
 
         # Verificar usuario
         if usuario:
             usuarios = reconocedor_cara.cargar_usuarios()
-            if usuario in usuarios:
+            if entorno.nivel_inicial is not None:
+                nivel_actual = entorno.nivel_inicial
+            elif usuario in usuarios:
                 nivel_actual = usuarios[usuario].get("nivel", 1)
             else:
                 nivel_actual = 1
@@ -459,28 +741,48 @@ def main():
             print(f"Nivel actual del usuario: {nivel_actual}")
 
             # Mostrar estadísticas solo si tenemos un frame válido
-            ret, frame = cap.read()
+            ret, frame = entorno.leer()
             if ret:
                 mostrar_estadisticas_usuario(frame, usuario)
-                cv2.imshow("GeoKids AR", frame)
-                cv2.waitKey(2000)
+                # Dos segundos o hasta pulsar una tecla
+                planificador.esperar(maximo=2.0, dibujar=lambda: frame)
             else:
                 print("No se pudo obtener un frame para mostrar estadísticas.")
 
         else:
             print("No se pudo obtener un usuario válido. Saliendo...")
-            cap.release()
-            cv2.destroyAllWindows()
             return
 
         # Bucle principal del juego
         while True:
-            ret, frame = cap.read()
+            with tramo("captura"):
+                ret, frame = entorno.leer()
             if not ret:
                 break
+            # La latencia se mide desde la captura, no desde que leer() vuelve con el frame decodificado
+            INSTRUMENTACION.inicio_frame(t_captura=getattr(entorno, "t_captura", None))
+            if PERFILADOR.activo:
+                PERFILADOR.etiquetar(estado_perfil(nivel_actual, estado))
+            inicio_proceso = time.perf_counter()
+            calidad = gobernador.calidad if gobernador is not None else NIVELES[0]
+
+            # Eliminar la distorsión una sola vez por frame (flujo rectificado opcional)
+            if rectificador is not None:
+                with tramo("rectificado"):
+                    frame = rectificador.rectificar(frame)
+
+            # Diagnóstico de luz sobre el frame limpio (1 de cada N frames)
+            with tramo("iluminacion"):
+                if iluminacion.analizar(frame):
+                    pasos = iluminacion.sugerencia_exposicion()
+                    if pasos:
+                        entorno.ajustar_exposicion(pasos)
 
             # Detectar marcador
-            marcador = detector_marcadores.obtener_marcador_por_id(frame, 10, dibujar=True, estimar_pose=True)
+            with tramo("deteccion"):
+                marcador = seguidor.obtener(frame, detectar=gobernador is None or gobernador.debe_detectar(),
+                                            escala=calidad["escala_deteccion"], dibujar=True, estimar_pose=True)
+            entorno.marcador_detectado(marcador)
 
             # Cargar preguntas si no se han cargado aún
             if marcador and usuario and not estado["preguntas"]:
@@ -490,6 +792,7 @@ def main():
                         estado["respuestas_correctas"] = 0
                         estado["pregunta_actual"] = estado["preguntas"][0]
                         estado["figura_actual"] = estado["pregunta_actual"]["figura_visual"]
+                        estado["inicio_pregunta"] = planificador.reloj()
 
                         print(f"\n=== INICIANDO NIVEL {nivel_actual} ===")
                         print(f"Total de preguntas: {len(estado['preguntas'])}")
@@ -506,45 +809,61 @@ def main():
 
             # Mostrar figura si hay marcador
             if marcador:
-                if estado["figura_actual"] == "cubo":
-
-                    frame = dibujar_cubo(
-                        frame, marcador.rvec, marcador.tvec, 
-                        marcador.matriz_camara, marcador.coef_distorsion,
-                        tamano=0.05
-                    )
-                if estado["figura_actual"] == "piramide":
-
-                    frame = dibujar_piramide(
-                        frame,marcador.rvec, marcador.tvec,
-                        marcador.matriz_camara, marcador.coef_distorsion,
-                        tamano=0.05)
-                else:
-                    # Otras figuras 2D
-                    cx = int(sum(p[0] for p in marcador.esquinas) / 4)
-                    cy = int(sum(p[1] for p in marcador.esquinas) / 4)
-                    mostrar_figura(frame, estado["figura_actual"], (cx, cy))
+                with tramo("figura"):
+                    if estado["figura_actual"] == "cubo":
 
-            # Mostrar pregunta y manejar respuestas
-            if estado["pregunta_actual"]:
-                mostrar_pregunta(frame, estado["pregunta_actual"],
-                                 estado["feedback"] if estado["feedback_tiempo"] > 0 else None)
+                        frame = dibujar_cubo(
+                            frame, marcador.rvec, marcador.tvec, 
+                            marcador.matriz_camara, marcador.coef_distorsion,
+                            tamano=0.05, sombreado=calidad["sombreado"]
+                        )
+                    elif estado["figura_actual"] == "piramide":
 
-                if estado["feedback_tiempo"] > 0:
-                    estado["feedback_tiempo"] -= 1
+                        frame = dibujar_piramide(
+                            frame,marcador.rvec, marcador.tvec,
+                            marcador.matriz_camara, marcador.coef_distorsion,
+                            tamano=0.05, sombreado=calidad["sombreado"])
+                    else:
+                        # Otras figuras 2D, pegadas al plano del marcador
+                        dibujar_figura_plana(frame, estado["figura_actual"], marcador.esquinas)
 
-                key = cv2.waitKey(1) & 0xFF
+            # Mostrar pregunta y manejar respuestas
+            if estado["pregunta_actual"]:
+                with tramo("paneles"):
+                    panel.dibujar(frame, estado["pregunta_actual"],
+                                  estado["feedback"] if planificador.pendiente("feedback") else None,
+                                  refresco=calidad["refresco_panel"])
+
+                with tramo("waitKey"):
+                    key = planificador.sondear(1)
+                    planificador.eventos()  # Aquí la tecla se trata directamente; el feedback se consulta con pendiente()
                 if key == 27:  # ESC para salir
                     break
 
+                # HUD de tiempos por etapa
+                elif key == TECLA_HUD:
+                    INSTRUMENTACION.alternar_hud()
+
+                # Histograma de luz
+                elif key == TECLA_ILUMINACION:
+                    iluminacion.alternar()
+
+                # Perfil de unos segundos de la sesión (datos/perfiles)
+                elif key == TECLA_PERFIL:
+                    PERFILADOR.alternar()
+
                 # Teclado (1-4)
                 elif 49 <= key <= 52:
                     respuesta_seleccionada = key - 49
-                    procesar_respuesta(estado, respuesta_seleccionada, nivel_actual)
+                    procesar_respuesta(estado, respuesta_seleccionada, nivel_actual,
+                                       registro, usuario, planificador.reloj())
+                    planificador.programar(DURACION_FEEDBACK, "feedback")
 
                     if estado["pregunta_actual"] is None:
+                        niveles_jugados.append({"nivel": nivel_actual, "correctas": estado["respuestas_correctas"],
+                                                "total": len(estado["preguntas"])})
                         accion, nuevo_nivel = manejar_fin_de_nivel(
-                            frame, nivel_actual, estado["respuestas_correctas"],
+                            entorno, frame, nivel_actual, estado["respuestas_correctas"],
                             len(estado["preguntas"]), usuario, base_preguntas
                         )
 
@@ -557,13 +876,16 @@ def main():
                 # Reconocimiento por voz
                 elif key == ord('v'):
                     try:
-                        respuesta_voz = reconocedor_voz.procesar_respuesta(estado["pregunta_actual"])
+                        respuesta_voz = entorno.respuesta_voz(estado["pregunta_actual"])
                         if respuesta_voz and hasattr(respuesta_voz, 'texto'):
                             print(f"\nVoz detectada: {respuesta_voz.texto}")
                             print(f"{' Correcta' if respuesta_voz.es_correcta else ' Incorrecta'}")
 
                             estado["feedback"] = respuesta_voz.es_correcta
-                            estado["feedback_tiempo"] = 30
+                            planificador.programar(DURACION_FEEDBACK, "feedback")
+                            registrar_respuesta(registro, estado, usuario, nivel_actual, respuesta_voz.texto, "voz",
+                                                respuesta_voz.es_correcta, planificador.reloj(),
+                                                getattr(respuesta_voz, "confianza", None))
 
                             if respuesta_voz.es_correcta:
                                 estado["respuestas_correctas"] += 1
@@ -572,6 +894,7 @@ def main():
                             if idx < len(estado["preguntas"]):
                                 estado["pregunta_actual"] = estado["preguntas"][idx]
                                 estado["figura_actual"] = estado["pregunta_actual"]["figura_visual"]
+                                estado["inicio_pregunta"] = planificador.reloj()
                                 print(f"\nNivel {nivel_actual} - Pregunta {idx + 1}/{len(estado['preguntas'])}:")
                                 print(estado["pregunta_actual"]["pregunta"])
                                 for i, op in enumerate(estado["pregunta_actual"]["opciones"]):
@@ -582,8 +905,10 @@ def main():
                                 print(f"\nNivel {nivel_actual} completado")
                                 print(f"Respuestas correctas: {estado['respuestas_correctas']}/{len(estado['preguntas'])}")
 
+                                niveles_jugados.append({"nivel": nivel_actual, "correctas": estado["respuestas_correctas"],
+                                                        "total": len(estado["preguntas"])})
                                 accion, nuevo_nivel = manejar_fin_de_nivel(
-                                    frame, nivel_actual, estado["respuestas_correctas"],
+                                    entorno, frame, nivel_actual, estado["respuestas_correctas"],
                                     len(estado["preguntas"]), usuario, base_preguntas
                                 )
 
@@ -595,15 +920,26 @@ def main():
                     except Exception as e:
                         print(f"Error en reconocimiento de voz: {str(e)}")
                         estado["feedback"] = False
-                        estado["feedback_tiempo"] = 30
+                        planificador.programar(DURACION_FEEDBACK, "feedback")
 
             # Muestra el frame con la interfaz del juego
-            cv2.imshow("GeoKids AR", frame)
+            iluminacion.dibujar(frame)
+            INSTRUMENTACION.dibujar_hud(frame)
+            with tramo("imshow"):
+                entorno.mostrar(frame)
+            if gobernador is not None:
+                gobernador.registrar_frame((time.perf_counter() - inicio_proceso) * 1000.0, marcador is not None)
+            entorno.fin_frame(INSTRUMENTACION.fin_frame())
 
     finally:
+        PERFILADOR.detener()
+        if registro is not None:
+            registro.cerrar()
+        if medidor_memoria is not None:
+            INSTRUMENTACION.quitar_observador(medidor_memoria)
+            medidor_memoria.detener()
          # Libera recursos al salir
-        cap.release()
-        cv2.destroyAllWindows()
+        entorno.cerrar(resumen_sesion(usuario, nivel_actual, estado, niveles_jugados))
 # Ejecuta el programa
 if __name__ == "__main__":
     main()
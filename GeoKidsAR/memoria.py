@@ -0,0 +1,186 @@
+import json
+import os
+import time
+import tracemalloc
+from collections import deque
+
+RUTA_MEMORIA = os.path.join("datos", "metricas", "memoria.jsonl")
+PERIODO_EXPORTACION = 5.0
+VENTANA_MUESTRAS = 240
+MB = 1024 * 1024
+
+
+def cargar_presupuesto(ruta):
+    """
+    Lee un presupuesto de asignación en JSON: {"etapa": MB, ...}.
+    Retorna {etapa: bytes}.
+    """
+    with open(ruta, "r", encoding="utf-8") as f:
+        presupuesto = json.load(f)
+    return {nombre: int(float(mb) * MB) for nombre, mb in presupuesto.items()}
+
+
+def medir_asignaciones(funcion):
+    """
+    Ejecuta funcion() una vez bajo tracemalloc.
+    Retorna (pico, neto): bytes del pico de memoria durante la llamada y bytes que siguen vivos al terminar.
+    """
+    propio = not tracemalloc.is_tracing()
+    if propio:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        inicio = tracemalloc.get_traced_memory()[0]
+        funcion()
+        actual, pico = tracemalloc.get_traced_memory()
+    finally:
+        if propio:
+            tracemalloc.stop()
+    return pico - inicio, actual - inicio
+
+
+class MedidorMemoria:
+    """
+    Observador de Instrumentacion que mide con tracemalloc, para cada tramo del frame
+    (captura, deteccion, detectMarkers, figura, paneles...) y para el frame completo:
+        pico: bytes máximos reservados a la vez durante el tramo (copias temporales incluidas)
+        neto: bytes que siguen vivos al cerrarlo
+    numpy y los arrays que devuelve OpenCV se reservan con el asignador de Python, así que
+    las copias de frames aparecen aquí. Los tramos anidados se descuentan bien porque el
+    pico se reinicia en cada tramo y se propaga a los que lo contienen.
+
+    Con un presupuesto {etapa: bytes}, cada frame en el que una etapa lo supere se cuenta
+    en `excesos` y se avisa la primera vez.
+    tracemalloc ralentiza mucho el programa: los tiempos medidos con él activo no valen.
+    """
+    def __init__(self, presupuesto=None, ventana=VENTANA_MUESTRAS, ruta_exportacion=None,
+                 periodo_exportacion=PERIODO_EXPORTACION):
+        self.presupuesto = presupuesto or {}
+        self.ventana = ventana
+        self.ruta_exportacion = ruta_exportacion
+        self.periodo_exportacion = periodo_exportacion
+        self.excesos = {}
+        self._muestras = {}     # nombre -> deque de (pico, neto)
+        self._pila = []         # [nombre, memoria al empezar, pico visto]
+        self._frame_actual = {}
+        self._iniciado_aqui = False
+        self._ultima_exportacion = time.monotonic()
+
+    def iniciar(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._iniciado_aqui = True
+        return self
+
+    def detener(self):
+        if self.ruta_exportacion:
+            self.exportar()
+        if self._iniciado_aqui:
+            tracemalloc.stop()
+            self._iniciado_aqui = False
+        for nombre, n in self.excesos.items():
+            print(f"Memoria: '{nombre}' superó su presupuesto en {n} frames")
+
+    # --- Interfaz de observador ---
+
+    def inicio_tramo(self, nombre):
+        actual, pico = tracemalloc.get_traced_memory()
+        for abierto in self._pila:
+            if pico > abierto[2]:
+                abierto[2] = pico
+        tracemalloc.reset_peak()
+        self._pila.append([nombre, actual, actual])
+
+    def fin_tramo(self, nombre):
+        if not self._pila or self._pila[-1][0] != nombre:
+            return  # Tramo abierto antes de registrar el medidor
+        actual, pico = tracemalloc.get_traced_memory()
+        _, inicio, pico_visto = self._pila.pop()
+        pico = max(pico, pico_visto)
+        for abierto in self._pila:
+            if pico > abierto[2]:
+                abierto[2] = pico
+
+        anterior = self._frame_actual.get(nombre)
+        if anterior is None:
+            self._frame_actual[nombre] = (pico - inicio, actual - inicio)
+        else:
+            # Un mismo tramo puede repetirse dentro del frame
+            self._frame_actual[nombre] = (max(anterior[0], pico - inicio), anterior[1] + actual - inicio)
+
+    def inicio_frame(self):
+        # Los tramos ya cerrados antes de empezar el frame (la captura) cuentan en él
+        if self._pila and self._pila[0][0] == "frame":
+            self._pila.clear()
+        self.inicio_tramo("frame")
+
+    def fin_frame(self):
+        """Cierra el frame. Retorna {etapa: {"pico", "neto"}} en bytes"""
+        if not self._pila or self._pila[0][0] != "frame":
+            return None
+        while len(self._pila) > 1:
+            self.fin_tramo(self._pila[-1][0])  # Tramos que no se cerraron (excepciones)
+        self.fin_tramo("frame")
+
+        resultado = {}
+        tramos, self._frame_actual = self._frame_actual, {}
+        for nombre, (pico, neto) in tramos.items():
+            muestras = self._muestras.get(nombre)
+            if muestras is None:
+                muestras = self._muestras[nombre] = deque(maxlen=self.ventana)
+            muestras.append((pico, neto))
+            resultado[nombre] = {"pico": pico, "neto": neto}
+
+            limite = self.presupuesto.get(nombre)
+            if limite is not None and pico > limite:
+                if nombre not in self.excesos:
+                    print(f"Memoria: '{nombre}' reservó {pico / MB:.1f} MB en un frame "
+                          f"(presupuesto {limite / MB:.1f} MB)")
+                self.excesos[nombre] = self.excesos.get(nombre, 0) + 1
+
+        if self.ruta_exportacion and time.monotonic() - self._ultima_exportacion >= self.periodo_exportacion:
+            self.exportar()
+        return resultado
+
+    # --- Resultados ---
+
+    def estadisticas(self):
+        """Retorna {etapa: {"pico_medio", "pico_max", "neto_medio", "n"}} en bytes"""
+        resultado = {}
+        for nombre, muestras in self._muestras.items():
+            if not muestras:
+                continue
+            picos = [p for p, _ in muestras]
+            resultado[nombre] = {
+                "pico_medio": sum(picos) / len(picos),
+                "pico_max": max(picos),
+                "neto_medio": sum(n for _, n in muestras) / len(muestras),
+                "n": len(muestras),
+            }
+        return resultado
+
+    def exportar(self):
+        self._ultima_exportacion = time.monotonic()
+        linea = {"t": time.time(), "etapas": self.estadisticas(), "excesos": self.excesos}
+        try:
+            os.makedirs(os.path.dirname(self.ruta_exportacion) or ".", exist_ok=True)
+            with open(self.ruta_exportacion, "a", encoding="utf-8") as f:
+                f.write(json.dumps(linea) + "\n")
+        except OSError as e:
+            print(f"No se pudieron exportar las métricas de memoria: {e}")
+
+
+def medidor_desde_entorno(instrumentacion):
+    """
+    GEOKIDS_MEMORIA=1 registra un MedidorMemoria en la instrumentación y exporta a RUTA_MEMORIA.
+    GEOKIDS_PRESUPUESTO_MEMORIA=ruta.json fija el presupuesto por etapa (ver cargar_presupuesto).
+    Retorna el medidor o None.
+    """
+    if os.environ.get("GEOKIDS_MEMORIA") != "1":
+        return None
+    ruta_presupuesto = os.environ.get("GEOKIDS_PRESUPUESTO_MEMORIA")
+    presupuesto = cargar_presupuesto(ruta_presupuesto) if ruta_presupuesto else None
+    medidor = MedidorMemoria(presupuesto, ruta_exportacion=RUTA_MEMORIA).iniciar()
+    instrumentacion.agregar_observador(medidor)
+    print("Medición de memoria por etapa activada (los tiempos no son representativos)")
+    return medidor
@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+import time
+
+# Resoluciones de captura que se prueban, de mayor a menor
+RESOLUCIONES_CAPTURA = [(1920, 1080), (1280, 720), (960, 540), (800, 600), (640, 480), (424, 240), (320, 240)]
+
+
+class ModeloCamara:
+    """
+    Parámetros intrínsecos calibrados a una resolución, adaptables a cualquier resolución de captura.
+    Las matrices derivadas se calculan una sola vez por tamaño.
+
+    modo "recorte": la cámara escala el sensor y recorta el sobrante (lo habitual en webcams
+                    al pasar de 4:3 a 16:9), la focal se escala igual en ambos ejes.
+    modo "escala":  la imagen se escala por separado en cada eje sin recortar.
+
+    Si se indican calibraciones {(ancho, alto): ruta .npz} (ver calibracion.py), la de la
+    resolución pedida se carga la primera vez que se necesita y se usa tal cual.
+    """
+    def __init__(self, matriz_camara, coef_distorsion, tamano_calibracion, modo="recorte", calibraciones=None):
+        if modo not in ("recorte", "escala"):
+            raise ValueError("El modo debe ser 'recorte' o 'escala'.")
+        self.matriz_camara = np.asarray(matriz_camara, dtype=np.float64)
+        self.coef_distorsion = np.asarray(coef_distorsion, dtype=np.float64)
+        self.tamano_calibracion = (int(tamano_calibracion[0]), int(tamano_calibracion[1]))
+        self.modo = modo
+        self.calibraciones = calibraciones or {}
+        self._cache = {}  # (ancho, alto) -> (matriz_camara, coef_distorsion)
+
+    @staticmethod
+    def por_defecto(dispositivo=None):
+        """
+        Modelo construido con la calibración de camara.py, más las calibraciones guardadas
+        en datos/calibraciones para el dispositivo (por defecto 'camara0'), que no se leen hasta usarlas.
+        """
+        from camara import cameraMatrix, distCoeffs, imageSize
+        from calibracion import calibraciones_disponibles
+        return ModeloCamara(cameraMatrix, distCoeffs, imageSize,
+                            calibraciones=calibraciones_disponibles(dispositivo or "camara0"))
+
+    def _derivar(self, tamano):
+        if tamano in self.calibraciones:
+            from calibracion import Calibracion
+            try:
+                calibracion = Calibracion.cargar(self.calibraciones[tamano])
+                print(f"Calibración {tamano[0]}x{tamano[1]} cargada (error {calibracion.error_rms:.3f} px)")
+                return calibracion.matriz_camara, calibracion.coef_distorsion
+            except (OSError, ValueError, KeyError) as e:
+                print(f"No se pudo cargar la calibración {self.calibraciones[tamano]}: {e}")
+        ancho, alto = tamano
+        ancho0, alto0 = self.tamano_calibracion
+        sx, sy = ancho / ancho0, alto / alto0
+        if self.modo == "recorte":
+            # Escalado uniforme que cubre la imagen pedida y recorte centrado del sobrante
+            sx = sy = max(sx, sy)
+        dx = (ancho0 * sx - ancho) / 2.0
+        dy = (alto0 * sy - alto) / 2.0
+
+        K = self.matriz_camara.copy()
+        K[0, 0] *= sx
+        K[0, 1] *= sx
+        K[0, 2] = K[0, 2] * sx - dx
+        K[1, 1] *= sy
+        K[1, 2] = K[1, 2] * sy - dy
+        # Los coeficientes de distorsión están en coordenadas normalizadas y no cambian
+        return K, self.coef_distorsion
+
+    def intrinsecos(self, tamano):
+        """Retorna (matriz_camara, coef_distorsion) válidos para frames de tamaño (ancho, alto)"""
+        tamano = (int(tamano[0]), int(tamano[1]))
+        if tamano not in self._cache:
+            self._cache[tamano] = self._derivar(tamano)
+        return self._cache[tamano]
+
+    def intrinsecos_frame(self, frame):
+        return self.intrinsecos((frame.shape[1], frame.shape[0]))
+
+
+def negociar_resolucion(cap, tamano):
+    """
+    Pide una resolución a la cámara y devuelve la que realmente ha aceptado,
+    leyendo un frame (CAP_PROP_FRAME_WIDTH/HEIGHT no siempre es fiable).
+    """
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, tamano[0])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, tamano[1])
+    ret, frame = cap.read()
+    if ret and frame is not None:
+        return (frame.shape[1], frame.shape[0])
+    return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+
+def elegir_resolucion(cap, objetivo_ms, trabajo, candidatas=RESOLUCIONES_CAPTURA, frames_prueba=15):
+    """
+    Elige la mayor resolución de captura cuyo tiempo por frame (captura + trabajo) cumple el objetivo.
+    Args:
+        cap: VideoCapture abierto
+        objetivo_ms: tiempo máximo por frame en milisegundos
+        trabajo: función (frame) que ejecuta el procesado de un frame (detección, pose...)
+        candidatas: resoluciones a probar, de mayor a menor
+        frames_prueba: frames que se miden en cada resolución
+    Retorna: (ancho, alto) negociado con la cámara
+    """
+    probadas = set()
+    elegida = None
+    for tamano in candidatas:
+        real = negociar_resolucion(cap, tamano)
+        if real in probadas:
+            continue
+        probadas.add(real)
+        elegida = real
+
+        tiempos = []
+        for _ in range(frames_prueba):
+            inicio = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            trabajo(frame)
+            tiempos.append((time.perf_counter() - inicio) * 1000.0)
+        if not tiempos:
+            continue
+
+        mediana = float(np.median(tiempos))
+        print(f"Resolucion {real[0]}x{real[1]}: {mediana:.1f} ms por frame")
+        if mediana <= objetivo_ms:
+            return real
+
+    # Ninguna cumple el objetivo: la última probada es la más pequeña
+    if elegida is not None:
+        negociar_resolucion(cap, elegida)
+    return elegida
@@ -0,0 +1,123 @@
+"""
+Perfil de parámetros del detector ArUco: ventanas del umbral adaptativo, límites de
+perímetro, método de refinado de esquinas y, opcionalmente, un diccionario reducido con
+solo los ids que se imprimen. Lo genera benchmarks/ajustar_aruco.py midiendo tasa de
+detección y ms por frame; detector_marcadores lo carga al arrancar.
+
+Formato (JSON):
+    {"version": 1, "diccionario": "DICT_4X4_250", "ids": [10] o null,
+     "parametros": {"adaptiveThreshWinSizeMin": 3, ...}, "metricas": {...}}
+"""
+import json
+import os
+import cv2.aruco as aruco
+import numpy as np
+
+RUTA_PERFIL = os.path.join("datos", "perfil_aruco.json")
+VERSION_PERFIL = 1
+DICCIONARIO_BASE = "DICT_4X4_250"
+
+# Parámetros de DetectorParameters que ajusta el perfil
+PARAMETROS_AJUSTABLES = (
+    "adaptiveThreshWinSizeMin", "adaptiveThreshWinSizeMax", "adaptiveThreshWinSizeStep",
+    "minMarkerPerimeterRate", "maxMarkerPerimeterRate", "cornerRefinementMethod",
+)
+REFINADOS = {
+    "ninguno": aruco.CORNER_REFINE_NONE,
+    "subpix": aruco.CORNER_REFINE_SUBPIX,
+    "contorno": aruco.CORNER_REFINE_CONTOUR,
+}
+
+# Lo que se usaba antes de existir el perfil
+PARAMETROS_POR_DEFECTO = {"cornerRefinementMethod": aruco.CORNER_REFINE_SUBPIX}
+
+
+def crear_parametros(parametros=None):
+    """DetectorParameters de OpenCV con los valores indicados sobre los de por defecto"""
+    params = aruco.DetectorParameters()
+    for nombre, valor in (parametros if parametros is not None else PARAMETROS_POR_DEFECTO).items():
+        if nombre not in PARAMETROS_AJUSTABLES:
+            raise ValueError(f"Parámetro de detector no ajustable: {nombre}")
+        setattr(params, nombre, type(getattr(params, nombre))(valor))
+    return params
+
+
+def diccionario_base(nombre=DICCIONARIO_BASE):
+    return aruco.getPredefinedDictionary(getattr(aruco, nombre))
+
+
+def diccionario_reducido(base, ids):
+    """
+    Diccionario con solo los códigos de `ids`. Los marcadores detectados con él traen
+    el índice dentro de `ids`, que se traduce con ids[indice].
+    """
+    codigos = base.bytesList[np.asarray(ids, dtype=np.int32)]
+    return aruco.Dictionary(codigos, base.markerSize, base.maxCorrectionBits)
+
+
+def crear_detector(perfil=None):
+    """
+    Retorna (ArucoDetector, ids) para el perfil. `ids` es el array que traduce los índices
+    del diccionario reducido a ids reales, o None si se usa el diccionario completo.
+    """
+    perfil = perfil or {}
+    base = diccionario_base(perfil.get("diccionario", DICCIONARIO_BASE))
+    params = crear_parametros(perfil.get("parametros"))
+    ids = perfil.get("ids")
+    if ids:
+        ids = np.asarray(ids, dtype=np.int32)
+        return aruco.ArucoDetector(diccionario_reducido(base, ids), params), ids
+    return aruco.ArucoDetector(base, params), None
+
+
+def traducir_ids(ids, tabla):
+    """Ids reales de una detección hecha con el diccionario reducido"""
+    if ids is None or tabla is None:
+        return ids
+    return tabla[ids.ravel()].reshape(ids.shape)
+
+
+def parametros_calibracion(perfil=None):
+    """
+    Parámetros para calibrar: los umbrales del perfil, pero siempre con refinado
+    subpíxel porque en la calibración importa la precisión de las esquinas, no los ms.
+    """
+    parametros = dict((perfil or {}).get("parametros") or PARAMETROS_POR_DEFECTO)
+    parametros["cornerRefinementMethod"] = aruco.CORNER_REFINE_SUBPIX
+    return crear_parametros(parametros)
+
+
+def ruta_perfil():
+    return os.environ.get("GEOKIDS_PERFIL_ARUCO", RUTA_PERFIL)
+
+
+def cargar_perfil(ruta=None):
+    """Perfil guardado o None si no hay (o no se puede leer)"""
+    ruta = ruta or ruta_perfil()
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            perfil = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"No se pudo leer el perfil ArUco {ruta}: {e}")
+        return None
+    if perfil.get("version") != VERSION_PERFIL:
+        print(f"Perfil ArUco {ruta} con versión {perfil.get('version')} no soportada, se ignora")
+        return None
+    return perfil
+
+
+def guardar_perfil(parametros, ids=None, metricas=None, ruta=None, diccionario=DICCIONARIO_BASE):
+    ruta = ruta or ruta_perfil()
+    perfil = {
+        "version": VERSION_PERFIL,
+        "diccionario": diccionario,
+        "ids": [int(i) for i in ids] if ids else None,
+        "parametros": parametros,
+        "metricas": metricas or {},
+    }
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(perfil, f, indent=2)
+    return ruta
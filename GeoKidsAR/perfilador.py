@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+RUTA_PERFILES = os.path.join("datos", "perfiles")
+FRECUENCIA_HZ = 100      # Muestras por segundo
+DURACION_S = 10.0        # Segundos que dura un perfil lanzado con la tecla
+TECLA_PERFIL = ord('p')
+PROFUNDIDAD_MAXIMA = 64
+
+
+class Perfilador:
+    """
+    Perfilador por muestreo: un hilo en segundo plano mira cada 1/frecuencia segundos
+    la pila de Python del hilo principal (sys._current_frames) y cuenta cuántas veces
+    aparece cada pila. El bucle del juego no se toca, así que el coste se limita a ese hilo.
+
+    Cada muestra se etiqueta con el estado del juego en ese momento (menu, nivel_1,
+    pregunta_3...) como primer elemento de la pila, de forma que en el flamegraph
+    se separan las distintas pantallas.
+
+    Formatos de salida:
+        "colapsado"  una línea "estado;marco;marco;... N" por pila (flamegraph.pl, speedscope)
+        "speedscope" JSON de https://www.speedscope.app con un perfil por estado
+    """
+    def __init__(self, frecuencia=FRECUENCIA_HZ, carpeta=RUTA_PERFILES, formato="colapsado"):
+        if formato not in ("colapsado", "speedscope"):
+            raise ValueError(f"Formato de perfil desconocido: {formato}")
+        self.frecuencia = frecuencia
+        self.carpeta = carpeta
+        self.formato = formato
+        self.estado = "inicio"
+        self._hilo_objetivo = threading.main_thread().ident
+        self._pilas = Counter()
+        self._hilo = None
+        self._parar = threading.Event()
+        self._fin = None
+        self._inicio = None
+        self._muestras = 0
+
+    @property
+    def activo(self):
+        return self._hilo is not None
+
+    def etiquetar(self, estado):
+        """Cambia la etiqueta de estado que se añade a las siguientes muestras"""
+        self.estado = estado
+
+    def iniciar(self, duracion=DURACION_S):
+        """Empieza a muestrear durante `duracion` segundos (None: hasta llamar a detener)"""
+        if self.activo:
+            return
+        self._pilas = Counter()
+        self._muestras = 0
+        self._parar.clear()
+        self._inicio = time.time()
+        self._fin = time.monotonic() + duracion if duracion else None
+        self._hilo = threading.Thread(target=self._bucle, name="perfilador", daemon=True)
+        self._hilo.start()
+        print(f"Perfilando {duracion:g} s a {self.frecuencia} Hz" if duracion else
+              f"Perfilando a {self.frecuencia} Hz")
+
+    def detener(self):
+        """Para el muestreo y escribe el fichero. Retorna su ruta (o None si no había nada)"""
+        if not self.activo:
+            return None
+        self._parar.set()
+        if self._hilo is not threading.current_thread():
+            self._hilo.join()
+        self._hilo = None
+        return self._escribir()
+
+    def alternar(self, duracion=DURACION_S):
+        if self.activo:
+            self.detener()
+        else:
+            self.iniciar(duracion)
+
+    def _muestrear(self):
+        marco = sys._current_frames().get(self._hilo_objetivo)
+        if marco is None:
+            return
+        pila = []
+        while marco is not None and len(pila) < PROFUNDIDAD_MAXIMA:
+            codigo = marco.f_code
+            pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{marco.f_lineno})")
+            marco = marco.f_back
+        pila.append(self.estado)
+        pila.reverse()
+        self._pilas[tuple(pila)] += 1
+        self._muestras += 1
+
+    def _bucle(self):
+        periodo = 1.0 / self.frecuencia
+        siguiente = time.monotonic()
+        while not self._parar.is_set():
+            self._muestrear()
+            siguiente += periodo
+            ahora = time.monotonic()
+            if self._fin is not None and ahora >= self._fin:
+                break
+            # Si el muestreo se ha retrasado no se intenta recuperar: se salta al siguiente periodo
+            if siguiente < ahora:
+                siguiente = ahora
+            self._parar.wait(siguiente - ahora)
+        if not self._parar.is_set():
+            # Terminó por tiempo: se escribe desde este mismo hilo
+            self._hilo = None
+            self._escribir()
+
+    def _escribir(self):
+        if not self._pilas:
+            print("Perfil vacío, no se escribe nada")
+            return None
+        os.makedirs(self.carpeta, exist_ok=True)
+        nombre = time.strftime("perfil_%Y%m%d_%H%M%S", time.localtime(self._inicio))
+        if self.formato == "speedscope":
+            ruta = os.path.join(self.carpeta, nombre + ".speedscope.json")
+            contenido = json.dumps(self._speedscope(nombre))
+        else:
+            ruta = os.path.join(self.carpeta, nombre + ".txt")
+            contenido = "".join(f"{';'.join(pila)} {n}\n" for pila, n in self._pilas.most_common())
+        try:
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write(contenido)
+        except OSError as e:
+            print(f"No se pudo guardar el perfil: {e}")
+            return None
+        print(f"Perfil guardado en {ruta} ({self._muestras} muestras)")
+        return ruta
+
+    def _speedscope(self, nombre):
+        """Un perfil 'sampled' por estado del juego, con los marcos compartidos"""
+        marcos, indices = [], {}
+        perfiles = {}
+        peso = 1.0 / self.frecuencia
+        for pila, n in self._pilas.items():
+            estado, resto = pila[0], pila[1:]
+            muestra = []
+            for marco in resto:
+                if marco not in indices:
+                    indices[marco] = len(marcos)
+                    marcos.append({"name": marco})
+                muestra.append(indices[marco])
+            perfil = perfiles.setdefault(estado, {"muestras": [], "pesos": []})
+            perfil["muestras"].append(muestra)
+            perfil["pesos"].append(n * peso)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": nombre,
+            "exporter": "GeoKidsAR perfilador",
+            "shared": {"frames": marcos},
+            "profiles": [{
+                "type": "sampled", "name": estado, "unit": "seconds",
+                "startValue": 0, "endValue": sum(p["pesos"]),
+                "samples": p["muestras"], "weights": p["pesos"],
+            } for estado, p in perfiles.items()],
+        }
+
+
+def _desde_entorno():
+    """
+    GEOKIDS_PERFIL=segundos empieza a perfilar nada más arrancar (0: hasta salir).
+    GEOKIDS_PERFIL_FORMATO=speedscope cambia el formato de salida.
+    """
+    perfilador = Perfilador(formato=os.environ.get("GEOKIDS_PERFIL_FORMATO", "colapsado"))
+    segundos = os.environ.get("GEOKIDS_PERFIL")
+    if segundos is not None:
+        perfilador.iniciar(float(segundos) or None)
+    return perfilador
+
+# Instancia compartida; main la etiqueta con el estado y la alterna con TECLA_PERFIL
+PERFILADOR = _desde_entorno()
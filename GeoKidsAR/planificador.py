@@ -0,0 +1,133 @@
+"""
+Planificador de la interfaz: en lugar de bucles que sondean cv2.waitKey(1) en las
+pantallas estáticas, una cola de eventos de entrada (teclas e intenciones de teclado
+o de voz), temporizadores de reloj y redibujado solo cuando algo ha cambiado.
+
+El reloj lo da el entorno (entorno.reloj()): tiempo real con la cámara, tiempo del
+video en las repeticiones, así los temporizadores no dependen de los FPS.
+"""
+import heapq
+import itertools
+from collections import deque, namedtuple
+
+SIN_TECLA = 255            # cv2.waitKey(...) & 0xFF sin pulsación
+ESPERA_ESTATICA_MS = 100   # Máximo bloqueado en waitKey por vuelta con la pantalla quieta
+TECLA_VOZ = ord('v')
+
+# Teclas de las pantallas de resultados y su intención (las mismas palabras que la voz)
+TECLAS_INTENCION = {27: "salir", ord('r'): "reiniciar", ord('s'): "siguiente"}
+
+Evento = namedtuple("Evento", "tipo valor")  # tipo: "tecla" o "temporizador"
+
+
+class PlanificadorUI:
+    def __init__(self, entorno):
+        self.entorno = entorno
+        self._cola = deque()
+        self._temporizadores = []        # heap de (vence, orden, nombre)
+        self._vencimientos = {}          # nombre -> vence (el último programado)
+        self._orden = itertools.count()
+        self._sucio = True
+
+    def reloj(self):
+        return self.entorno.reloj()
+
+    def publicar(self, tipo, valor=None):
+        self._cola.append(Evento(tipo, valor))
+        self._sucio = True
+
+    def programar(self, segundos, nombre):
+        """Temporizador de reloj; si ya había uno con ese nombre se reemplaza"""
+        vence = self.reloj() + segundos
+        self._vencimientos[nombre] = vence
+        heapq.heappush(self._temporizadores, (vence, next(self._orden), nombre))
+
+    def cancelar(self, nombre):
+        self._vencimientos.pop(nombre, None)
+
+    def pendiente(self, nombre):
+        """True mientras el temporizador no haya vencido"""
+        vence = self._vencimientos.get(nombre)
+        return vence is not None and self.reloj() < vence
+
+    def invalidar(self):
+        self._sucio = True
+
+    def hay_que_redibujar(self):
+        sucio, self._sucio = self._sucio, False
+        return sucio
+
+    def _vencer(self):
+        ahora = self.reloj()
+        while self._temporizadores and self._temporizadores[0][0] <= ahora:
+            vence, _, nombre = heapq.heappop(self._temporizadores)
+            # Las entradas reemplazadas o canceladas se ignoran
+            if self._vencimientos.get(nombre) == vence:
+                del self._vencimientos[nombre]
+                self.publicar("temporizador", nombre)
+
+    def _espera_ms(self, maxima_ms):
+        """Lo que se puede bloquear en waitKey sin pasarse del próximo temporizador"""
+        if not self._temporizadores:
+            return maxima_ms
+        restante = (self._temporizadores[0][0] - self.reloj()) * 1000.0
+        return max(1, min(maxima_ms, int(restante) + 1))
+
+    def sondear(self, espera_ms=1):
+        """
+        Lee el teclado (bloqueando como mucho espera_ms o hasta el próximo temporizador),
+        encola la tecla y los temporizadores vencidos y retorna la tecla o SIN_TECLA.
+        """
+        tecla = self.entorno.tecla(self._espera_ms(espera_ms))
+        if tecla != SIN_TECLA:
+            self.publicar("tecla", tecla)
+        self._vencer()
+        return tecla
+
+    def eventos(self):
+        """Vacía la cola y retorna los eventos en orden de llegada"""
+        eventos = list(self._cola)
+        self._cola.clear()
+        return eventos
+
+    def _intencion_voz(self, intenciones):
+        """Escucha una orden de voz restringida a las intenciones indicadas"""
+        orden = {"pregunta": "", "opciones": list(intenciones), "respuesta_correcta": ""}
+        try:
+            respuesta = self.entorno.respuesta_voz(orden)
+        except Exception as e:
+            print(f"Error en reconocimiento de voz: {str(e)}")
+            return None
+        texto = getattr(respuesta, "texto", "")
+        return texto if texto in intenciones else None
+
+    def esperar(self, intenciones=None, maximo=None, dibujar=None):
+        """
+        Pantalla estática: bloquea en waitKey en tramos de hasta ESPERA_ESTATICA_MS hasta
+        recibir una de las `intenciones` (por su tecla o, con 'v', por voz) y la retorna.
+        Sin intenciones vale cualquier tecla. Con `maximo` (segundos) retorna None al vencer.
+        `dibujar()` retorna el frame a mostrar y solo se llama cuando hay que redibujar.
+        Entre esperas se descartan frames de la cámara para que no se queden atrasados.
+        """
+        if maximo is not None:
+            self.programar(maximo, "fin_espera")
+        try:
+            while True:
+                if dibujar is not None and self.hay_que_redibujar():
+                    self.entorno.mostrar(dibujar())
+                self.sondear(ESPERA_ESTATICA_MS)
+                self.entorno.descartar_frame()
+                for evento in self.eventos():
+                    if evento.tipo == "temporizador" and evento.valor == "fin_espera":
+                        return None
+                    if evento.tipo != "tecla":
+                        continue
+                    if intenciones is None:
+                        return evento.valor
+                    intencion = TECLAS_INTENCION.get(evento.valor)
+                    if evento.valor == TECLA_VOZ:
+                        intencion = self._intencion_voz(intenciones)
+                    if intencion in intenciones:
+                        return intencion
+        finally:
+            self.cancelar("fin_espera")
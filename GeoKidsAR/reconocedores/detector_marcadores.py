@@ -4,17 +4,36 @@ import numpy as np
 import os
 from cuia import  popup, proyeccion  # Importamos las utilidades de cuia.py
 from camara import cameraMatrix, distCoeffs
+from instrumentacion import tramo
+import perfil_aruco
 
-# Configuración ArUco
+# Configuración ArUco: la del perfil ajustado (datos/perfil_aruco.json) si existe;
+# si no, DICT_4X4_250 completo con refinado subpíxel
 DICCIONARIO = aruco.getPredefinedDictionary(aruco.DICT_4X4_250)
-PARAMS = aruco.DetectorParameters()
-PARAMS.cornerRefinementMethod = aruco.CORNER_REFINE_SUBPIX
-DETECTOR = aruco.ArucoDetector(DICCIONARIO, PARAMS)
+PERFIL = perfil_aruco.cargar_perfil()
+DETECTOR, TABLA_IDS = perfil_aruco.crear_detector(PERFIL)
+if PERFIL is not None:
+    print(f"Perfil ArUco cargado de {perfil_aruco.ruta_perfil()}")
+
+def usar_perfil(perfil):
+    """Cambia el detector por el de otro perfil (None: el de por defecto)"""
+    global PERFIL, DETECTOR, TABLA_IDS
+    PERFIL = perfil
+    DETECTOR, TABLA_IDS = perfil_aruco.crear_detector(perfil)
 
 # Usar los parámetros reales de calibración
 MATRIZ_CAMARA = cameraMatrix
 COEF_DISTORSION = distCoeffs
 
+def configurar_camara(matriz_camara, coef_distorsion):
+    """
+    Cambia los parámetros de cámara usados para estimar y dibujar la pose
+    (p.ej. distorsión nula cuando se trabaja con frames rectificados)
+    """
+    global MATRIZ_CAMARA, COEF_DISTORSION
+    MATRIZ_CAMARA = matriz_camara
+    COEF_DISTORSION = coef_distorsion
+
 class Marcador:
     """
     Representa un marcador ArUco detectado en la imagen.
@@ -48,10 +67,11 @@ class Marcador:
                               [self.tamano/2, -self.tamano/2, 0],
                               [-self.tamano/2, -self.tamano/2, 0]], dtype=np.float32)
         
-        ret, self.rvec, self.tvec = cv2.solvePnP(obj_points, 
-                                                self.esquinas.astype(np.float32),
-                                                matriz_camara, 
-                                                coef_distorsion)
+        with tramo("solvePnP"):
+            ret, self.rvec, self.tvec = cv2.solvePnP(obj_points, 
+                                                    self.esquinas.astype(np.float32),
+                                                    matriz_camara, 
+                                                    coef_distorsion)
         return ret
 
 def cargar_imagen_marcador(id_marcador, mostrar=True):
@@ -62,10 +82,54 @@ def cargar_imagen_marcador(id_marcador, mostrar=True):
         popup(f"Marcador {id_marcador}", img)
     return img
 
-def detectar_marcadores(frame, dibujar=True, estimar_pose=False):
-    """Calcula la posición y orientación del marcador"""
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    esquinas, ids, _ = DETECTOR.detectMarkers(gray)
+def _detectar(frame, escala=1.0):
+    """
+    Ejecuta detectMarkers, opcionalmente sobre el frame reducido.
+    Retorna: imagen gris usada, esquinas en píxeles del frame original e ids.
+    """
+    with tramo("detectMarkers"):
+        if escala != 1.0:
+            reducido = cv2.resize(frame, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(reducido, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        esquinas, ids, _ = DETECTOR.detectMarkers(gray)
+        ids = perfil_aruco.traducir_ids(ids, TABLA_IDS)
+        if escala != 1.0 and ids is not None:
+            esquinas = tuple(e / escala for e in esquinas)
+    return gray, esquinas, ids
+
+def dibujar_marcador(frame, marcador):
+    """Dibuja ejes (si tiene pose), contorno e ID de un marcador"""
+    if marcador.rvec is not None:
+        cv2.drawFrameAxes(frame, MATRIZ_CAMARA, COEF_DISTORSION,
+                          marcador.rvec, marcador.tvec, 0.05)
+    cv2.aruco.drawDetectedMarkers(frame, [marcador.esquinas.reshape(1, 4, 2)],
+                                  np.array([[marcador.id]]))
+    info = f"ID: {marcador.id}"
+    cv2.putText(frame, info, 
+              (int(marcador.centro[0]), int(marcador.centro[1]) - 30),
+              cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+def _dibujar_seleccionado(frame, m, estimar_pose):
+    """Marca el centro del marcador buscado y su posición 3D"""
+    cv2.drawMarker(frame, 
+                 (int(m.centro[0]), int(m.centro[1])),
+                 (0, 0, 255), cv2.MARKER_CROSS, 20, 2)
+    if estimar_pose and m.rvec is not None:
+        # Proyectar información 3D usando la función proyeccion de cuia.py
+        texto_pos = f"Pos: {m.tvec.flatten()[:3].round(2)}"
+        punto_texto = proyeccion([0, 0, 0], m.rvec, m.tvec, MATRIZ_CAMARA, COEF_DISTORSION)
+        cv2.putText(frame, texto_pos, 
+                  (int(punto_texto[0]), int(punto_texto[1])),
+                  cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+
+def detectar_marcadores(frame, dibujar=True, estimar_pose=False, escala=1.0):
+    """
+    Calcula la posición y orientación del marcador.
+    Con escala < 1 la detección se hace sobre el frame reducido (más rápido, menos alcance).
+    """
+    _, esquinas, ids = _detectar(frame, escala)
     
     marcadores = []
     if ids is not None:
@@ -74,38 +138,85 @@ def detectar_marcadores(frame, dibujar=True, estimar_pose=False):
             
             if estimar_pose:
                 marcador.estimar_pose()
-                if dibujar:
-                    cv2.drawFrameAxes(frame, MATRIZ_CAMARA, COEF_DISTORSION,
-                                    marcador.rvec, marcador.tvec, 0.05)
             
             marcadores.append(marcador)
             
             if dibujar:
-                cv2.aruco.drawDetectedMarkers(frame, [esquinas[i]], np.array([ids[i]]))
-                info = f"ID: {marcador.id}"
-                cv2.putText(frame, info, 
-                          (int(marcador.centro[0]), int(marcador.centro[1]) - 30),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                dibujar_marcador(frame, marcador)
     
     return marcadores
 
-def obtener_marcador_por_id(frame, id_buscado, dibujar=True, estimar_pose=True):
+def obtener_marcador_por_id(frame, id_buscado, dibujar=True, estimar_pose=True, escala=1.0):
     """
     Busca un marcador específico y opcionalmente estima su pose 3D
     """
-    marcadores = detectar_marcadores(frame, dibujar, estimar_pose)
+    marcadores = detectar_marcadores(frame, dibujar, estimar_pose, escala)
     for m in marcadores:
         if m.id == id_buscado:
             if dibujar:
-                cv2.drawMarker(frame, 
-                             (int(m.centro[0]), int(m.centro[1])),
-                             (0, 0, 255), cv2.MARKER_CROSS, 20, 2)
-                if estimar_pose and m.rvec is not None:
-                    # Proyectar información 3D usando la función proyeccion de cuia.py
-                    texto_pos = f"Pos: {m.tvec.flatten()[:3].round(2)}"
-                    punto_texto = proyeccion([0, 0, 0], m.rvec, m.tvec, MATRIZ_CAMARA, COEF_DISTORSION)
-                    cv2.putText(frame, texto_pos, 
-                              (int(punto_texto[0]), int(punto_texto[1])),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+                _dibujar_seleccionado(frame, m, estimar_pose)
             return m
-    return None
\ No newline at end of file
+    return None
+
+class SeguidorMarcador:
+    """
+    Mantiene un marcador entre detecciones: en los frames en los que no se ejecuta
+    detectMarkers, sus esquinas se siguen con flujo óptico (Lucas-Kanade), que es
+    mucho más barato, y se vuelve a estimar la pose.
+    """
+    PARAMETROS_LK = dict(winSize=(21, 21), maxLevel=3,
+                         criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+    def __init__(self, id_buscado):
+        self.id_buscado = id_buscado
+        self.marcador = None
+        self._gris = None
+        self._escala = 1.0
+
+    def obtener(self, frame, detectar=True, escala=1.0, dibujar=True, estimar_pose=True):
+        if detectar:
+            return self._detectar(frame, escala, dibujar, estimar_pose)
+        if self.marcador is None:
+            return None  # Sin marcador que seguir se espera a la próxima detección programada
+        return self._seguir(frame, dibujar, estimar_pose)
+
+    def _detectar(self, frame, escala, dibujar, estimar_pose):
+        gray, esquinas, ids = _detectar(frame, escala)
+        self._gris, self._escala = gray, escala
+        self.marcador = None
+        if ids is not None:
+            for i in range(len(ids)):
+                if int(ids[i][0]) == self.id_buscado:
+                    self.marcador = Marcador(self.id_buscado, esquinas[i][0])
+                    break
+        if self.marcador is not None:
+            if estimar_pose:
+                self.marcador.estimar_pose()
+            if dibujar:
+                dibujar_marcador(frame, self.marcador)
+                _dibujar_seleccionado(frame, self.marcador, estimar_pose)
+        return self.marcador
+
+    def _seguir(self, frame, dibujar, estimar_pose):
+        with tramo("seguimiento"):
+            if self._escala != 1.0:
+                reducido = cv2.resize(frame, None, fx=self._escala, fy=self._escala, interpolation=cv2.INTER_AREA)
+                gray = cv2.cvtColor(reducido, cv2.COLOR_BGR2GRAY)
+            else:
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            anteriores = (self.marcador.esquinas * self._escala).astype(np.float32).reshape(-1, 1, 2)
+            nuevas, estado, _ = cv2.calcOpticalFlowPyrLK(self._gris, gray, anteriores, None, **self.PARAMETROS_LK)
+            self._gris = gray
+
+        if nuevas is None or not estado.all():
+            # Se ha perdido alguna esquina: hasta la próxima detección no hay marcador
+            self.marcador = None
+            return None
+
+        self.marcador = Marcador(self.id_buscado, nuevas.reshape(4, 2) / self._escala)
+        if estimar_pose:
+            self.marcador.estimar_pose()
+        if dibujar:
+            dibujar_marcador(frame, self.marcador)
+            _dibujar_seleccionado(frame, self.marcador, estimar_pose)
+        return self.marcador
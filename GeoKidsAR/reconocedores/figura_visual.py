@@ -1,9 +1,117 @@
 import cv2
 import numpy as np
 
+# Figuras 2D en unidades de figura: el centro es (0, 0), y hacia abajo, y el tamaño base
+# (los 100 px de mostrar_figura, el lado del marcador en dibujar_figura_plana) es 1.
+FIGURAS = {
+    "cuadrado": ((0, 255, 0), [(-1, -1), (1, -1), (1, 1), (-1, 1)]),
+    "rectangulo": ((255, 0, 0), [(-1.5, -1), (1.5, -1), (1.5, 1), (-1.5, 1)]),
+    "triangulo": ((0, 0, 255), [(0, -1), (1, 1), (-1, 1)]),
+    "circulo": ((255, 255, 0), [(np.cos(a), np.sin(a)) for a in np.linspace(0, 2 * np.pi, 64, endpoint=False)]),
+    "trapecio": ((128, 0, 255), [(-1.2, -0.6), (1.2, -0.6), (0.8, 0.6), (-0.8, 0.6)]),
+    "rombo": ((0, 255, 255), [(0, -1), (0.8, 0), (0, 1), (-0.8, 0)]),
+    "pentagono": ((255, 150, 0), [(0, -1), (0.95, -0.3), (0.6, 0.9), (-0.6, 0.9), (-0.95, -0.3)]),
+    "hexagono": ((0, 128, 255), [(-0.6, -1), (0.6, -1), (1.2, 0), (0.6, 1), (-0.6, 1), (-1.2, 0)]),
+}
+FIGURAS = {nombre: (color, np.array(vertices, dtype=np.float32)) for nombre, (color, vertices) in FIGURAS.items()}
+TEXTO_GENERICO = ("forma_generica", "Figura", (200, 200, 200))
+
+ESCALA_FIGURA = 1.0            # Tamaño base de la figura en lados del marcador
+NIVELES_SPRITE = (128, 64, 32)  # Píxeles por unidad de cada versión pre-rasterizada
+BITS_SUBPIXEL = 4
+
+# Esquinas del marcador en unidades de marcador, en el orden de detectMarkers
+_ESQUINAS_MARCADOR = np.float32([[-0.5, -0.5], [0.5, -0.5], [0.5, 0.5], [-0.5, 0.5]])
+_SPRITES = {}
+
+def _rasterizar(nombre, px_unidad):
+    """
+    Sprite BGRA de la figura con bordes suavizados (el alfa es la cobertura de cada
+    píxel y el color está premultiplicado por él). Retorna (sprite, origen): origen es el píxel del sprite que cae en (0, 0).
+    """
+    margen = 2
+    if nombre == TEXTO_GENERICO[0]:
+        _, texto, color = TEXTO_GENERICO
+        escala_texto = px_unidad / 50.0
+        grosor = max(1, int(round(px_unidad / 25.0)))
+        (ancho, alto), base = cv2.getTextSize(texto, cv2.FONT_HERSHEY_SIMPLEX, escala_texto, grosor)
+        sprite = np.zeros((alto + base + 2 * margen, ancho + 2 * margen, 4), np.uint8)
+        cv2.putText(sprite, texto, (margen, margen + alto), cv2.FONT_HERSHEY_SIMPLEX, escala_texto,
+                    (*color, 255), grosor, cv2.LINE_AA)
+        # El texto empezaba en la posición - 1 unidad, con la línea base en el centro
+        return sprite, (margen + px_unidad, margen + alto)
+
+    color, vertices = FIGURAS[nombre]
+    minimo = vertices.min(axis=0) * px_unidad
+    maximo = vertices.max(axis=0) * px_unidad
+    origen = margen - minimo
+    ancho, alto = (np.ceil(maximo - minimo) + 2 * margen + 1).astype(int)
+    sprite = np.zeros((alto, ancho, 4), np.uint8)
+    puntos = np.round((vertices * px_unidad + origen) * (1 << BITS_SUBPIXEL)).astype(np.int32)
+    cv2.fillPoly(sprite, [puntos], (*color, 255), cv2.LINE_AA, BITS_SUBPIXEL)
+    return sprite, tuple(origen)
+
+def sprites_figura(nombre):
+    """Versiones pre-rasterizadas de la figura [(px_unidad, sprite, origen)], o None si no existe"""
+    if nombre not in _SPRITES:
+        if nombre not in FIGURAS and nombre != TEXTO_GENERICO[0]:
+            _SPRITES[nombre] = None
+        else:
+            _SPRITES[nombre] = [(px, *_rasterizar(nombre, px)) for px in NIVELES_SPRITE]
+    return _SPRITES[nombre]
+
+def _mezclar(roi, capa):
+    """
+    roi = capa sobre roi, con enteros. La capa tiene el color ya multiplicado por el alfa:
+    fillPoly con LINE_AA sobre fondo transparente deja así los bordes, y warpPerspective
+    también interpola hacia el borde (0, 0, 0, 0).
+    """
+    alfa = capa[:, :, 3:4].astype(np.uint16)
+    mezcla = (roi * (255 - alfa) + 127) // 255 + capa[:, :, :3]
+    roi[:] = np.minimum(mezcla, 255)
+
+def dibujar_figura_plana(frame, nombre_figura, esquinas, escala=ESCALA_FIGURA):
+    """
+    Dibuja la figura 2D pegada al plano del marcador: el sprite pre-rasterizado se
+    deforma con la homografía de las esquinas detectadas, así sigue la escala y la
+    inclinación de la tarjeta. Solo se deforma y mezcla el rectángulo que ocupa.
+    """
+    sprites = sprites_figura(nombre_figura)
+    if sprites is None:
+        return frame
+    homografia = cv2.getPerspectiveTransform(_ESQUINAS_MARCADOR, np.asarray(esquinas, dtype=np.float32).reshape(4, 2))
+
+    # Versión del sprite con resolución suficiente para el tamaño en pantalla
+    lado = np.sqrt(abs(cv2.contourArea(np.asarray(esquinas, dtype=np.float32).reshape(4, 2)))) * escala
+    px_unidad, sprite, (ox, oy) = next((s for s in reversed(sprites) if s[0] >= lado), sprites[0])
+
+    # Píxel del sprite -> unidades de marcador -> píxel del frame
+    a = escala / px_unidad
+    sprite_a_marcador = np.array([[a, 0, -ox * a], [0, a, -oy * a], [0, 0, 1]])
+    h = homografia @ sprite_a_marcador
+
+    alto_s, ancho_s = sprite.shape[:2]
+    bordes = np.array([[0, 0, 1], [ancho_s, 0, 1], [ancho_s, alto_s, 1], [0, alto_s, 1]], dtype=np.float64).T
+    proyectados = h @ bordes
+    if np.any(proyectados[2] <= 1e-6):
+        return frame  # El sprite cruzaría el horizonte del plano (marcador casi de canto)
+    proyectados = proyectados[:2] / proyectados[2]
+    x0, y0 = np.maximum(np.floor(proyectados.min(axis=1)).astype(int), 0)
+    x1 = min(int(np.ceil(proyectados[0].max())) + 1, frame.shape[1])
+    y1 = min(int(np.ceil(proyectados[1].max())) + 1, frame.shape[0])
+    if x1 <= x0 or y1 <= y0:
+        return frame
+
+    desplazamiento = np.array([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]], dtype=np.float64)
+    capa = cv2.warpPerspective(sprite, desplazamiento @ h, (x1 - x0, y1 - y0), flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0, 0))
+    _mezclar(frame[y0:y1, x0:x1], capa)
+    return frame
+
 def mostrar_figura(frame, nombre_figura, posicion, tamano=100):
     """
-    Muestra una figura geométrica en la posición especificada
+    Muestra una figura geométrica en la posición especificada, de frente y sin deformar
+    (para figuras sobre el marcador, ver dibujar_figura_plana)
     Args:
         frame: Imagen donde dibujar
         nombre_figura: Nombre de la figura a dibujar
@@ -11,58 +119,35 @@ def mostrar_figura(frame, nombre_figura, posicion, tamano=100):
         tamano: Tamaño base de la figura (por defecto 100)
     """
     cx, cy = posicion
-    
-    if nombre_figura == "cuadrado":
-        cv2.rectangle(frame, (cx - tamano, cy - tamano), 
-                     (cx + tamano, cy + tamano), (0, 255, 0), -1)
-    elif nombre_figura == "rectangulo":
-        cv2.rectangle(frame, (cx - int(tamano*1.5), cy - tamano), 
-                     (cx + int(tamano*1.5), cy + tamano), (255, 0, 0), -1)
-    elif nombre_figura == "triangulo":
-        pts = np.array([[cx, cy - tamano], 
-                       [cx - tamano, cy + tamano], 
-                       [cx + tamano, cy + tamano]], np.int32)
-        cv2.fillPoly(frame, [pts], (0, 0, 255))
-    elif nombre_figura == "circulo":
-        cv2.circle(frame, (cx, cy), tamano, (255, 255, 0), -1)
-    elif nombre_figura == "trapecio":
-        # Puntos corregidos para el trapecio
-        pts = np.array([
-            [cx - int(tamano*1.2), cy - int(tamano*0.6)],  # Esquina superior izquierda
-            [cx + int(tamano*1.2), cy - int(tamano*0.6)],  # Esquina superior derecha
-            [cx + int(tamano*0.8), cy + int(tamano*0.6)],  # Esquina inferior derecha
-            [cx - int(tamano*0.8), cy + int(tamano*0.6)]   # Esquina inferior izquierda
-        ], np.int32)
-        cv2.fillPoly(frame, [pts], (128, 0, 255))
-    elif nombre_figura == "rombo":
-        pts = np.array([[cx, cy - tamano], 
-                       [cx + int(tamano*0.8), cy], 
-                       [cx, cy + tamano], 
-                       [cx - int(tamano*0.8), cy]], np.int32)
-        cv2.fillPoly(frame, [pts], (0, 255, 255))
-    elif nombre_figura == "pentagono":
-        pts = np.array([[cx, cy - tamano], 
-                       [cx + int(tamano*0.95), cy - int(tamano*0.3)], 
-                       [cx + int(tamano*0.6), cy + int(tamano*0.9)], 
-                       [cx - int(tamano*0.6), cy + int(tamano*0.9)], 
-                       [cx - int(tamano*0.95), cy - int(tamano*0.3)]], np.int32)
-        cv2.fillPoly(frame, [pts], (255, 150, 0))
-    elif nombre_figura == "hexagono":
-        pts = np.array([[cx - int(tamano*0.6), cy - tamano], 
-                       [cx + int(tamano*0.6), cy - tamano], 
-                       [cx + int(tamano*1.2), cy], 
-                       [cx + int(tamano*0.6), cy + tamano], 
-                       [cx - int(tamano*0.6), cy + tamano], 
-                       [cx - int(tamano*1.2), cy]], np.int32)
-        cv2.fillPoly(frame, [pts], (0, 128, 255))
-    elif nombre_figura == "forma_generica":
-        cv2.putText(frame, "Figura", (cx - tamano, cy), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 2, (200, 200, 200), 4)
-        
-import cv2
-import numpy as np
+    if nombre_figura in FIGURAS:
+        color, vertices = FIGURAS[nombre_figura]
+        pts = (vertices * tamano + (cx, cy)).astype(np.int32)
+        cv2.fillPoly(frame, [pts], color)
+    elif nombre_figura == TEXTO_GENERICO[0]:
+        cv2.putText(frame, TEXTO_GENERICO[1], (cx - tamano, cy),
+                   cv2.FONT_HERSHEY_SIMPLEX, 2, TEXTO_GENERICO[2], 4)
+
+def _rellenar_caras(frame, puntos_img, caras, color, alpha, sombreado):
+    """
+    sombreado="completo": caras semitransparentes (copia del frame y addWeighted).
+    sombreado="simple": caras opacas directamente sobre el frame, sin copia ni mezcla.
+    """
+    if sombreado == "simple":
+        for cara in caras:
+            cv2.fillConvexPoly(frame, puntos_img[cara].reshape((-1, 1, 2)), color)
+        return
+    if sombreado != "completo":
+        raise ValueError(f"Sombreado desconocido: {sombreado}")
+
+    overlay = frame.copy()
+    for cara in caras:
+        pts = puntos_img[cara].reshape((-1, 1, 2))
+        cv2.fillConvexPoly(overlay, pts, color)
 
-def dibujar_cubo(frame, rvec, tvec, matriz_camara, coef_distorsion, tamano=0.05, color=(255, 0, 0), alpha=0.4):
+    # Aplicar transparencia
+    cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+
+def dibujar_cubo(frame, rvec, tvec, matriz_camara, coef_distorsion, tamano=0.05, color=(255, 0, 0), alpha=0.4, sombreado="completo"):
     # Definir vértices del cubo en coordenadas 3D
     mitad = tamano / 2
     puntos_objeto = np.float32([
@@ -91,13 +176,7 @@ def dibujar_cubo(frame, rvec, tvec, matriz_camara, coef_distorsion, tamano=0.05,
     ]
 
     # Dibujar las caras con relleno semitransparente
-    overlay = frame.copy()
-    for cara in caras:
-        pts = puntos_img[cara].reshape((-1, 1, 2))
-        cv2.fillConvexPoly(overlay, pts, color)
-
-    # Aplicar transparencia
-    cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+    _rellenar_caras(frame, puntos_img, caras, color, alpha, sombreado)
 
     # Dibujar las aristas por encima
     aristas = [
@@ -110,7 +189,7 @@ def dibujar_cubo(frame, rvec, tvec, matriz_camara, coef_distorsion, tamano=0.05,
 
     return frame
 
-def dibujar_piramide(frame, rvec, tvec, matriz_camara, coef_distorsion, tamano=0.05, altura=0.05, color=(0, 255, 0), alpha=0.5):
+def dibujar_piramide(frame, rvec, tvec, matriz_camara, coef_distorsion, tamano=0.05, altura=0.05, color=(0, 255, 0), alpha=0.5, sombreado="completo"):
     mitad = tamano / 2
 
     # Vértices 3D de la base y el vértice superior
@@ -135,15 +214,8 @@ def dibujar_piramide(frame, rvec, tvec, matriz_camara, coef_distorsion, tamano=0
         [3, 0, 4]        # izquierda
     ]
 
-    overlay = frame.copy()
-
     # Dibujar caras
-    for cara in caras:
-        pts = puntos_img[cara].reshape((-1, 1, 2))
-        cv2.fillConvexPoly(overlay, pts, color)
-
-    # Transparencia
-    cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+    _rellenar_caras(frame, puntos_img, caras, color, alpha, sombreado)
 
     # Dibujar líneas por encima
     aristas = [
@@ -0,0 +1,162 @@
+"""
+Micrófono siempre abierto: un hilo lee bloques de 30 ms de un único stream y los guarda
+en un búfer circular. Sobre cada bloque se mantiene una estimación continua del ruido de
+fondo y un detector de voz (VAD) por energía con umbral relativo a ese ruido.
+
+Al pulsar 'v' no hay que abrir el dispositivo ni calibrar: si el niño ya está hablando
+se aprovecha la frase en curso desde su inicio, y si no se espera a que empiece. La frase
+se entrega con un poco de audio previo (pre-roll) para no cortar la primera sílaba.
+"""
+import threading
+import time
+from collections import deque
+import numpy as np
+import speech_recognition as sr
+
+FRECUENCIA = 16000
+BLOQUE = 480                 # Muestras por bloque (30 ms a 16 kHz)
+CAPACIDAD_S = 10.0           # Audio que se conserva en el búfer circular
+PREROLL_S = 0.3              # Audio anterior al inicio de la voz que se incluye
+SILENCIO_FIN_S = 0.6         # Silencio que cierra una frase
+MAX_FRASE_S = 8.0            # Una "frase" más larga es un cambio de ruido de fondo
+BLOQUES_INICIO = 3           # Bloques seguidos por encima del umbral para abrir una frase
+FACTOR_UMBRAL = 3.0          # Umbral = ruido de fondo * FACTOR_UMBRAL
+UMBRAL_MINIMO = 150.0        # RMS mínimo (int16) para considerar voz aunque el ruido sea muy bajo
+ADAPTACION_RUIDO = 0.05      # Peso de cada bloque de silencio en la media del ruido
+
+
+class MicrofonoContinuo:
+    def __init__(self, frecuencia=FRECUENCIA, bloque=BLOQUE, capacidad_s=CAPACIDAD_S, dispositivo=None):
+        self.frecuencia = frecuencia
+        self.bloque = bloque
+        self.dispositivo = dispositivo
+        self._duracion_bloque = bloque / frecuencia
+        self._bloques = deque(maxlen=int(capacidad_s / self._duracion_bloque))
+        self._n = 0                  # Bloques leídos desde el inicio (índice del siguiente)
+        self._condicion = threading.Condition()
+        self._hilo = None
+        self._activo = False
+        self.error = None
+
+        # Estado del VAD (índices absolutos de bloque)
+        self.ruido = None
+        self._seguidos = 0
+        self._silencio = 0
+        self._inicio_voz = None      # Inicio de la frase en curso o de la última
+        self._fin_voz = None         # None mientras la frase sigue
+
+    def _bloques_de(self, segundos):
+        return max(1, int(round(segundos / self._duracion_bloque)))
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, name="microfono", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._activo = False
+        if self._hilo is not None:
+            self._hilo.join(2.0)
+            self._hilo = None
+
+    @property
+    def umbral(self):
+        return max(UMBRAL_MINIMO, (self.ruido or 0.0) * FACTOR_UMBRAL)
+
+    def _bucle(self):
+        try:
+            with sr.Microphone(device_index=self.dispositivo, sample_rate=self.frecuencia,
+                               chunk_size=self.bloque) as fuente:
+                while self._activo:
+                    self._procesar(fuente.stream.read(self.bloque))
+        except Exception as e:
+            print(f"Error en el micrófono: {str(e)}")
+            with self._condicion:
+                self.error = e
+                self._condicion.notify_all()
+
+    def _procesar(self, datos):
+        muestras = np.frombuffer(datos, dtype=np.int16).astype(np.float32)
+        rms = float(np.sqrt(np.mean(muestras * muestras))) if len(muestras) else 0.0
+        with self._condicion:
+            indice = self._n
+            self._bloques.append(datos)
+            self._n += 1
+            if self.ruido is None:
+                self.ruido = rms
+
+            if self._en_voz() and indice - self._inicio_voz >= self._bloques_de(MAX_FRASE_S):
+                # Ruido nuevo y constante (un ventilador, una clase que empieza): se reaprende
+                self._fin_voz = indice
+                self.ruido = rms
+                self._seguidos = 0
+            elif rms > self.umbral:
+                self._seguidos += 1
+                self._silencio = 0
+                if self._seguidos == BLOQUES_INICIO and (self._inicio_voz is None or self._fin_voz is not None):
+                    self._inicio_voz = indice - BLOQUES_INICIO + 1
+                    self._fin_voz = None
+            else:
+                self._seguidos = 0
+                if self._inicio_voz is not None and self._fin_voz is None:
+                    self._silencio += 1
+                    if self._silencio >= self._bloques_de(SILENCIO_FIN_S):
+                        self._fin_voz = indice - self._silencio + 1
+                else:
+                    # El ruido solo se aprende fuera de las frases
+                    self.ruido += ADAPTACION_RUIDO * (rms - self.ruido)
+            self._condicion.notify_all()
+
+    def _en_voz(self):
+        return self._inicio_voz is not None and self._fin_voz is None
+
+    def escuchar(self, espera=5.0, duracion_maxima=3.0, cancelar=None):
+        """
+        Retorna la siguiente frase como sr.AudioData, o None si no empieza nadie a hablar
+        en `espera` segundos. Una frase ya en curso al llamar se toma desde su inicio.
+        `cancelar` (threading.Event) interrumpe la escucha y también retorna None.
+        """
+        self.iniciar()
+        limite = time.monotonic() + espera
+        maximo = self._bloques_de(duracion_maxima)
+        cancelada = cancelar.is_set if cancelar is not None else lambda: False
+        with self._condicion:
+            while not self._en_voz():
+                restante = limite - time.monotonic()
+                if restante <= 0 or self.error is not None or cancelada():
+                    return None
+                self._condicion.wait(min(restante, 0.1))
+            # Una frase en curso desde hace mucho se toma solo desde lo más reciente
+            inicio = max(self._inicio_voz, self._n - maximo)
+            # Hasta el fin de la frase o la duración máxima
+            while self._fin_voz is None and self._n - inicio < maximo and self.error is None:
+                if cancelada():
+                    return None
+                self._condicion.wait(0.1)
+            fin = self._fin_voz if self._fin_voz is not None else self._n
+            fin = min(fin, inicio + maximo)
+            primero = self._n - len(self._bloques)
+            desde = max(inicio - self._bloques_de(PREROLL_S), primero)
+            datos = b"".join(self._bloques[i - primero] for i in range(desde, fin))
+        return sr.AudioData(datos, self.frecuencia, 2)
+
+
+_MICROFONO = None
+
+
+def microfono():
+    """Micrófono compartido por todas las respuestas de voz (se abre al primer uso)"""
+    global _MICROFONO
+    if _MICROFONO is None or _MICROFONO.error is not None:  # Tras un fallo se reintenta
+        _MICROFONO = MicrofonoContinuo()
+    _MICROFONO.iniciar()
+    return _MICROFONO
+
+
+def detener():
+    global _MICROFONO
+    if _MICROFONO is not None:
+        _MICROFONO.detener()
+        _MICROFONO = None
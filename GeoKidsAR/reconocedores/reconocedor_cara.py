@@ -4,8 +4,12 @@ import numpy as np
 import json
 import cv2
 import os
-from cuia import myVideo, popup, plot  # Importamos las utilidades de cuia.py
+import queue
+import threading
+import time
+from cuia import myVideo, plot  # Importamos las utilidades de cuia.py
 from reconocedores import reconocedor_voz
+from texto import escribir
 
 # Configuración
 RUTA_DATOS = "datos"
@@ -13,36 +17,90 @@ RUTA_USUARIOS = os.path.join(RUTA_DATOS, "usuarios_vectores.json")
 UMBRAL_SIMILITUD = 0.45
 MODELO_DETECCION = "hog"  # "hog" para CPU, "cnn" para GPU
 
+# Registro con varias capturas
+CAPTURAS_REGISTRO = 8        # Caras válidas que se recogen
+DURACION_REGISTRO = 4.0      # Segundos máximos recogiendo caras
+INTERVALO_CAPTURA = 0.25     # Segundos mínimos entre frames enviados al hilo
+LADO_MINIMO_CARA = 80        # Píxeles del lado menor de la cara
+NITIDEZ_MINIMA = 60.0        # Varianza del laplaciano en el recorte de la cara
+INTENTOS_NOMBRE = 2          # Veces que se pide otro nombre si ya existe
+MAX_PROTOTIPOS = 3           # Codificaciones que se guardan por usuario
+DISTANCIA_ATIPICA = 0.5      # Capturas más lejos de la mediana se descartan
+DISTANCIA_PROTOTIPOS = 0.08  # Prototipos más cercanos entre sí no aportan
+
+# Índice de caras ya cargado (nombres, matriz N x 128). Lo fija usar_indice, p. ej. desde
+# estaciones.py con una matriz en memoria compartida; si es None se lee el JSON en cada consulta.
+_INDICE = None
+
+def deserializar_usuarios(data):
+    """Usuarios leídos de JSON (listas) con las codificaciones como arrays"""
+    return {
+        usuario: {
+            **datos,
+            "codificacion": np.array(datos["codificacion"]) if isinstance(datos["codificacion"], list) else datos["codificacion"],
+            **({"prototipos": np.array(datos["prototipos"])} if "prototipos" in datos else {}),
+            "nombre": datos.get("nombre", usuario)
+        } for usuario, datos in data.items()
+    }
+
 def cargar_usuarios():
     """Carga los usuarios desde el archivo JSON"""
     try:
         with open(RUTA_USUARIOS, "r") as f:
-            data = json.load(f)
-            return {
-                usuario: {
-                    **datos,
-                    "codificacion": np.array(datos["codificacion"]) if isinstance(datos["codificacion"], list) else datos["codificacion"],
-                    "nombre": datos.get("nombre", usuario)
-                } for usuario, datos in data.items()
-            }
+            return deserializar_usuarios(json.load(f))
     except (FileNotFoundError, json.JSONDecodeError, KeyError):
         return {}
 
-def guardar_usuarios(usuarios):
-    """Guarda los usuarios en el archivo JSON"""
-    data_serializable = {
+def serializar_usuarios(usuarios):
+    """Usuarios listos para JSON (arrays convertidos a listas)"""
+    return {
         usuario: {
             "nombre": usuario,
-            "codificacion": datos["codificacion"].tolist(),  #Convierte ndarray a lista para JSON
+            "codificacion": np.asarray(datos["codificacion"]).tolist(),  #Convierte ndarray a lista para JSON
             "nivel": datos.get("nivel", 1),
             "preferencias": datos.get("preferencias", {"idioma": "es", "voz": True}),
-            "progreso": datos.get("progreso", {})
+            "progreso": datos.get("progreso", {}),
+            **({"prototipos": np.asarray(datos["prototipos"]).tolist()} if "prototipos" in datos else {})
         } for usuario, datos in usuarios.items()
     }
-    
+
+def guardar_usuarios(usuarios):
+    """Guarda los usuarios en el archivo JSON"""
+    data_serializable = serializar_usuarios(usuarios)
+
     os.makedirs(RUTA_DATOS, exist_ok=True)
-    with open(RUTA_USUARIOS, "w") as f:
+    # Escritura atómica: varias estaciones pueden leer el fichero mientras tanto
+    temporal = f"{RUTA_USUARIOS}.{os.getpid()}.tmp"
+    with open(temporal, "w") as f:
         json.dump(data_serializable, f, indent=2)
+    os.replace(temporal, RUTA_USUARIOS)
+
+def codificaciones_usuario(datos):
+    """Prototipos del usuario (M x 128); los registrados con un solo frame tienen uno"""
+    if "prototipos" in datos and len(datos["prototipos"]):
+        return np.asarray(datos["prototipos"], dtype=np.float64).reshape(-1, 128)
+    return np.asarray(datos["codificacion"], dtype=np.float64).reshape(1, 128)
+
+def indice_caras(usuarios=None):
+    """
+    Retorna (nombres, matriz) con los prototipos de todos los usuarios en una matriz
+    float64 de N x 128. Cada fila lleva su nombre en la misma posición de `nombres`
+    (un usuario con varios prototipos aparece varias veces).
+    """
+    if usuarios is None:
+        usuarios = cargar_usuarios()
+    nombres, filas = [], []
+    for nombre, datos in usuarios.items():
+        prototipos = codificaciones_usuario(datos)
+        nombres += [nombre] * len(prototipos)
+        filas.append(prototipos)
+    matriz = np.vstack(filas) if filas else np.empty((0, 128), dtype=np.float64)
+    return nombres, matriz
+
+def usar_indice(nombres, matriz):
+    """Fija el índice de caras que usará identificar_usuario (None para volver a leer el JSON)"""
+    global _INDICE
+    _INDICE = None if nombres is None else (list(nombres), matriz)
 
 def extraer_codificacion(frame):
     """Extrae vector facial de un frame usando las utilidades de cuia.py"""
@@ -59,13 +117,169 @@ def extraer_codificacion(frame):
     
     return face_encodings[0] if face_encodings else None
 
+def codificacion_de_calidad(frame):
+    """
+    Codificación de la cara del frame si pasa los controles de calidad: una sola cara,
+    de tamaño suficiente y nítida. Retorna (codificación o None, motivo del descarte).
+    La detección se hace a mitad de resolución y la codificación sobre el frame completo.
+    """
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    caras = face_recognition.face_locations(cv2.resize(rgb, None, fx=0.5, fy=0.5), model=MODELO_DETECCION)
+    if len(caras) != 1:
+        return None, "sin cara" if not caras else "varias caras"
+    arriba, derecha, abajo, izquierda = (2 * v for v in caras[0])
+    if min(abajo - arriba, derecha - izquierda) < LADO_MINIMO_CARA:
+        return None, "cara pequeña"
+    recorte = cv2.cvtColor(frame[max(0, arriba):abajo, max(0, izquierda):derecha], cv2.COLOR_BGR2GRAY)
+    if recorte.size == 0 or cv2.Laplacian(recorte, cv2.CV_64F).var() < NITIDEZ_MINIMA:
+        return None, "borrosa"
+    codificaciones = face_recognition.face_encodings(rgb, known_face_locations=[(arriba, derecha, abajo, izquierda)])
+    return (codificaciones[0], "") if codificaciones else (None, "sin codificación")
 
-def registrar_usuario(frame, nombre=None):
-    """Registra un nuevo usuario integrando reconocimiento de voz"""
-    codificacion = extraer_codificacion(frame)
-    if codificacion is None:
+def elegir_prototipos(codificaciones, maximo=MAX_PROTOTIPOS):
+    """
+    Resume las capturas de un usuario: descarta las atípicas (lejos de la mediana) y elige
+    por muestreo del punto más lejano hasta `maximo` prototipos distintos entre sí.
+    Retorna (prototipos M x 128, media 128) — la media es la 'codificacion' de siempre.
+    """
+    matriz = np.asarray(codificaciones, dtype=np.float64).reshape(-1, 128)
+    distancias = np.linalg.norm(matriz - np.median(matriz, axis=0), axis=1)
+    buenas = matriz[distancias <= DISTANCIA_ATIPICA]
+    if len(buenas) == 0:
+        buenas = matriz
+    media = buenas.mean(axis=0)
+    elegidos = [int(np.argmin(np.linalg.norm(buenas - media, axis=1)))]
+    distancias = np.linalg.norm(buenas - buenas[elegidos[0]], axis=1)
+    while len(elegidos) < maximo and distancias.max() >= DISTANCIA_PROTOTIPOS:
+        siguiente = int(np.argmax(distancias))
+        elegidos.append(siguiente)
+        distancias = np.minimum(distancias, np.linalg.norm(buenas - buenas[siguiente], axis=1))
+    return buenas[elegidos], media
+
+def nombre_libre(nombre, usuarios):
+    """`nombre` si no está registrado; si no, el primero libre de "nombre 2", "nombre 3"..."""
+    if nombre not in usuarios:
+        return nombre
+    n = 2
+    while f"{nombre} {n}" in usuarios:
+        n += 1
+    return f"{nombre} {n}"
+
+def nuevo_usuario(nombre, prototipos, codificacion, nivel=1):
+    """Datos de un usuario recién registrado"""
+    return {
+        "nombre": nombre,
+        "codificacion": codificacion,
+        "prototipos": prototipos,
+        "nivel": nivel,
+        "preferencias": {"idioma": "es", "voz": True},
+        "progreso": {}
+    }
+
+class RegistroCara:
+    """
+    Registro en segundo plano mientras la vista previa sigue en marcha: el bucle de la
+    interfaz entrega frames con ofrecer() (como mucho uno cada INTERVALO_CAPTURA, sin esperar)
+    y un hilo los pasa por codificacion_de_calidad hasta reunir CAPTURAS_REGISTRO caras o
+    agotar DURACION_REGISTRO. A la vez, otro hilo escucha el nombre por voz.
+    """
+    def __init__(self, pedir_nombre=True):
+        self.codificaciones = []
+        self.motivo = ""
+        self.nombre = None
+        self._frames = queue.Queue(maxsize=1)
+        self._inicio = None
+        self._ultimo = 0.0
+        self._parar = threading.Event()
+        self.aviso = ""
+        self._hilo_caras = threading.Thread(target=self._bucle_caras, name="registro-caras", daemon=True)
+        self._hilo_nombre = threading.Thread(target=self._escuchar_nombre, name="registro-nombre", daemon=True) if pedir_nombre else None
+
+    def iniciar(self):
+        self._inicio = time.monotonic()
+        self._hilo_caras.start()
+        if self._hilo_nombre is not None:
+            print("Por favor, mira a la cámara y di tu nombre para registrarte...")
+            self._hilo_nombre.start()
+
+    def _caras_completas(self):
+        return (self._parar.is_set() or len(self.codificaciones) >= CAPTURAS_REGISTRO
+                or time.monotonic() - self._inicio >= DURACION_REGISTRO)
+
+    def ofrecer(self, frame):
+        """Entrega un frame al hilo si toca y está libre; nunca bloquea"""
+        ahora = time.monotonic()
+        if self._caras_completas() or ahora - self._ultimo < INTERVALO_CAPTURA:
+            return
+        try:
+            self._frames.put_nowait(frame.copy())
+            self._ultimo = ahora
+        except queue.Full:
+            pass
+
+    def _bucle_caras(self):
+        while not self._caras_completas():
+            try:
+                frame = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            codificacion, self.motivo = codificacion_de_calidad(frame)
+            if codificacion is not None:
+                self.codificaciones.append(codificacion)
+
+    def _escuchar_nombre(self):
+        # Si el nombre ya está registrado se pide otro aquí, en el hilo, mientras la vista
+        # previa sigue; tras INTENTOS_NOMBRE registrar_usuario le añade un número
+        usuarios = cargar_usuarios()
+        for _ in range(INTENTOS_NOMBRE):
+            resultado_voz = reconocedor_voz.procesar_respuesta({"opciones": [], "respuesta_correcta": ""},
+                                                               cancelar=self._parar)
+            if self._parar.is_set() or not (resultado_voz and resultado_voz.texto):
+                return
+            self.nombre = resultado_voz.texto.strip()
+            if self.nombre not in usuarios:
+                self.aviso = ""
+                return
+            self.aviso = f"'{self.nombre}' ya existe, di otro nombre"
+            print(f"El nombre '{self.nombre}' ya existe. Por favor, di otro nombre...")
+
+    def cancelar(self):
+        """
+        Para los dos hilos y espera a que terminen: así el micrófono queda libre y lo
+        que se diga después no se toma como el nombre de este registro.
+        """
+        self._parar.set()
+        for hilo in (self._hilo_caras, self._hilo_nombre):
+            if hilo is not None and hilo.is_alive():
+                hilo.join()
+
+    def terminado(self):
+        hilos = [h for h in (self._hilo_caras, self._hilo_nombre) if h is not None]
+        return not any(h.is_alive() for h in hilos)
+
+    def dibujar(self, frame):
+        """Progreso del registro sobre la vista previa"""
+        escribir(frame, f"Registrando cara: {len(self.codificaciones)}/{CAPTURAS_REGISTRO}", (30, 50), 0.8, (0, 255, 255), 2)
+        if self.motivo and not self._caras_completas():
+            escribir(frame, f"({self.motivo})", (30, 85), 0.6, (0, 165, 255), 1)
+        if self._hilo_nombre is not None and self._hilo_nombre.is_alive():
+            escribir(frame, "Di tu nombre...", (30, 120), 0.8, (255, 255, 255), 2)
+            if self.aviso:
+                escribir(frame, self.aviso, (30, 155), 0.6, (0, 165, 255), 1)
+
+def registrar_usuario(frame, nombre=None, codificaciones=None):
+    """
+    Registra un nuevo usuario integrando reconocimiento de voz.
+    Con `codificaciones` (p. ej. de RegistroCara) se guardan sus prototipos;
+    si no, se usa solo la cara del frame.
+    """
+    if not codificaciones:
+        codificacion = extraer_codificacion(frame)
+        codificaciones = [codificacion] if codificacion is not None else []
+    if not codificaciones:
         print("No se detectó ninguna cara en el frame.")
         return None
+    prototipos, codificacion = elegir_prototipos(codificaciones)
 
     usuarios = cargar_usuarios()
     
@@ -77,32 +291,27 @@ def registrar_usuario(frame, nombre=None):
             "respuesta_correcta": ""
         }
         resultado_voz = reconocedor_voz.procesar_respuesta(pregunta)
-        print("DEBUG resultado_voz:", resultado_voz, type(resultado_voz))
-        nombre = resultado_voz.texto.strip() if resultado_voz and resultado_voz.texto else f"Jugador{len(usuarios) + 1}"
-        print(f"Nombre registrado: {nombre}")
+        nombre = resultado_voz.texto.strip() if resultado_voz and resultado_voz.texto else None
+    if not nombre:
+        nombre = f"Jugador{len(usuarios) + 1}"
+    print(f"Nombre registrado: {nombre}")
 
 
-    # Verificar nombre único
-    while nombre in usuarios:
-        print(f"El nombre '{nombre}' ya existe. Por favor, di otro nombre...")
-        resultado_voz = reconocedor_voz.procesar_respuesta("¿Cómo te llamas?")
-        nombre = resultado_voz.texto.strip() if resultado_voz and resultado_voz.texto else f"Jugador{len(usuarios) + 1}"
-        print(f"Nuevo nombre registrado: {nombre}")
+    # Verificar nombre único sin volver a escuchar: "Lucía" ya existe -> "Lucía 2"
+    if nombre in usuarios:
+        nombre = nombre_libre(nombre, usuarios)
+        print(f"El nombre ya existía; se registra como {nombre}")
 
     # Registrar usuario
-    usuarios[nombre] = {
-        "nombre": nombre,
-        "codificacion": codificacion,
-        "nivel": 1,
-        "preferencias": {"idioma": "es", "voz": True},
-        "progreso": {}
-    }
+    usuarios[nombre] = nuevo_usuario(nombre, prototipos, codificacion)
     
     guardar_usuarios(usuarios)
-    print(f"Usuario {nombre} registrado con éxito")
-    
-    # Mostrar imagen registrada
-    popup(f"Usuario {nombre} registrado", frame)
+    print(f"Usuario {nombre} registrado con éxito ({len(codificaciones)} capturas, {len(prototipos)} prototipos)")
+
+    # Un índice fijado (compartido) no se modifica: el nuevo usuario se añade a una copia local
+    if _INDICE is not None:
+        nombres, matriz = _INDICE
+        usar_indice(nombres + [nombre] * len(prototipos), np.vstack([matriz, prototipos]))
     
     return nombre
 
@@ -112,21 +321,18 @@ def identificar_usuario(frame):
     if codificacion is None:
         return None
 
-    usuarios = cargar_usuarios()
-    codificaciones_conocidas = [datos["codificacion"] for datos in usuarios.values()]
-    nombres_conocidos = list(usuarios.keys())
-
-    # Comparación eficiente con compare_faces
-    matches = face_recognition.compare_faces(
-        codificaciones_conocidas,
-        codificacion,
-        tolerance=UMBRAL_SIMILITUD
-    )
-
-    # Devolver el primer match encontrado
-    for nombre, match in zip(nombres_conocidos, matches):
-        if match:
-            return nombre
+    if _INDICE is not None:
+        nombres_conocidos, codificaciones_conocidas = _INDICE
+    else:
+        nombres_conocidos, codificaciones_conocidas = indice_caras()
+    if len(nombres_conocidos) == 0:
+        return None
+
+    # Distancia a todos los prototipos de una vez; gana el más cercano dentro del umbral
+    distancias = face_recognition.face_distance(codificaciones_conocidas, codificacion)
+    mejor = int(np.argmin(distancias))
+    if distancias[mejor] <= UMBRAL_SIMILITUD:
+        return nombres_conocidos[mejor]
 
     return None
 
@@ -1,8 +1,14 @@
+import os
 import speech_recognition as sr
+from reconocedores import microfono
+
+CONFIANZA_MINIMA = 0.5  # Por debajo, una opción reconocida sin red se da por no entendida
+
 class Respuesta:
-    def __init__(self, texto, es_correcta):  
+    def __init__(self, texto, es_correcta, confianza=None):  
         self.texto = texto
         self.es_correcta = es_correcta
+        self.confianza = confianza
 
 def normalizar_comparacion(texto):
     """Normaliza texto para comparación ignorando tildes y mayúsculas"""
@@ -15,41 +21,157 @@ def normalizar_comparacion(texto):
         texto = texto.replace(a, b)
     return texto
 
-def procesar_respuesta(pregunta):   
+# Sinónimos y variantes con tilde de las opciones habituales (clave normalizada)
+SINONIMOS = {
+    "triangulo": ["triángulo"],
+    "cuadrado": [],
+    "circulo": ["círculo", "circunferencia", "redondo"],
+    "rectangulo": ["rectángulo"],
+    "pentagono": ["pentágono"],
+    "hexagono": ["hexágono"],
+    "piramide": ["pirámide"],
+    "hectaedro": ["hexaedro"],
+    "dodecaedro": [],
+    "rombo": [],
+    "trapecio": [],
+    "cubo": [],
+}
 
-    r = sr.Recognizer()
-    r.energy_threshold = 4000  # Ajuste del umbral de energía para filtrar ruido ambiental
+_UNIDADES = ["cero", "uno", "dos", "tres", "cuatro", "cinco", "seis", "siete", "ocho", "nueve",
+             "diez", "once", "doce", "trece", "catorce", "quince", "dieciséis", "diecisiete",
+             "dieciocho", "diecinueve", "veinte", "veintiuno", "veintidós", "veintitrés",
+             "veinticuatro", "veinticinco", "veintiséis", "veintisiete", "veintiocho", "veintinueve"]
+_DECENAS = {30: "treinta", 40: "cuarenta", 50: "cincuenta", 60: "sesenta",
+            70: "setenta", 80: "ochenta", 90: "noventa"}
+_CENTENAS = {100: "ciento", 200: "doscientos", 300: "trescientos", 400: "cuatrocientos",
+             500: "quinientos", 600: "seiscientos", 700: "setecientos", 800: "ochocientos",
+             900: "novecientos"}
 
-    with sr.Microphone() as source:
-        print("\nDi tu respuesta...")
-        try:
-            r.adjust_for_ambient_noise(source, duration=0.5) # Ajuste para ruido de fondo
-            audio = r.listen(source, timeout=5, phrase_time_limit=3) # Escuchar la respuesta
-             # Reconocimiento usando Google Speech Recognition en español 
-            texto_reconocido = r.recognize_google(audio, language='es-ES')
-            print(f"Has dicho: {texto_reconocido}")
 
-            # Normalizamos para comparación 
-            texto_comparar = normalizar_comparacion(texto_reconocido)
+def numero_en_palabras(n):
+    """Número entero de 0 a 999 en palabras (castellano)"""
+    if not 0 <= n <= 999:
+        raise ValueError(f"Número fuera de rango: {n}")
+    if n < 30:
+        return _UNIDADES[n]
+    if n < 100:
+        decena, unidad = n - n % 10, n % 10
+        return _DECENAS[decena] + (f" y {_UNIDADES[unidad]}" if unidad else "")
+    if n == 100:
+        return "cien"
+    centena, resto = n - n % 100, n % 100
+    return _CENTENAS[centena] + (f" {numero_en_palabras(resto)}" if resto else "")
 
-            # Comparamos la respuesta reconocida con las opciones proporcionadas
-            for opcion in pregunta['opciones']:
-                opcion_comparar = normalizar_comparacion(opcion)
-                respuesta_correcta = normalizar_comparacion(pregunta['respuesta_correcta'])
 
-                # Si coincide con alguna opción, devolvemos si es correcta o no
-                if opcion_comparar == texto_comparar:
-                    return Respuesta(opcion, opcion_comparar == respuesta_correcta)
-            
-            # Si no coincide con ninguna opción, devolvemos como incorrecta
-            return Respuesta(texto_reconocido, False)
+def frases_opcion(opcion, sinonimos_pregunta=None):
+    """Formas habladas que se aceptan para una opción"""
+    frases = [opcion.lower()]
+    clave = normalizar_comparacion(opcion)
+    if clave.isdigit() and int(clave) <= 999:
+        frases.append(numero_en_palabras(int(clave)))
+    frases += SINONIMOS.get(clave, [])
+    if sinonimos_pregunta:
+        frases += [s.lower() for s in sinonimos_pregunta.get(opcion, [])]
+    return list(dict.fromkeys(frases))
 
-        except sr.WaitTimeoutError:
-            print("Tiempo de espera agotado") # No se detectó respuesta a tiempo
+
+def gramatica(pregunta):
+    """
+    Retorna (frases, mapa): la lista de frases de la gramática y el mapa de cada frase
+    normalizada a su opción. Las preguntas pueden añadir un campo "sinonimos"
+    {opción: [frases]} en preguntas.json.
+    """
+    sinonimos = pregunta.get("sinonimos")
+    frases, mapa = [], {}
+    for opcion in pregunta.get("opciones", []):
+        for frase in frases_opcion(opcion, sinonimos):
+            frases.append(frase)
+            mapa[normalizar_comparacion(frase)] = opcion
+    return frases, mapa
+
+def evaluar_respuesta(texto_reconocido, pregunta):
+    """Compara un texto reconocido con las opciones de la pregunta y dice si es la correcta"""
+    # Normalizamos para comparación 
+    texto_comparar = normalizar_comparacion(texto_reconocido)
+    respuesta_correcta = normalizar_comparacion(pregunta['respuesta_correcta'])
+
+    # Comparamos la respuesta reconocida con las opciones, sus números en palabras y sinónimos
+    _, mapa = gramatica(pregunta)
+    opcion = mapa.get(texto_comparar)
+
+    # Si coincide con alguna opción, devolvemos si es correcta o no
+    if opcion is not None:
+        return Respuesta(opcion, normalizar_comparacion(opcion) == respuesta_correcta)
+
+    # Si no coincide con ninguna opción, devolvemos como incorrecta
+    return Respuesta(texto_reconocido, False)
+
+_AVISO_LOCAL = False  # Ya se avisó de que GEOKIDS_VOZ=local no está disponible
+
+def backend_voz():
+    """
+    'local' (Vosk, sin red, ver reconocedor_voz_local) si está instalado y hay modelo;
+    si no, 'google'. GEOKIDS_VOZ=local|google lo fuerza; 'local' sin Vosk o sin modelo
+    avisa una vez y usa 'google'.
+    """
+    global _AVISO_LOCAL
+    from reconocedores import reconocedor_voz_local
+    backend = os.environ.get("GEOKIDS_VOZ")
+    if backend == "google":
+        return backend
+    if reconocedor_voz_local.disponible():
+        return "local"
+    if backend == "local" and not _AVISO_LOCAL:
+        print("GEOKIDS_VOZ=local, pero Vosk o su modelo no están disponibles; se usa Google")
+        _AVISO_LOCAL = True
+    return "google"
+
+def reconocer_local(audio, pregunta):
+    """Decodifica sin red contra las opciones de la pregunta (o texto libre si no tiene)"""
+    from reconocedores import reconocedor_voz_local
+    datos = audio.get_raw_data(convert_rate=reconocedor_voz_local.FRECUENCIA, convert_width=2)
+    texto, opcion, confianza = reconocedor_voz_local.reconocedor().reconocer(datos, pregunta)
+    print(f"Has dicho: {texto} (confianza {confianza:.2f})")
+    if not isinstance(pregunta, dict) or not pregunta.get("opciones"):
+        return Respuesta(texto, False, confianza)
+    if opcion is None or confianza < CONFIANZA_MINIMA:
+        print("No se reconoció ninguna opción con seguridad")
+        return Respuesta(texto, False, confianza)
+    correcta = normalizar_comparacion(opcion) == normalizar_comparacion(pregunta["respuesta_correcta"])
+    return Respuesta(opcion, correcta, confianza)
+
+def procesar_respuesta(pregunta, cancelar=None):
+    """`cancelar` (threading.Event) deja de escuchar y no se reconoce nada"""
+    backend = backend_voz()
+    print("\nDi tu respuesta...")
+    try:
+        # Stream siempre abierto con ruido de fondo continuo: la frase puede haber empezado ya
+        audio = microfono.microfono().escuchar(espera=5, duracion_maxima=3, cancelar=cancelar) # Escuchar la respuesta
+        if cancelar is not None and cancelar.is_set():
             return Respuesta("", False)
-        except sr.UnknownValueError:
-            print("No se pudo entender el audio") 
+        if audio is None:
+            print("Tiempo de espera agotado") # No se detectó respuesta a tiempo
             return Respuesta("", False)
-        except Exception as e:
-            print(f"Error inesperado: {str(e)}") # Captura cualquier otro error inesperado
-            return Respuesta("", False)
\ No newline at end of file
+        if backend == "local":
+            return reconocer_local(audio, pregunta)
+         # Reconocimiento usando Google Speech Recognition en español 
+        texto_reconocido = sr.Recognizer().recognize_google(audio, language='es-ES')
+        print(f"Has dicho: {texto_reconocido}")
+        return evaluar_respuesta(texto_reconocido, pregunta)
+
+    except sr.UnknownValueError:
+        print("No se pudo entender el audio") 
+        return Respuesta("", False)
+    except Exception as e:
+        print(f"Error inesperado: {str(e)}") # Captura cualquier otro error inesperado
+        return Respuesta("", False)
+
+def iniciar_microfono():
+    """Abre el micrófono al empezar para que la primera respuesta no espere al dispositivo"""
+    try:
+        microfono.microfono()
+    except Exception as e:
+        print(f"No se pudo abrir el micrófono: {str(e)}")
+
+def detener_microfono():
+    microfono.detener()
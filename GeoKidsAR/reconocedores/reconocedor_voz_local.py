@@ -0,0 +1,80 @@
+"""
+Reconocimiento de voz sin red con Vosk (Kaldi). Para una pregunta se decodifica contra una
+gramática cerrada: las opciones, sus números en palabras y sus sinónimos. Así "seis" es la
+opción "6" y el resultado trae una confianza. Sin opciones (p. ej. el nombre al registrarse)
+se reconoce texto libre con el vocabulario completo del modelo.
+
+El modelo se descarga aparte (p. ej. vosk-model-small-es-0.42) y se busca en RUTA_MODELO
+o en GEOKIDS_VOSK_MODELO. Si vosk no está instalado o no hay modelo, disponible() es False.
+"""
+import json
+import os
+from reconocedores.reconocedor_voz import gramatica, normalizar_comparacion
+
+try:
+    import vosk
+except ImportError:
+    vosk = None
+
+RUTA_MODELO = os.path.join("datos", "modelos", "vosk-model-small-es-0.42")
+FRECUENCIA = 16000
+MAX_RECONOCEDORES = 8   # Gramáticas compiladas que se conservan (una por pregunta reciente)
+
+
+class ReconocedorLocal:
+    """Modelo Vosk cargado una vez y reconocedores compilados por gramática"""
+    def __init__(self, ruta_modelo):
+        vosk.SetLogLevel(-1)
+        self.modelo = vosk.Model(ruta_modelo)
+        self._reconocedores = {}
+
+    def _reconocedor(self, frases):
+        clave = tuple(frases)
+        reconocedor = self._reconocedores.pop(clave, None)
+        if reconocedor is None:
+            if frases:
+                # "[unk]" recoge lo que no es ninguna opción en lugar de forzar la más parecida
+                reconocedor = vosk.KaldiRecognizer(self.modelo, FRECUENCIA,
+                                                   json.dumps(frases + ["[unk]"], ensure_ascii=False))
+            else:
+                reconocedor = vosk.KaldiRecognizer(self.modelo, FRECUENCIA)
+            reconocedor.SetWords(True)
+        else:
+            reconocedor.Reset()
+        self._reconocedores[clave] = reconocedor
+        if len(self._reconocedores) > MAX_RECONOCEDORES:
+            del self._reconocedores[next(iter(self._reconocedores))]
+        return reconocedor
+
+    def reconocer(self, audio, pregunta=None):
+        """
+        Decodifica audio PCM de 16 bits mono a FRECUENCIA Hz.
+        Retorna (texto, opción o None, confianza 0-1). Sin opciones, el texto libre.
+        """
+        frases, mapa = gramatica(pregunta) if isinstance(pregunta, dict) else ([], {})
+        reconocedor = self._reconocedor(frases)
+        reconocedor.AcceptWaveform(audio)
+        resultado = json.loads(reconocedor.FinalResult())
+        texto = resultado.get("text", "").replace("[unk]", "").strip()
+        palabras = [p for p in resultado.get("result", []) if p.get("word") != "[unk]"]
+        confianza = sum(p.get("conf", 0.0) for p in palabras) / len(palabras) if palabras else 0.0
+        return texto, mapa.get(normalizar_comparacion(texto)), confianza
+
+
+_RECONOCEDOR = None
+
+
+def ruta_modelo():
+    return os.environ.get("GEOKIDS_VOSK_MODELO", RUTA_MODELO)
+
+
+def disponible():
+    return vosk is not None and os.path.isdir(ruta_modelo())
+
+
+def reconocedor():
+    """ReconocedorLocal compartido; el modelo se carga la primera vez que se usa"""
+    global _RECONOCEDOR
+    if _RECONOCEDOR is None:
+        _RECONOCEDOR = ReconocedorLocal(ruta_modelo())
+    return _RECONOCEDOR
@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+import hashlib
+import os
+
+# Carpeta donde se guardan los mapas de rectificado ya calculados
+RUTA_CACHE = os.path.join("datos", "cache", "rectificacion")
+
+# Coeficientes de distorsión nulos para trabajar sobre frames ya rectificados
+SIN_DISTORSION = np.zeros((5, 1))
+
+
+class Rectificador:
+    """
+    Elimina la distorsión de la lente remapeando cada frame con mapas precalculados.
+    Sobre el frame rectificado, detección, pose y proyección usan distorsión nula,
+    así que OpenCV no evalúa el modelo racional/inclinado de 14 coeficientes en cada llamada.
+    Los mapas se calculan una vez por resolución y se guardan en disco.
+    """
+    def __init__(self, matriz_camara=None, coef_distorsion=None, ruta_cache=RUTA_CACHE, alpha=0.0,
+                 al_cambiar=None, modelo=None):
+        if modelo is None and matriz_camara is None:
+            raise ValueError("Hay que indicar la matriz de cámara o un ModeloCamara.")
+        self.modelo = modelo            # ModeloCamara opcional: intrínsecos adaptados a cada resolución
+        self.matriz_original = None if matriz_camara is None else np.asarray(matriz_camara, dtype=np.float64)
+        self.coef_original = None if coef_distorsion is None else np.asarray(coef_distorsion, dtype=np.float64)
+        self.ruta_cache = ruta_cache
+        self.alpha = alpha              # 0: solo píxeles válidos, 1: conservar toda la imagen
+        self.al_cambiar = al_cambiar    # Función opcional (matriz, coef) llamada al cambiar de resolución
+        self._mapas = {}                # (ancho, alto) -> (mapa1, mapa2, nueva_matriz)
+        self._tamano_actual = None
+
+    def _intrinsecos(self, tamano):
+        """Intrínsecos con distorsión para frames de este tamaño"""
+        if self.modelo is not None:
+            return self.modelo.intrinsecos(tamano)
+        return self.matriz_original, self.coef_original
+
+    def _ruta(self, tamano):
+        """Nombre de fichero único para estos parámetros de cámara y esta resolución"""
+        matriz, coef = self._intrinsecos(tamano)
+        h = hashlib.sha1()
+        h.update(np.ascontiguousarray(matriz, dtype=np.float64).tobytes())
+        h.update(np.ascontiguousarray(coef, dtype=np.float64).tobytes())
+        h.update(np.float64(self.alpha).tobytes())
+        return os.path.join(self.ruta_cache, f"mapas_{tamano[0]}x{tamano[1]}_{h.hexdigest()[:12]}.npz")
+
+    def _calcular(self, tamano):
+        matriz, coef = self._intrinsecos(tamano)
+        nueva_matriz, _ = cv2.getOptimalNewCameraMatrix(matriz, coef, tamano, self.alpha, tamano)
+        # CV_16SC2: mapas en punto fijo, más rápidos en cv2.remap que los de coma flotante
+        mapa1, mapa2 = cv2.initUndistortRectifyMap(matriz, coef, None, nueva_matriz, tamano, cv2.CV_16SC2)
+        return mapa1, mapa2, nueva_matriz
+
+    def _cargar_o_calcular(self, tamano):
+        ruta = self._ruta(tamano)
+        if os.path.exists(ruta):
+            try:
+                with np.load(ruta) as datos:
+                    return datos["mapa1"], datos["mapa2"], datos["matriz"]
+            except (OSError, KeyError, ValueError):
+                print(f"Cache de rectificado dañada, se recalcula: {ruta}")
+
+        mapa1, mapa2, nueva_matriz = self._calcular(tamano)
+        try:
+            os.makedirs(self.ruta_cache, exist_ok=True)
+            temporal = ruta + ".tmp"
+            with open(temporal, "wb") as f:
+                np.savez(f, mapa1=mapa1, mapa2=mapa2, matriz=nueva_matriz)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            print(f"No se pudo guardar la cache de rectificado: {e}")
+        return mapa1, mapa2, nueva_matriz
+
+    def preparar(self, tamano):
+        """
+        Carga (o calcula) los mapas para una resolución (ancho, alto).
+        Retorna: matriz de cámara y coeficientes de distorsión válidos para el frame rectificado.
+        """
+        tamano = (int(tamano[0]), int(tamano[1]))
+        if tamano not in self._mapas:
+            self._mapas[tamano] = self._cargar_o_calcular(tamano)
+        if tamano != self._tamano_actual:
+            self._tamano_actual = tamano
+            if self.al_cambiar is not None:
+                self.al_cambiar(self._mapas[tamano][2], SIN_DISTORSION)
+        return self._mapas[tamano][2], SIN_DISTORSION
+
+    def matriz_camara(self, tamano):
+        return self.preparar(tamano)[0]
+
+    def rectificar(self, frame, salida=None):
+        """Devuelve el frame sin distorsión. Si se pasa 'salida' se reutiliza ese buffer."""
+        tamano = (frame.shape[1], frame.shape[0])
+        if tamano != self._tamano_actual:
+            self.preparar(tamano)
+        mapa1, mapa2, _ = self._mapas[tamano]
+        return cv2.remap(frame, mapa1, mapa2, cv2.INTER_LINEAR, dst=salida)
@@ -0,0 +1,206 @@
+"""
+Modo de repetición: ejecuta el bucle completo del juego sin ventana sobre un video grabado,
+con las teclas y respuestas de voz tomadas de un guion con marcas de tiempo.
+Los frames se leen tan rápido como se procesan, así que una sesión entera se repite
+en lo que tarde el procesado, y el resultado es reproducible.
+
+Uso:
+    python repeticion.py sesion.mp4 guion.json [--salida carpeta] [--esperado estado.json]
+
+Formato del guion (t en segundos de video):
+    {
+      "usuario": "Alejandro",
+      "nivel": 1,
+      "eventos": [
+        {"t": 0.5, "tecla": "1"},
+        {"t": 4.0, "tecla": "2"},
+        {"t": 7.5, "tecla": "v", "voz": "seis"},
+        {"t": 20.0, "tecla": "ESC"}
+      ]
+    }
+
+Se escriben en la carpeta de salida:
+    tiempos.jsonl       ms de cada etapa en cada frame
+    estado_final.json   estado de la partida al terminar
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+import cv2
+
+from cuia import myVideo
+from instrumentacion import INSTRUMENTACION
+from reconocedores import reconocedor_voz
+import main as juego
+
+TECLAS_ESPECIALES = {"ESC": 27, "ENTER": 13, "ESPACIO": 32}
+SIN_TECLA = 255  # Lo mismo que cv2.waitKey(...) & 0xFF sin pulsación
+
+
+def codigo_tecla(tecla):
+    if isinstance(tecla, int):
+        return tecla
+    if tecla.upper() in TECLAS_ESPECIALES:
+        return TECLAS_ESPECIALES[tecla.upper()]
+    if len(tecla) != 1:
+        raise ValueError(f"Tecla no reconocida en el guion: {tecla!r}")
+    return ord(tecla)
+
+
+def cargar_guion(ruta):
+    with open(ruta, "r", encoding="utf-8") as f:
+        guion = json.load(f)
+    eventos = []
+    for evento in guion.get("eventos", []):
+        eventos.append({
+            "t": float(evento.get("t", 0.0)),
+            "tecla": codigo_tecla(evento["tecla"]),
+            "voz": evento.get("voz"),
+        })
+    # Orden estable: dos eventos con el mismo t se respetan en el orden del fichero
+    eventos.sort(key=lambda e: e["t"])
+    guion["eventos"] = eventos
+    return guion
+
+
+class EntornoRepeticion:
+    """
+    Misma interfaz que main.EntornoCamara, pero sin ventana ni dispositivos.
+    El reloj es el tiempo del video (frame / fps); las esperas de las pantallas
+    estáticas lo adelantan para que los eventos siguientes lleguen igualmente.
+    """
+    persistir = False  # Una repetición nunca modifica los datos de los usuarios
+
+    def __init__(self, ruta_video, guion, carpeta_salida):
+        self.video = myVideo(ruta_video, ritmo=False)
+        if not self.video.isOpened():
+            raise ValueError(f"No se pudo abrir el video {ruta_video}")
+        self.fps = self.video.get(cv2.CAP_PROP_FPS) or 30.0
+        self.usuario = guion.get("usuario")
+        self.nivel_inicial = guion.get("nivel")
+        self.carpeta_salida = carpeta_salida
+        self._eventos = deque(guion["eventos"])
+        self._reloj = 0.0
+        self._frames = 0
+        self._esperas_sin_frame = 0
+        self._voz = None
+        self._fichero_tiempos = None
+        self._inicio = None
+
+    def leer(self):
+        ret, frame = self.video.read()
+        if ret:
+            self._reloj = max(self._reloj, self._frames / self.fps)
+            self._frames += 1
+            self._esperas_sin_frame = 0
+        return ret, frame
+
+    def tamano(self):
+        return (int(self.video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.video.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def abrir(self):
+        os.makedirs(self.carpeta_salida, exist_ok=True)
+        self._fichero_tiempos = open(os.path.join(self.carpeta_salida, "tiempos.jsonl"), "w", encoding="utf-8")
+        self._inicio = time.perf_counter()
+
+    def mostrar(self, frame):
+        pass
+
+    def tecla(self, espera=1):
+        if self._eventos and self._eventos[0]["t"] <= self._reloj:
+            evento = self._eventos.popleft()
+            self._voz = evento["voz"]
+            return evento["tecla"]
+
+        self._esperas_sin_frame += 1
+        if not self._eventos and self._esperas_sin_frame > 1:
+            # Pantalla estática esperando una tecla que el guion ya no va a dar
+            return TECLAS_ESPECIALES["ESC"]
+        self._reloj += max(espera, 1) / 1000.0
+        return SIN_TECLA
+
+    def reloj(self):
+        return self._reloj
+
+    def descartar_frame(self):
+        pass
+
+    def respuesta_voz(self, pregunta):
+        texto, self._voz = self._voz or "", None
+        if not texto:
+            return reconocedor_voz.Respuesta("", False)
+        return reconocedor_voz.evaluar_respuesta(texto, pregunta)
+
+    def identificar_usuario(self, frame):
+        return self.usuario
+
+    def registrar_usuario(self, frame):
+        return self.usuario
+
+    def marcador_detectado(self, marcador):
+        pass
+
+    def ajustar_exposicion(self, pasos):
+        pass
+
+    def fin_frame(self, tiempos):
+        linea = {"frame": self._frames - 1, "t": round(self._reloj, 4), "etapas": tiempos or {}}
+        self._fichero_tiempos.write(json.dumps(linea) + "\n")
+
+    def cerrar(self, resumen):
+        duracion = time.perf_counter() - self._inicio if self._inicio is not None else 0.0
+        resumen = dict(resumen)
+        resumen["frames"] = self._frames
+        resumen["duracion_s"] = round(duracion, 3)
+        resumen["fps_medio"] = round(self._frames / duracion, 2) if duracion > 0 else 0.0
+        resumen["eventos_sin_usar"] = len(self._eventos)
+        self.resumen = resumen
+
+        if self._fichero_tiempos is not None:
+            self._fichero_tiempos.close()
+        with open(os.path.join(self.carpeta_salida, "estado_final.json"), "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
+        self.video.release()
+
+
+# Campos del estado final que dependen solo del juego (no de la velocidad de la máquina)
+CAMPOS_DETERMINISTAS = ("usuario", "nivel", "pregunta", "total_preguntas",
+                        "respuestas_correctas", "niveles_jugados", "frames")
+
+
+def repetir(ruta_video, ruta_guion, carpeta_salida):
+    """Repite una sesión completa y retorna el resumen del estado final"""
+    INSTRUMENTACION.activa = True
+    entorno = EntornoRepeticion(ruta_video, cargar_guion(ruta_guion), carpeta_salida)
+    juego.main(entorno)
+    return entorno.resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video")
+    parser.add_argument("guion")
+    parser.add_argument("--salida", default=os.path.join("datos", "repeticiones", "ultima"))
+    parser.add_argument("--esperado", help="Estado final esperado; si no coincide se sale con código 1")
+    args = parser.parse_args()
+
+    resumen = repetir(args.video, args.guion, args.salida)
+    print(f"\nRepetición terminada: {resumen['frames']} frames en {resumen['duracion_s']} s "
+          f"({resumen['fps_medio']} FPS)")
+
+    if args.esperado:
+        with open(args.esperado, "r", encoding="utf-8") as f:
+            esperado = json.load(f)
+        diferencias = [c for c in CAMPOS_DETERMINISTAS if c in esperado and esperado[c] != resumen.get(c)]
+        for campo in diferencias:
+            print(f"Diferencia en '{campo}': esperado {esperado[campo]!r}, obtenido {resumen.get(campo)!r}")
+        if diferencias:
+            sys.exit(1)
+        print("El estado final coincide con el esperado")
+
+
+if __name__ == "__main__":
+    main()
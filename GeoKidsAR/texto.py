@@ -0,0 +1,212 @@
+import cv2
+import numpy as np
+import os
+import unicodedata
+from collections import OrderedDict
+
+# Fuentes TrueType que se buscan si no se indica GEOKIDS_FUENTE
+FUENTES_SISTEMA = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+    "/Library/Fonts/Arial.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+]
+ANCHO_ATLAS = 1024
+MAX_CACHE_TEXTOS = 256
+
+# Sin TrueType, lo que Hershey no puede dibujar se sustituye
+SUSTITUCIONES_HERSHEY = {"¿": "", "¡": "", "≥": ">=", "≤": "<=", "ñ": "n", "Ñ": "N", "º": "o", "ª": "a"}
+
+
+def buscar_fuente():
+    ruta = os.environ.get("GEOKIDS_FUENTE")
+    if ruta and os.path.exists(ruta):
+        return ruta
+    return next((f for f in FUENTES_SISTEMA if os.path.exists(f)), None)
+
+
+def _a_hershey(texto):
+    texto = "".join(SUSTITUCIONES_HERSHEY.get(c, c) for c in texto)
+    texto = unicodedata.normalize("NFD", texto)
+    return "".join(c for c in texto if unicodedata.category(c) != "Mn" and ord(c) < 128)
+
+
+class AtlasGlifos:
+    """
+    Glifos de una fuente a una altura en píxeles, rasterizados con antialiasing una sola vez
+    en una imagen de alfa (el atlas), empaquetados por filas.
+    Con cv2.freetype y una fuente TrueType se dibuja cualquier carácter UTF-8;
+    si no, se usa Hershey con los caracteres no ASCII sustituidos.
+    """
+    def __init__(self, altura, ruta_fuente=None):
+        self.altura = altura
+        self._ft = None
+        if ruta_fuente and hasattr(cv2, "freetype"):
+            try:
+                self._ft = cv2.freetype.createFreeType2()
+                self._ft.loadFontData(ruta_fuente, 0)
+            except cv2.error as e:
+                print(f"No se pudo cargar la fuente {ruta_fuente}: {e}")
+                self._ft = None
+        self.truetype = self._ft is not None
+        self._escala_hershey = altura / 30.0
+        self._grosor_hershey = max(1, round(altura / 15))
+        self._atlas = np.zeros((altura * 2, ANCHO_ATLAS), dtype=np.uint8)
+        self._x = self._y = self._alto_fila = 0
+        self._glifos = {}  # caracter -> (x, y, ancho, alto, dx, dy, avance)
+        # Ascendente y descendente de la línea, para el tamaño de los textos
+        self.ascendente = int(altura * 0.8) + 2
+        self.descendente = int(altura * 0.3) + 2
+
+    def _rasterizar(self, caracter):
+        """Dibuja un carácter en un lienzo y retorna (máscara recortada, dx, dy, avance)"""
+        lado = self.altura * 3
+        lienzo = np.zeros((lado, lado), dtype=np.uint8)
+        origen = (self.altura, self.altura * 2)  # Línea base
+        if self._ft is not None:
+            (avance, _), _ = self._ft.getTextSize(caracter, self.altura, -1)
+            self._ft.putText(lienzo, caracter, origen, self.altura, 255, -1, cv2.LINE_AA, True)
+        else:
+            (avance, _), _ = cv2.getTextSize(caracter, cv2.FONT_HERSHEY_SIMPLEX,
+                                             self._escala_hershey, self._grosor_hershey)
+            cv2.putText(lienzo, caracter, origen, cv2.FONT_HERSHEY_SIMPLEX, self._escala_hershey,
+                        255, self._grosor_hershey, cv2.LINE_AA)
+        if caracter == " " or avance == 0:
+            avance = max(avance, self.altura // 3)
+        x, y, w, h = cv2.boundingRect(lienzo)
+        if w == 0 or h == 0:
+            return None, 0, 0, avance
+        return lienzo[y:y + h, x:x + w], x - origen[0], y - origen[1], avance
+
+    def glifo(self, caracter):
+        glifo = self._glifos.get(caracter)
+        if glifo is not None:
+            return glifo
+        mascara, dx, dy, avance = self._rasterizar(caracter)
+        if mascara is None:
+            glifo = (0, 0, 0, 0, 0, 0, avance)
+        else:
+            h, w = mascara.shape
+            if self._x + w > ANCHO_ATLAS:  # Fila llena: se pasa a la siguiente
+                self._x, self._y, self._alto_fila = 0, self._y + self._alto_fila, 0
+            if self._y + h > self._atlas.shape[0]:
+                crecido = np.zeros((max(self._atlas.shape[0] * 2, self._y + h), ANCHO_ATLAS), dtype=np.uint8)
+                crecido[:self._atlas.shape[0]] = self._atlas
+                self._atlas = crecido
+            self._atlas[self._y:self._y + h, self._x:self._x + w] = mascara
+            glifo = (self._x, self._y, w, h, dx, dy, avance)
+            self._x += w + 1
+            self._alto_fila = max(self._alto_fila, h + 1)
+        self._glifos[caracter] = glifo
+        return glifo
+
+    def componer(self, texto):
+        """
+        Retorna (alfa, desplazamiento_y): imagen de alfa con el texto completo y la posición de
+        su borde superior respecto a la línea base.
+        """
+        if not self.truetype:
+            texto = _a_hershey(texto)
+        glifos = [self.glifo(c) for c in texto]
+        ancho = max(1, sum(g[6] for g in glifos) + self.altura // 2)
+        alfa = np.zeros((self.ascendente + self.descendente, ancho), dtype=np.uint8)
+        pluma = 0
+        for x, y, w, h, dx, dy, avance in glifos:
+            if w:
+                fila = self.ascendente + dy
+                columna = pluma + dx
+                # Recorte por si un glifo sobresale de la caja de la línea
+                y0, x0 = max(0, fila), max(0, columna)
+                y1, x1 = min(alfa.shape[0], fila + h), min(alfa.shape[1], columna + w)
+                if y1 > y0 and x1 > x0:
+                    origen = self._atlas[y + y0 - fila:y + y1 - fila, x + x0 - columna:x + x1 - columna]
+                    np.maximum(alfa[y0:y1, x0:x1], origen, out=alfa[y0:y1, x0:x1])
+            pluma += avance
+        # Se recorta el ancho al contenido real
+        columnas = np.flatnonzero(alfa.any(axis=0))
+        if len(columnas):
+            alfa = alfa[:, :columnas[-1] + 1]
+        return alfa, -self.ascendente
+
+
+class Rotulador:
+    """
+    Dibuja textos con la misma firma que cv2.putText (origen en la línea base izquierda),
+    pero cada texto distinto se compone una sola vez en un sprite de alfa y después solo se
+    mezcla el rectángulo que ocupa. Los sprites se guardan en una caché LRU.
+    """
+    def __init__(self, ruta_fuente=None):
+        self.ruta_fuente = ruta_fuente if ruta_fuente is not None else buscar_fuente()
+        self._atlas = {}
+        self._textos = OrderedDict()
+
+    def atlas(self, altura):
+        atlas = self._atlas.get(altura)
+        if atlas is None:
+            atlas = self._atlas[altura] = AtlasGlifos(altura, self.ruta_fuente)
+        return atlas
+
+    def sprite(self, texto, altura):
+        clave = (texto, altura)
+        sprite = self._textos.get(clave)
+        if sprite is not None:
+            self._textos.move_to_end(clave)
+            return sprite
+        alfa, dy = self.atlas(altura).componer(texto)
+        # Alfa en 0..256 para mezclar con enteros: (fondo * (256 - a) + color * a) >> 8
+        peso = alfa.astype(np.uint16)
+        peso += peso >> 7
+        sprite = (peso[:, :, np.newaxis], dy)
+        self._textos[clave] = sprite
+        if len(self._textos) > MAX_CACHE_TEXTOS:
+            self._textos.popitem(last=False)
+        return sprite
+
+    def tamano(self, texto, escala):
+        """(ancho, alto) en píxeles del texto a la escala indicada (equivalente Hershey)"""
+        peso, _ = self.sprite(texto, _altura(escala))
+        return peso.shape[1], peso.shape[0]
+
+    def escribir(self, frame, texto, origen, escala, color, grosor=1):
+        """
+        Como cv2.putText con FONT_HERSHEY_SIMPLEX: `escala` se convierte a una altura de
+        fuente equivalente. El grosor se ignora con TrueType (el peso es el de la fuente).
+        """
+        peso, dy = self.sprite(texto, _altura(escala))
+        h, w = peso.shape[:2]
+        x, y = int(origen[0]), int(origen[1]) + dy
+        # Recorte del sprite a los límites del frame
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(frame.shape[1], x + w), min(frame.shape[0], y + h)
+        if x1 <= x0 or y1 <= y0:
+            return
+        a = peso[y0 - y:y1 - y, x0 - x:x1 - x]
+        roi = frame[y0:y1, x0:x1]
+        mezcla = roi * (256 - a) + np.array(color, dtype=np.uint16) * a
+        mezcla >>= 8
+        roi[:] = mezcla
+
+
+def _altura(escala):
+    """Altura de fuente equivalente a una escala de FONT_HERSHEY_SIMPLEX"""
+    return max(8, int(round(escala * 30)))
+
+
+def oscurecer(frame, x0, y0, x1, y1, factor):
+    """
+    Multiplica por `factor` solo el rectángulo indicado. Es lo mismo que rellenar de negro
+    una copia del frame y mezclarla con addWeighted, sin copiar ni mezclar el frame entero.
+    """
+    roi = frame[max(0, y0):max(0, y1), max(0, x0):max(0, x1)]
+    np.multiply(roi, factor, out=roi, casting="unsafe")
+
+
+# Instancia compartida por los paneles de main
+ROTULADOR = Rotulador()
+
+
+def escribir(frame, texto, origen, escala, color, grosor=1):
+    ROTULADOR.escribir(frame, texto, origen, escala, color, grosor)
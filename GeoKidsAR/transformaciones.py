@@ -0,0 +1,214 @@
+import numpy as np
+from cuia import matrizDeTransformacion
+
+# Cambio de ejes entre la cámara de OpenCV (x derecha, y abajo, z hacia delante)
+# y la de pygfx (x derecha, y arriba, mirando hacia -z)
+OPENCV_A_PYGFX = np.diag([1.0, -1.0, -1.0, 1.0])
+
+
+def _como_lote(matrices):
+    """Convierte una matriz 4x4, una lista de ellas o un array (N,4,4) en un array (N,4,4)"""
+    if isinstance(matrices, PilaTransformaciones):
+        return matrices.matrices
+    if isinstance(matrices, matrizDeTransformacion):
+        matrices = matrices.matrix
+    elif isinstance(matrices, (list, tuple)):
+        matrices = [m.matrix if isinstance(m, matrizDeTransformacion) else m for m in matrices]
+    matrices = np.asarray(matrices, dtype=np.float64)
+    if matrices.shape == (4, 4):
+        return matrices[np.newaxis]
+    if matrices.ndim != 3 or matrices.shape[1:] != (4, 4):
+        raise ValueError("Se esperaba una matriz 4x4 o un array de forma (N,4,4).")
+    return matrices
+
+
+def _como_vectores(valores, columnas):
+    """Convierte un vector o una lista de vectores en un array (N,columnas)"""
+    valores = np.asarray(valores, dtype=np.float64).reshape(-1, columnas)
+    return valores
+
+
+def rodrigues(rvecs):
+    """
+    Convierte un lote de vectores de rotación (N,3) en matrices de rotación (N,3,3).
+    Equivale a cv2.Rodrigues aplicado a cada vector, pero en una sola llamada.
+    """
+    rvecs = _como_vectores(rvecs, 3)
+    theta = np.linalg.norm(rvecs, axis=1)
+    pequenos = theta < 1e-12
+    eje = rvecs / np.where(pequenos, 1.0, theta)[:, np.newaxis]
+
+    # Matriz antisimétrica K de cada eje
+    K = np.zeros((len(rvecs), 3, 3))
+    K[:, 0, 1] = -eje[:, 2]
+    K[:, 0, 2] = eje[:, 1]
+    K[:, 1, 0] = eje[:, 2]
+    K[:, 1, 2] = -eje[:, 0]
+    K[:, 2, 0] = -eje[:, 1]
+    K[:, 2, 1] = eje[:, 0]
+
+    # R = I + sen(θ)·K + (1 - cos(θ))·K²
+    s = np.sin(theta)[:, np.newaxis, np.newaxis]
+    c = (1.0 - np.cos(theta))[:, np.newaxis, np.newaxis]
+    R = np.eye(3) + s * K + c * (K @ K)
+    R[pequenos] = np.eye(3)
+    return R
+
+
+class PilaTransformaciones:
+    """
+    Almacena N transformaciones homogéneas en un único array (N,4,4).
+    Las composiciones e inversiones se hacen por lotes, sin crear un objeto por matriz.
+    Con N=1 se comporta como una matrizDeTransformacion.
+    """
+    def __init__(self, matrices=None, n=1):
+        if matrices is None:
+            self.matrices = np.tile(np.eye(4), (n, 1, 1))
+        else:
+            self.matrices = _como_lote(matrices)
+
+    @staticmethod
+    def identidad(n=1):
+        return PilaTransformaciones(n=n)
+
+    @staticmethod
+    def traslaciones(t):
+        t = _como_vectores(t, 3)
+        pila = PilaTransformaciones(n=len(t))
+        pila.matrices[:, :3, 3] = t
+        return pila
+
+    @staticmethod
+    def rotaciones(axis, angulos):
+        angulos = np.asarray(angulos, dtype=np.float64).reshape(-1)
+        c, s = np.cos(angulos), np.sin(angulos)
+        pila = PilaTransformaciones(n=len(angulos))
+        m = pila.matrices
+
+        if axis == 'x':
+            m[:, 1, 1], m[:, 1, 2] = c, -s
+            m[:, 2, 1], m[:, 2, 2] = s, c
+        elif axis == 'y':
+            m[:, 0, 0], m[:, 0, 2] = c, s
+            m[:, 2, 0], m[:, 2, 2] = -s, c
+        elif axis == 'z':
+            m[:, 0, 0], m[:, 0, 1] = c, -s
+            m[:, 1, 0], m[:, 1, 1] = s, c
+        else:
+            raise ValueError("El eje debe ser 'x', 'y' o 'z'.")
+
+        return pila
+
+    @staticmethod
+    def escalados(s):
+        s = _como_vectores(s, 3)
+        pila = PilaTransformaciones(n=len(s))
+        idx = np.arange(3)
+        pila.matrices[:, idx, idx] = s
+        return pila
+
+    @staticmethod
+    def rotaciones_con_cuaternion(q):
+        q = _como_vectores(q, 4)
+        q = q / np.linalg.norm(q, axis=1, keepdims=True)
+        x, y, z, w = q.T
+
+        pila = PilaTransformaciones(n=len(q))
+        m = pila.matrices
+        m[:, 0, 0] = 1 - 2*(y**2 + z**2)
+        m[:, 0, 1] = 2*(x*y - z*w)
+        m[:, 0, 2] = 2*(x*z + y*w)
+        m[:, 1, 0] = 2*(x*y + z*w)
+        m[:, 1, 1] = 1 - 2*(x**2 + z**2)
+        m[:, 1, 2] = 2*(y*z - x*w)
+        m[:, 2, 0] = 2*(x*z - y*w)
+        m[:, 2, 1] = 2*(y*z + x*w)
+        m[:, 2, 2] = 1 - 2*(x**2 + y**2)
+        return pila
+
+    @staticmethod
+    def desde_pose(rvecs, tvecs):
+        """
+        Construye las transformaciones modelo -> cámara (convención de OpenCV)
+        a partir de lotes de rvec/tvec como los que devuelve cv2.solvePnP.
+        """
+        R = rodrigues(rvecs)
+        t = _como_vectores(tvecs, 3)
+        if len(t) != len(R):
+            raise ValueError("rvecs y tvecs deben tener el mismo número de elementos.")
+        pila = PilaTransformaciones(n=len(R))
+        pila.matrices[:, :3, :3] = R
+        pila.matrices[:, :3, 3] = t
+        return pila
+
+    def componer(self, other, out=None):
+        """Composición por lotes (self @ other). Admite N frente a 1 o N frente a N."""
+        return PilaTransformaciones(np.matmul(self.matrices, _como_lote(other), out=out))
+
+    def invertir(self, rigida=True):
+        """
+        Invierte todas las transformaciones. Si son rígidas (rotación + traslación)
+        se usa la traspuesta en lugar de una inversión general.
+        """
+        if not rigida:
+            return PilaTransformaciones(np.linalg.inv(self.matrices))
+        R_t = np.swapaxes(self.matrices[:, :3, :3], 1, 2)
+        t = self.matrices[:, :3, 3]
+        inv = PilaTransformaciones(n=len(self))
+        inv.matrices[:, :3, :3] = R_t
+        inv.matrices[:, :3, 3] = -np.einsum('nij,nj->ni', R_t, t)
+        return inv
+
+    def aplicar(self, puntos):
+        """Transforma puntos (M,3) con cada matriz de la pila. Devuelve (N,M,3)."""
+        puntos = _como_vectores(puntos, 3)
+        R = self.matrices[:, :3, :3]
+        t = self.matrices[:, np.newaxis, :3, 3]
+        return np.einsum('nij,mj->nmi', R, puntos) + t
+
+    def matriz(self, i=0):
+        """Devuelve la transformación i como matrizDeTransformacion"""
+        return matrizDeTransformacion(self.matrices[i].copy())
+
+    def __matmul__(self, other):
+        if isinstance(other, (PilaTransformaciones, matrizDeTransformacion, np.ndarray)):
+            return self.componer(other)
+        return NotImplemented
+
+    def __rmatmul__(self, other):
+        if isinstance(other, (matrizDeTransformacion, np.ndarray)):
+            return PilaTransformaciones(np.matmul(_como_lote(other), self.matrices))
+        return NotImplemented
+
+    def __getitem__(self, i):
+        return PilaTransformaciones(self.matrices[i].reshape(-1, 4, 4))
+
+    def __len__(self):
+        return len(self.matrices)
+
+    def __array__(self, dtype=None, copy=None):
+        # Con una sola matriz se devuelve 4x4 para poder usarla como matrizDeTransformacion
+        m = self.matrices[0] if len(self.matrices) == 1 else self.matrices
+        return m if dtype is None else m.astype(dtype)
+
+    @property
+    def shape(self):
+        return self.matrices.shape
+
+    def __repr__(self):
+        return f"PilaTransformaciones(n={len(self)})\n{self.matrices}"
+
+
+def matrices_de_vista(rvecs, tvecs):
+    """
+    Convierte lotes de rvec/tvec de OpenCV en las matrices de cámara que espera
+    escenaPYGFX.actualizar_camara (posición de la cámara en el sistema del marcador).
+    Devuelve un array (N,4,4); con un solo par, usar matriz_de_vista.
+    """
+    vista = PilaTransformaciones.desde_pose(rvecs, tvecs).invertir()
+    return np.matmul(vista.matrices, OPENCV_A_PYGFX)
+
+
+def matriz_de_vista(rvec, tvec):
+    """Versión de matrices_de_vista para una única pose. Devuelve una matriz 4x4."""
+    return matrices_de_vista(rvec, tvec)[0]